@@ -1,81 +1,265 @@
-import pandas as pd
-from flask import Flask, jsonify, render_template
-from models import *
-from flask_migrate import Migrate
-from seed_data import seed_data
-from helpers.services import *
+from datetime import timedelta
+from flask import (
+    Flask, Response, current_app, flash, jsonify, redirect, render_template, request, session, stream_template,
+    stream_with_context, url_for,
+)
+from sqlalchemy import inspect
+from helpers.services import collect_unreferenced_blobs, document_detail_cache, rebuild_search_index
+from helpers.search_index import ensure_search_index, init_search_functions
+from helpers.extraction_queue import LEASE_SECONDS, ExtractionWorker
+from helpers.access import accessible_data_cache, ensure_document_access
+from helpers.cache import SQLiteCache
+from helpers.sql_playground import (
+    PLAYGROUND_EXPORT_MAX_BYTES, PLAYGROUND_EXPORT_MAX_ROWS, PLAYGROUND_MAX_BYTES, PLAYGROUND_MAX_ROWS,
+    PLAYGROUND_TIMEOUT_SECONDS, render_query_html, stream_query_csv, stream_query_json,
+)
+from helpers.query_metrics import init_query_metrics
+from helpers.batch_ingest import INGEST_BATCH_SIZE, INGEST_WORKERS, IngestSourceError, ingest_archive
+from helpers.user_context import load_user_context
+from helpers.passwords import DEFAULT_PASSWORD_HASH_METHOD
+from helpers.rate_limits import init_rate_limits
+from helpers.storage import MAX_FORM_OVERHEAD_BYTES, MAX_UPLOAD_BYTES
 from werkzeug.datastructures import FileStorage
-from routes.routes import *
-from database import db
+from routes.routes import api_bp, auth_bp, helpers_bp, main_bp
+from database import db, database_uri_from_env, init_database
 from dotenv import load_dotenv
 import os
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
+import hmac
+import json
+import click
 
 load_dotenv()
 
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
 
-def rate_limit_key():
-    return session.get("username") or get_remote_address()
 
+def init_migrations(app) -> None:
+    """
+    Flask-Migrate for the `flask db` commands and init_schema(). Alembic is imported
+    here, so serving workers that never touch migrations don't load it.
+    """
+    if "migrate" in app.extensions:
+        return
+    from flask_migrate import Migrate
+    # batch mode: SQLite can't ALTER most constraints
+    Migrate(app, db, directory=MIGRATIONS_DIR, render_as_batch=True)
 
-def create_app():
+
+def init_schema() -> dict:
+    """
+    Create the schema of a fresh database (stamped at the latest migration) and backfill
+    the derived tables: FTS index and document access. Idempotent; needs an app context.
+    Existing databases are upgraded with `flask db upgrade` first (see README).
+    """
+    from flask_migrate import stamp
+
+    init_migrations(current_app._get_current_object())
+    fresh_database = not inspect(db.engine).has_table("documents")
+    db.create_all()
+    if fresh_database:
+        stamp()
+    indexed = rebuild_search_index() if ensure_search_index() else None
+    return {"created": fresh_database, "indexed": indexed, "access_rebuilt": ensure_document_access()}
+
+
+def create_app(test_config: dict = None):
     app = Flask(__name__, template_folder="../frontend/templates")
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///siemens.db"
+    # DATABASE_URL (default: SQLite file); pool settings from DB_POOL_* (see database.py)
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_uri_from_env()
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     app.permanent_session_lifetime = timedelta(days=7)
     app.config["SECRET_KEY"] = os.getenv("SECRET_KEY")
-    limiter = Limiter(
-        key_func=rate_limit_key,
-        # <- one global limit for all routes
-        default_limits=["100 per minute"],
-    )
-    # limiter.init_app(app)
-    db.init_app(app)
+    # werkzeug method string ("scrypt:32768:8:1", "pbkdf2:sha256:1000000") or "fast" for fixtures;
+    # stored hashes of another method/cost are rehashed at the next login
+    app.config["PASSWORD_HASH_METHOD"] = os.getenv("PASSWORD_HASH_METHOD", DEFAULT_PASSWORD_HASH_METHOD)
+    # Larger request bodies get a 413 from the Content-Length (or while arriving), before
+    # Werkzeug spools them; /api/ingest raises it for its request
+    app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES + MAX_FORM_OVERHEAD_BYTES
+    # "compact": versions stored as deltas / compressed and rebuilt on download (helpers/blob_encoding.py)
+    app.config["DOCUMENT_STORAGE"] = os.getenv("DOCUMENT_STORAGE", "full")
+    # Bearer token for Prometheus scrapes of /metrics (unset: admin session only)
+    app.config["METRICS_TOKEN"] = os.getenv("METRICS_TOKEN")
+    # Running extraction jobs not renewed by their worker for this long are retried elsewhere
+    app.config["EXTRACTION_LEASE_SECONDS"] = float(os.getenv("EXTRACTION_LEASE_SECONDS", LEASE_SECONDS))
+    if test_config:
+        app.config.update(test_config)
+    init_database(app)
+    # Only CLI invocations (`flask db ...`, `flask init-db`) load the app inside a click context
+    if click.get_current_context(silent=True) is not None:
+        init_migrations(app)
 
     with app.app_context():
-        db.create_all()
+        # similarity() for fuzzy title search on SQLite (pg_trgm provides it on PostgreSQL)
+        init_search_functions(db.engine)
+        # No schema work at boot: `flask init-db` / `flask db upgrade` (see README)
         # seed_data()
 
+    # Multi-worker deployments: share cached per-department data and document details
+    # (and their invalidation) between the worker processes of a host through a local SQLite file
+    shared_cache_path = app.config.get("SHARED_CACHE_PATH") or os.getenv("SHARED_CACHE_PATH")
+    if shared_cache_path:
+        shared_cache = SQLiteCache(shared_cache_path)
+        accessible_data_cache.use_shared_store(shared_cache)
+        document_detail_cache.use_shared_store(shared_cache)
+
+    # Per-request query count / DB time headers, /metrics and the slow-query log (SLOW_QUERY_MS)
+    query_metrics = init_query_metrics(app)
+
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
     app.register_blueprint(helpers_bp)
+    app.register_blueprint(api_bp)
+    # Per-client budgets (helpers/rate_limits.py, RATELIMIT_* config) in a storage shared by the workers
+    init_rate_limits(app)
+
+    @app.cli.command("init-db")
+    def init_db():
+        """Create the schema of a fresh database and backfill the derived tables."""
+        result = init_schema()
+        click.echo("Created the schema." if result["created"] else "Schema already present.")
+        if result["indexed"] is not None:
+            click.echo(f"Indexed {result['indexed']} documents.")
+        if result["access_rebuilt"]:
+            click.echo("Rebuilt the document access table.")
+
+    @app.cli.command("gc-blobs")
+    @click.option("--grace-seconds", default=3600, show_default=True,
+                  help="Keep unreferenced blobs younger than this (in-flight uploads).")
+    def gc_blobs(grace_seconds):
+        """Delete stored files that no document version references."""
+        stats = collect_unreferenced_blobs(grace_seconds)
+        click.echo(
+            f"Removed {stats['removed_blobs']} blobs and {stats['removed_orphan_files']} "
+            f"orphan files, reclaimed {stats['reclaimed_bytes']} bytes.")
+
+    @app.cli.command("reindex")
+    def reindex():
+        """Rebuild the full-text search index from the stored files."""
+        count = rebuild_search_index()
+        click.echo(f"Indexed {count} documents.")
+
+    @app.cli.command("extraction-worker")
+    @click.option("--workers", default=2, show_default=True,
+                  help="Maximum number of extraction processes.")
+    @click.option("--once", is_flag=True, help="Drain the due jobs, then exit.")
+    def extraction_worker(workers, once):
+        """Run the background text-extraction worker pool."""
+        worker = ExtractionWorker(app, max_workers=workers)
+        if once:
+            worker.run_until_empty()
+        else:
+            worker.run_forever()
+
+    @app.cli.command("seed-synthetic")
+    @click.option("--employees", default=1000, show_default=True)
+    @click.option("--documents", default=10000, show_default=True)
+    @click.option("--versions", default=3, show_default=True, help="Versions per document.")
+    @click.option("--tags", default=200, show_default=True)
+    @click.option("--departments", default=20, show_default=True)
+    @click.option("--tags-per-document", default=3, show_default=True)
+    @click.option("--departments-per-document", default=2, show_default=True)
+    @click.option("--public-ratio", default=0.2, show_default=True)
+    @click.option("--seed", default=42, show_default=True, help="Random seed.")
+    def seed_synthetic(**options):
+        """Bulk-insert a large synthetic data set (benchmarks / load tests)."""
+        from seed_data import seed_synthetic_data
+        seed_synthetic_data(**options)
+
+    @app.cli.command("ingest")
+    @click.argument("source", type=click.Path(exists=True))
+    @click.option("--uploader", required=True, help="Employee the documents are uploaded as.")
+    @click.option("--manifest", type=click.Path(exists=True, dir_okay=False),
+                  help="CSV/JSON manifest (default: manifest.csv/json inside SOURCE, "
+                       "else every file as version 1).")
+    @click.option("--workers", default=INGEST_WORKERS, show_default=True,
+                  help="Threads streaming and hashing entries.")
+    @click.option("--batch-size", default=INGEST_BATCH_SIZE, show_default=True,
+                  help="Entries per metadata transaction.")
+    @click.option("--report", type=click.Path(dir_okay=False), help="Write per-item results to this JSON file.")
+    def ingest(source, uploader, manifest, workers, batch_size, report):
+        """Bulk-upload a directory or ZIP/TAR archive of documents."""
+        user = load_user_context(uploader)
+        if user is None:
+            raise click.ClickException(f"Unknown employee '{uploader}'.")
+        try:
+            result = ingest_archive(source, user, manifest_path=manifest,
+                                    workers=workers, batch_size=batch_size)
+        except IngestSourceError as e:
+            raise click.ClickException(str(e))
+
+        for item in result["items"]:
+            if item["status"] == "error":
+                click.echo(f"  {item['path']}: {item['error']}", err=True)
+        summary = result["summary"]
+        click.echo(
+            f"{summary['created']} documents created, {summary['new_version']} new versions, "
+            f"{summary['error']} errors; {summary['bytes']} bytes in {summary['seconds']} s "
+            f"({summary['items_per_s']} items/s, {summary['mb_per_s']} MB/s).")
+        if report:
+            with open(report, "w") as f:
+                json.dump(result, f, indent=2)
 
     @app.route("/")
     def notIndex():
         return redirect(url_for("main.index"))
 
+    @app.route("/metrics")
+    def metrics():
+        # Scrapers send METRICS_TOKEN as a bearer token; otherwise admins only
+        token = app.config.get("METRICS_TOKEN")
+        authorized = token and hmac.compare_digest(
+            request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode())
+        if not authorized and (session.get("role") or "").lower() != "admin":
+            return jsonify({"error": "Admin login or METRICS_TOKEN required"}), 403
+        return Response(query_metrics.render(), mimetype="text/plain; version=0.0.4")
+
     # %% for testing only ------------------------------
     @app.route("/viewer")
     def viewer():
         return render_template("test_all.html")
 
+    def playground_limits(export: bool = False) -> dict:
+        """Row / byte / time limits of the SQL playground (SQL_PLAYGROUND_* config)."""
+        config = app.config
+        return {
+            "max_rows": config.get("SQL_PLAYGROUND_EXPORT_MAX_ROWS", PLAYGROUND_EXPORT_MAX_ROWS) if export
+            else config.get("SQL_PLAYGROUND_MAX_ROWS", PLAYGROUND_MAX_ROWS),
+            "max_bytes": config.get("SQL_PLAYGROUND_EXPORT_MAX_BYTES", PLAYGROUND_EXPORT_MAX_BYTES) if export
+            else config.get("SQL_PLAYGROUND_MAX_BYTES", PLAYGROUND_MAX_BYTES),
+            "timeout": config.get("SQL_PLAYGROUND_TIMEOUT", PLAYGROUND_TIMEOUT_SECONDS),
+        }
+
     @app.route("/sql_playground", methods=["GET", "POST"])
     def sql_playground():
-        
-        from flask import render_template
-        from sqlalchemy import text
         if "role" not in session or session.get("role").lower() != "admin":
             flash("You must be an admin to access signup.", "error")
             return redirect(url_for("auth.login"))
-        result_html = ""
+        result_html = []
         query = ""
 
         if request.method == "POST":
             query = request.form["query"]
-            try:
-                result = db.session.execute(text(query))
-                rows = result.fetchall()
-
-                if rows:
-                    df = pd.DataFrame(rows, columns=result.keys())
-                    result_html = df.to_html(
-                        classes="table table-bordered", index=False)
-                else:
-                    result_html = "<p>No rows returned.</p>"
-            except Exception as e:
-                result_html = f"<p style='color:red;'>Error: {e}</p>"
-        return render_template("sql_playground.html", query=query, result_html=result_html)
+            # Rows are fetched in batches and rendered while the page streams out
+            result_html = render_query_html(query, **playground_limits())
+        return stream_template("sql_playground.html", query=query, result_html=result_html)
+
+    @app.route("/sql_playground/export", methods=["POST"])
+    def sql_playground_export():
+        """Stream the full result (up to the export limits) as CSV or JSON."""
+        if "role" not in session or session.get("role").lower() != "admin":
+            flash("You must be an admin to access signup.", "error")
+            return redirect(url_for("auth.login"))
+        query = request.form["query"]
+        export_format = request.form.get("format", "csv")
+        if export_format not in ("csv", "json"):
+            return jsonify({"error": "format must be csv or json"}), 400
+
+        if export_format == "csv":
+            chunks, mimetype = stream_query_csv(query, **playground_limits(export=True)), "text/csv"
+        else:
+            chunks, mimetype = stream_query_json(query, **playground_limits(export=True)), "application/json"
+        return Response(stream_with_context(chunks), mimetype=mimetype, headers={
+            "Content-Disposition": f"attachment; filename=query.{export_format}"})
 
     # @app.route("/create_employee")
     # def create_employee_route():
@@ -115,4 +299,12 @@ def create_app():
 
 if __name__ == "__main__":
     app = create_app()
+    # Development server: set up a fresh database on the way (deployments run `flask init-db`)
+    with app.app_context():
+        init_schema()
+    # In-process extraction worker (EXTRACTION_WORKERS=0 to run `flask extraction-worker` separately);
+    # with the reloader only the serving child starts it
+    extraction_workers = int(os.getenv("EXTRACTION_WORKERS", "2"))
+    if extraction_workers and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        ExtractionWorker(app, max_workers=extraction_workers).start()
     app.run(debug=True)
@@ -0,0 +1,90 @@
+"""
+Production serving mode: create_app() behind an ASGI server.
+
+    cd backend
+    uvicorn --factory asgi:create_asgi_app --workers 4 --port 8000
+
+Views run in a bounded thread pool (a2wsgi). File downloads leave the pool right
+away: Flask answers with an X-Sendfile header (USE_X_SENDFILE) and
+SendfileMiddleware streams the file from the event loop with non-blocking reads,
+so a slow client holds a coroutine instead of a thread.
+Run the text-extraction worker next to it: flask --app app extraction-worker
+"""
+import asyncio
+import os
+from a2wsgi import WSGIMiddleware
+from app import create_app
+
+WSGI_THREADS = int(os.getenv("WSGI_THREADS", "10"))
+SENDFILE_CHUNK_SIZE = 256 * 1024  # fewer executor round trips per file than 64 KB
+
+
+class SendfileMiddleware:
+    """
+    ASGI middleware serving X-Sendfile responses of the wrapped app itself:
+    the response start is held back until the (empty) body ends, then the file
+    is streamed in `chunk_size` pieces; reads run in the default executor and
+    every send waits for the client (server flow control).
+    """
+
+    def __init__(self, app, chunk_size: int = SENDFILE_CHUNK_SIZE):
+        self.app = app
+        self.chunk_size = chunk_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        held = {}  # the response start message of an X-Sendfile response
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                path = _header(message["headers"], b"x-sendfile")
+                if path is not None:
+                    held["start"], held["path"] = message, os.fsdecode(path)
+                    return
+            elif message["type"] == "http.response.body" and held:
+                if not message.get("more_body", False):
+                    await self._send_file(held["start"], held["path"], scope["method"] == "HEAD", send)
+                return
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _send_file(self, start: dict, path: str, head_only: bool, send) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            f = await loop.run_in_executor(None, open, path, "rb")
+        except OSError:
+            # Removed between the view and here (e.g. blob GC)
+            await send({"type": "http.response.start", "status": 404,
+                        "headers": [(b"content-length", b"0")]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        try:
+            headers = [(k, v) for k, v in start["headers"] if k.lower() != b"x-sendfile"]
+            await send({**start, "headers": headers})
+            if not head_only:
+                while True:
+                    chunk = await loop.run_in_executor(None, f.read, self.chunk_size)
+                    if not chunk:
+                        break
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            f.close()
+
+
+def _header(headers, name: bytes):
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def create_asgi_app(flask_app=None, threads: int = WSGI_THREADS):
+    """ASGI application around create_app() (or the given Flask app)."""
+    flask_app = flask_app or create_app()
+    flask_app.config["USE_X_SENDFILE"] = True
+    return SendfileMiddleware(WSGIMiddleware(flask_app, workers=threads))
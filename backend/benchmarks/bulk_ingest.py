@@ -0,0 +1,121 @@
+"""
+Bulk ingestion throughput: N files uploaded one by one through
+handle_document_upload (the /upload path) against ingest_archive on a
+directory and on a ZIP archive.
+
+    cd backend
+    python benchmarks/bulk_ingest.py --files 2000 --workers 4
+
+Every mode starts from an empty temporary database; files are small text
+documents with distinct content and a manifest with tags and departments.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from werkzeug.datastructures import FileStorage  # noqa: E402
+from app import create_app, init_schema  # noqa: E402
+import helpers.services  # noqa: E402
+from database import db  # noqa: E402
+from models import Document, DocumentVersion, Role  # noqa: E402
+from helpers.batch_ingest import ingest_archive  # noqa: E402
+from helpers.services import create_employee, handle_document_upload  # noqa: E402
+from helpers.user_context import load_user_context  # noqa: E402
+
+MODES = ("single", "directory", "zip")
+
+
+def make_corpus(root: str, files: int, kb: int, seed: int = 42) -> list[dict]:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(files):
+        path = f"share/{i % 50:02d}/file-{i:06d}.txt"
+        os.makedirs(os.path.join(root, os.path.dirname(path)), exist_ok=True)
+        with open(os.path.join(root, path), "wb") as f:
+            f.write(f"legacy document {i}\n".encode() + rng.randbytes(kb * 1024).hex().encode()[:kb * 1024])
+        rows.append({"path": path, "title": f"Legacy document {i:06d}", "version": 1,
+                     "tags": [f"tag-{rng.randrange(100)}", "legacy"],
+                     "departments": [f"dept-{rng.randrange(10)}"]})
+    with open(os.path.join(root, "manifest.json"), "w") as f:
+        json.dump(rows, f)
+    return rows
+
+
+def run_mode(mode: str, corpus_dir: str, rows: list[dict], args) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"bulk-ingest-{mode}-")
+    helpers.services.FILES_DIR = os.path.join(workdir, "files")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+                      "PASSWORD_HASH_METHOD": "fast"})
+
+    with app.app_context():
+        init_schema()
+        db.session.add(Role(name="admin"))
+        db.session.commit()
+        create_employee("bench", "bench@example.com", "bench-password", "admin", "dept-0")
+        user = load_user_context("bench")
+
+        started = time.perf_counter()
+        if mode == "single":
+            for row in rows:
+                with open(os.path.join(corpus_dir, row["path"]), "rb") as f:
+                    handle_document_upload(
+                        title=row["title"], uploader=user,
+                        file=FileStorage(stream=f, filename=os.path.basename(row["path"])),
+                        version_number=row["version"], departments=row["departments"], tags=row["tags"])
+        elif mode == "directory":
+            ingest_archive(corpus_dir, user, workers=args.workers, batch_size=args.batch_size)
+        else:
+            archive = os.path.join(workdir, "corpus.zip")
+            with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+                for root, _, names in os.walk(corpus_dir):
+                    for name in names:
+                        path = os.path.join(root, name)
+                        zf.write(path, os.path.relpath(path, corpus_dir))
+            started = time.perf_counter()  # archive creation is not part of the ingestion
+            ingest_archive(archive, user, workers=args.workers, batch_size=args.batch_size)
+        seconds = time.perf_counter() - started
+
+        documents = db.session.query(Document).count()
+        versions = db.session.query(DocumentVersion).count()
+        db.session.remove()
+
+    return {"mode": mode, "documents": documents, "versions": versions,
+            "seconds": round(seconds, 2), "files_per_s": round(len(rows) / seconds, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--kb", type=int, default=16, help="size of every file")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    corpus_dir = tempfile.mkdtemp(prefix="bulk-ingest-corpus-")
+    rows = make_corpus(corpus_dir, args.files, args.kb)
+
+    results = [run_mode(mode, corpus_dir, rows, args) for mode in args.modes]
+    print(f"{args.files} files of {args.kb} KB, {args.workers} workers, batches of {args.batch_size}")
+    print(f"{'mode':<10} {'documents':>9} {'versions':>8} {'seconds':>8} {'files/s':>8}")
+    for row in results:
+        print(f"{row['mode']:<10} {row['documents']:>9} {row['versions']:>8} "
+              f"{row['seconds']:>8} {row['files_per_s']:>8}")
+
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
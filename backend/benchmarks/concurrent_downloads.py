@@ -0,0 +1,244 @@
+"""
+Concurrent slow downloads against the threaded dev server and the ASGI serving
+mode (asgi.py), with and without its async file streaming.
+
+    cd backend
+    python benchmarks/concurrent_downloads.py --clients 10 50 200
+
+N clients download the same file at a throttled rate (slow readers) while a
+probe requests /login every 100 ms; reported are completed downloads, aggregate
+throughput, probe latency (is the server still responsive?) and peak server
+threads. Needs uvicorn and a2wsgi (see requirements.txt).
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+from werkzeug.datastructures import FileStorage  # noqa: E402
+from app import create_app, init_schema  # noqa: E402
+import helpers.services  # noqa: E402
+from database import db  # noqa: E402
+from models import Role  # noqa: E402
+from helpers.services import create_employee, handle_document_upload  # noqa: E402
+from helpers.user_context import load_user_context  # noqa: E402
+
+SECRET_KEY = "concurrent-downloads"
+USERNAME, PASSWORD = "bench", "bench-password"
+TITLE = "Large benchmark document"
+MODES = ("dev", "asgi-plain", "asgi")
+
+
+def serve(mode: str, db_uri: str, port: int, threads: int) -> None:
+    """Run one server in this process (invoked as a subprocess by the benchmark)."""
+    app = create_app({"SQLALCHEMY_DATABASE_URI": db_uri, "SECRET_KEY": SECRET_KEY,
+                      "PASSWORD_HASH_METHOD": "fast", "RATELIMIT_ENABLED": False})
+    if mode == "dev":
+        app.run(port=port, threaded=True)
+        return
+
+    import uvicorn
+    from a2wsgi import WSGIMiddleware
+    from asgi import create_asgi_app
+    # asgi-plain: same thread pool, files streamed from the WSGI threads
+    asgi_app = create_asgi_app(app, threads) if mode == "asgi" else WSGIMiddleware(app, workers=threads)
+    uvicorn.run(asgi_app, port=port, log_level="warning")
+
+
+def prepare(workdir: str, file_mb: int) -> str:
+    db_uri = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    helpers.services.FILES_DIR = os.path.join(workdir, "files")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": db_uri, "SECRET_KEY": SECRET_KEY,
+                      "PASSWORD_HASH_METHOD": "fast", "RATELIMIT_ENABLED": False})
+    with app.app_context():
+        init_schema()
+        db.session.add(Role(name="user"))
+        db.session.commit()
+        create_employee(USERNAME, "bench@example.com", PASSWORD, "user", "benchmark")
+        handle_document_upload(
+            title=TITLE, uploader=load_user_context(USERNAME),
+            file=FileStorage(stream=io.BytesIO(os.urandom(file_mb * 1024 * 1024)), filename="large.pdf"),
+            version_number=1, departments=[], tags=[])
+    return db_uri
+
+
+async def request(port: int, method: str, path: str, cookie: str = "", body: bytes = b"",
+                  read_delay: float = 0.0, chunk: int = 64 * 1024):
+    """Minimal HTTP/1.1 client (Connection: close). Returns (status, headers, body bytes, seconds)."""
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    head = (f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n"
+            f"Cookie: {cookie}\r\nContent-Length: {len(body)}\r\n")
+    if body:
+        head += "Content-Type: application/x-www-form-urlencoded\r\n"
+    writer.write(head.encode() + b"\r\n" + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode().partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    received = 0
+    while data := await reader.read(chunk):
+        received += len(data)
+        if read_delay:
+            await asyncio.sleep(read_delay)
+    writer.close()
+    return status, headers, received, time.perf_counter() - started
+
+
+async def run_load(port: int, clients: int, read_delay: float) -> dict:
+    _, headers, _, _ = await request(
+        port, "POST", "/login", body=f"username={USERNAME}&password={PASSWORD}".encode())
+    cookie = headers["set-cookie"].split(";")[0]
+    path = "/download?title=" + TITLE.replace(" ", "%20")
+
+    async def download():
+        try:
+            status, _, size, seconds = await request(port, "GET", path, cookie, read_delay=read_delay)
+            return status == 200, size, seconds
+        except OSError:
+            return False, 0, 0.0
+
+    probes = []
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            try:
+                _, _, _, seconds = await asyncio.wait_for(request(port, "GET", "/login"), 30)
+                probes.append(seconds * 1000)
+            except (OSError, asyncio.TimeoutError):
+                probes.append(30_000.0)
+            await asyncio.sleep(0.1)
+
+    started = time.perf_counter()
+    probe_task = asyncio.create_task(probe())
+    results = await asyncio.gather(*(download() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await probe_task
+
+    completed = [r for r in results if r[0]]
+    probes.sort()
+    return {
+        "clients": clients,
+        "completed": len(completed),
+        "failed": clients - len(completed),
+        "seconds": round(elapsed, 2),
+        "throughput_mb_s": round(sum(r[1] for r in completed) / elapsed / 2 ** 20, 1),
+        "download_p50_s": round(statistics.median(r[2] for r in completed), 2) if completed else None,
+        "probe_p50_ms": round(probes[len(probes) // 2], 1) if probes else None,
+        "probe_p95_ms": round(probes[int(len(probes) * 0.95)], 1) if probes else None,
+        "probe_max_ms": round(probes[-1], 1) if probes else None,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def thread_count(pid: int):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("Threads:"))
+    except OSError:
+        return None  # not Linux
+
+
+def bench_mode(mode: str, db_uri: str, workdir: str, args) -> list[dict]:
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", mode, "--db", db_uri,
+         "--port", str(port), "--threads", str(args.threads)],
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        rows = []
+        for clients in args.clients:
+            peak = [0]
+
+            async def measure():
+                async def watch():
+                    while True:
+                        peak[0] = max(peak[0], thread_count(server.pid) or 0)
+                        await asyncio.sleep(0.05)
+                watcher = asyncio.create_task(watch())
+                try:
+                    return await run_load(port, clients, args.read_delay)
+                finally:
+                    watcher.cancel()
+
+            row = {"mode": mode, **asyncio.run(measure()), "peak_threads": peak[0] or None}
+            rows.append(row)
+            print(f"{mode:<11} {row['clients']:>7} {row['completed']:>9} {row['failed']:>6} "
+                  f"{row['throughput_mb_s']:>8} {row['download_p50_s'] or '-':>9} "
+                  f"{row['probe_p50_ms']:>9} {row['probe_p95_ms']:>9} {row['probe_max_ms']:>9} "
+                  f"{row['peak_threads'] or '-':>8}")
+        return rows
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--file-mb", type=int, default=8, help="size of the downloaded file")
+    parser.add_argument("--read-delay", type=float, default=0.05,
+                        help="seconds a client sleeps after every 64 KB read (slow reader)")
+    parser.add_argument("--threads", type=int, default=10, help="WSGI thread pool of the ASGI modes")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--serve", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.db, args.port, args.threads)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="concurrent-downloads-")
+    db_uri = prepare(workdir, args.file_mb)
+
+    print(f"{args.file_mb} MB file, reader sleeps {args.read_delay}s per 64 KB, "
+          f"ASGI thread pool {args.threads}")
+    print(f"{'mode':<11} {'clients':>7} {'completed':>9} {'failed':>6} {'MB/s':>8} {'dl p50 s':>9} "
+          f"{'probe p50':>9} {'probe p95':>9} {'probe max':>9} {'threads':>8}")
+    results = []
+    for mode in args.modes:
+        results.extend(bench_mode(mode, db_uri, workdir, args))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Mixed read/write load on SQLite: the previous connection defaults (rollback
+journal, synchronous=FULL) against the tuned pragmas of database.py (WAL,
+synchronous=NORMAL, mmap, cache_size, busy_timeout).
+
+    cd backend
+    python benchmarks/db_concurrency.py --writers 4 --readers 8 --seconds 10
+
+Writers upload small documents through handle_document_upload, readers run
+search pages and document detail lookups; reported are operations/s, latency
+percentiles and "database is locked" errors per mode.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from werkzeug.datastructures import FileStorage  # noqa: E402
+from app import create_app, init_schema  # noqa: E402
+import helpers.services  # noqa: E402
+import seed_data  # noqa: E402
+from database import db  # noqa: E402
+from models import Document, Employee  # noqa: E402
+from helpers.services import get_document_detail, handle_document_upload, search_documents_page  # noqa: E402
+from helpers.user_context import load_user_context  # noqa: E402
+
+# SQLite / pysqlite behaviour before database.py set any pragmas
+LEGACY_PRAGMAS = {"journal_mode": "DELETE", "synchronous": "FULL", "busy_timeout": 5000,
+                  "cache_size": -2000, "mmap_size": 0, "temp_store": "DEFAULT"}
+MODES = {"legacy": LEGACY_PRAGMAS, "tuned": {}}
+
+
+def percentile(values: list[float], pct: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))], 2)
+
+
+def run_mode(name: str, pragmas: dict, args) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"db-concurrency-{name}-")
+    helpers.services.FILES_DIR = seed_data.FILES_DIR = os.path.join(workdir, "files")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+                      "SQLITE_PRAGMAS": pragmas})
+
+    with app.app_context():
+        init_schema()
+        seed_data.seed_synthetic_data(employees=100, documents=args.documents, departments=10)
+        usernames = [n for (n,) in db.session.query(Employee.name).limit(50)]
+        titles = [t for (t,) in db.session.query(Document.title).limit(2000)]
+        journal_mode = db.session.execute(db.text("PRAGMA journal_mode")).scalar()
+
+    stats = {"read": [], "write": [], "locked": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+    counter = iter(range(10 ** 9))
+
+    def worker(kind: str, seed: int):
+        rng = random.Random(seed)
+        with app.app_context():
+            while time.perf_counter() < deadline:
+                user = load_user_context(rng.choice(usernames))
+                started = time.perf_counter()
+                try:
+                    if kind == "write":
+                        n = next(counter)
+                        handle_document_upload(
+                            title=f"Concurrency upload {name} {n}", uploader=user,
+                            file=FileStorage(io.BytesIO(f"upload {n}".encode()), f"upload-{n}.txt"),
+                            version_number=1, departments=[], tags=["bench"])
+                    else:
+                        search_documents_page(rng.choice(["report", "policy", "audit"]), [], [], user)
+                        get_document_detail(user, rng.choice(titles))
+                    elapsed = (time.perf_counter() - started) * 1000
+                    with lock:
+                        stats[kind].append(elapsed)
+                except OperationalError as e:
+                    db.session.rollback()
+                    with lock:
+                        stats["locked" if "locked" in str(e) else "errors"] += 1
+            db.session.remove()
+
+    threads = [threading.Thread(target=worker, args=("write", i)) for i in range(args.writers)]
+    threads += [threading.Thread(target=worker, args=("read", 1000 + i)) for i in range(args.readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return {
+        "mode": name,
+        "journal_mode": journal_mode,
+        "writes_per_s": round(len(stats["write"]) / args.seconds, 1),
+        "reads_per_s": round(len(stats["read"]) / args.seconds, 1),
+        "write_p50_ms": percentile(stats["write"], 50),
+        "write_p95_ms": percentile(stats["write"], 95),
+        "read_p50_ms": percentile(stats["read"], 50),
+        "read_p95_ms": percentile(stats["read"], 95),
+        "locked_errors": stats["locked"],
+        "other_errors": stats["errors"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--documents", type=int, default=5000)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    results = [run_mode(name, MODES[name], args) for name in args.modes]
+
+    columns = list(results[0])
+    print("  ".join(f"{c:>13}" for c in columns))
+    for row in results:
+        print("  ".join(f"{str(row[c]):>13}" for c in columns))
+
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Drive every route through the Flask test client against a synthetic data set
+and report p50/p95/p99 latency and SQL queries per request.
+
+    cd backend
+    python benchmarks/load_test.py --documents 50000 --json run.json
+    python benchmarks/load_test.py --documents 50000 --compare run.json
+
+Database and stored files live in a temporary directory, so the working tree is untouched.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+from sqlalchemy import event  # noqa: E402
+from app import create_app, init_schema  # noqa: E402
+from database import db  # noqa: E402
+import helpers.services  # noqa: E402
+import seed_data  # noqa: E402
+from helpers.access import accessible_document_ids  # noqa: E402
+from models import Document, Employee, Tag  # noqa: E402
+
+PASSWORD = "password123"  # seed_synthetic_data's password for every employee
+
+
+def build_scenarios(sample: dict) -> list[tuple]:
+    """(name, role, method, path, kwargs factory, iterations factor) for every route."""
+    rng = random.Random(3)
+    title = lambda: rng.choice(sample["titles"])  # noqa: E731
+    word = lambda: rng.choice(["policy", "report", "security", "budget", "audit"])  # noqa: E731
+    upload_counter = iter(range(10 ** 9))
+
+    def upload_form():
+        n = next(upload_counter)
+        return {"data": {"title": f"Load test upload {n}", "version_number": "1",
+                         "tags": "loadtest", "departments": "",
+                         "file": (io.BytesIO(f"load test {n}".encode()), f"upload-{n}.txt")},
+                "content_type": "multipart/form-data"}
+
+    return [
+        ("GET /login", None, "get", "/login", lambda: {}, 1.0),
+        ("POST /login", None, "post", "/login",
+         lambda: {"data": {"username": sample["user"], "password": PASSWORD}}, 0.2),
+        ("GET /search", "user", "get", "/search", lambda: {}, 1.0),
+        ("POST /search title", "user", "post", "/search", lambda: {"data": {"title": word()}}, 1.0),
+        ("POST /search tags", "user", "post", "/search",
+         lambda: {"data": {"tags": rng.sample(sample["tags"], 2), "tag_mode": "any"}}, 1.0),
+        ("GET /api/search", "user", "get", "/api/search",
+         lambda: {"query_string": {"title": word(), "page_size": 20}}, 1.0),
+        ("GET /document_info", "user", "get", "/document_info",
+         lambda: {"query_string": {"title": title()}}, 1.0),
+        ("GET /download", "user", "get", "/download", lambda: {"query_string": {"title": title()}}, 1.0),
+        ("GET /view", "user", "get", "/view", lambda: {"query_string": {"title": title()}}, 1.0),
+        ("GET /upload", "user", "get", "/upload", lambda: {}, 1.0),
+        ("POST /upload", "user", "post", "/upload", upload_form, 0.5),
+        ("GET /sql_playground", "admin", "get", "/sql_playground", lambda: {}, 1.0),
+        ("GET /test_all_route", "admin", "get", "/test_all_route", lambda: {}, 0.05),
+    ]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="load-test-")
+    # Absolute, so send_file doesn't resolve blob paths against the app root
+    helpers.services.FILES_DIR = seed_data.FILES_DIR = os.path.join(workdir, "files")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'load.db')}",
+                      "SECRET_KEY": "load-test", "RATELIMIT_ENABLED": False})
+
+    with app.app_context():
+        init_schema()
+        seed = seed_data.seed_synthetic_data(employees=args.employees, documents=args.documents,
+                                             versions=args.versions, tags=args.tags,
+                                             departments=args.departments)
+        admin = db.session.query(Employee.name).order_by(Employee.id).first().name
+        user = db.session.query(Employee).order_by(Employee.id.desc()).first()
+        titles = [t for (t,) in db.session.query(Document.title)
+                  .filter(Document.id.in_(accessible_document_ids(user.department_id)))
+                  .limit(500)]
+        sample = {"user": user.name, "titles": titles,
+                  "tags": [t for (t,) in db.session.query(Tag.name).limit(50)]}
+
+        query_count = [0]
+        event.listen(db.engine, "before_cursor_execute",
+                     lambda *a: query_count.__setitem__(0, query_count[0] + 1))
+
+    clients = {None: app.test_client(), "user": app.test_client(), "admin": app.test_client()}
+    clients["user"].post("/login", data={"username": sample["user"], "password": PASSWORD})
+    clients["admin"].post("/login", data={"username": admin, "password": PASSWORD})
+
+    routes = {}
+    for name, role, method, path, make_kwargs, factor in build_scenarios(sample):
+        client = clients[role]
+        iterations = max(1, int(args.requests * factor))
+        for _ in range(min(args.warmup, iterations)):
+            getattr(client, method)(path, **make_kwargs())
+
+        latencies, queries, statuses = [], [], {}
+        for _ in range(iterations):
+            kwargs = make_kwargs()
+            query_count[0] = 0
+            start = time.perf_counter()
+            response = getattr(client, method)(path, **kwargs)
+            response.get_data()  # include body streaming (send_file)
+            latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(query_count[0])
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            response.close()
+
+        routes[name] = {
+            "requests": iterations,
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "mean_ms": round(statistics.fmean(latencies), 3),
+            "queries_per_request": round(statistics.fmean(queries), 2),
+            "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        }
+
+    return {"config": vars(args), "seed": seed, "routes": routes}
+
+
+def print_report(report: dict, baseline: dict = None) -> None:
+    header = f"{'route':<22} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8}  status"
+    if baseline:
+        header += "   p95 vs baseline"
+    print(header)
+    for name, r in report["routes"].items():
+        line = (f"{name:<22} {r['requests']:>5} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+                f"{r['p99_ms']:>9.2f} {r['queries_per_request']:>8.1f}  {r['statuses']}")
+        old = (baseline or {}).get("routes", {}).get(name)
+        if old:
+            change = (r["p95_ms"] - old["p95_ms"]) / max(old["p95_ms"], 1e-9) * 100
+            line += f"   {change:+.0f}% ({old['p95_ms']:.2f} ms)"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--employees", type=int, default=1000)
+    parser.add_argument("--documents", type=int, default=10000)
+    parser.add_argument("--versions", type=int, default=3)
+    parser.add_argument("--tags", type=int, default=200)
+    parser.add_argument("--departments", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=100, help="requests per route")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="previous --json result to compare against")
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    report = run(args)
+    print_report(report, baseline)
+
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Cost of the password-hashing policy (PASSWORD_HASH_METHOD): creating fixture
+employees, and POST /login for a correct password, a wrong password and an
+unknown user, plus the one-off rehash when a stored hash predates the policy.
+
+    cd backend
+    python benchmarks/login.py --policies fast pbkdf2:sha256:1000000 scrypt:32768:8:1
+
+Per policy: milliseconds per create_employee() (--employees of them), median POST
+/login latency per case (--repeat each), and the first and second login of an
+employee whose hash was made under the "fast" fixture policy (the first one rehashes).
+The unknown-user case should cost about as much as a wrong password.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+from app import create_app, init_schema  # noqa: E402
+from database import db  # noqa: E402
+from helpers.passwords import DEFAULT_PASSWORD_HASH_METHOD  # noqa: E402
+from helpers.services import create_employee  # noqa: E402
+from models import Employee  # noqa: E402
+
+PASSWORD = "bench-password"
+
+
+def login_ms(client, username: str, password: str) -> float:
+    started = time.perf_counter()
+    response = client.post("/login", data={"username": username, "password": password})
+    elapsed = (time.perf_counter() - started) * 1000
+    expected = 302 if password == PASSWORD and username != "nobody" else 200
+    assert response.status_code == expected, (username, response.status_code)
+    return elapsed
+
+
+def run_policy(policy: str, employees: int, repeat: int) -> dict:
+    workdir = tempfile.mkdtemp(prefix="login-")
+    db_uri = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    fixtures = create_app({"SQLALCHEMY_DATABASE_URI": db_uri, "SECRET_KEY": "login",
+                           "PASSWORD_HASH_METHOD": "fast", "RATELIMIT_ENABLED": False})
+    with fixtures.app_context():
+        init_schema()
+        create_employee("legacy", "legacy@example.com", PASSWORD, "user", "benchmark")
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": db_uri, "SECRET_KEY": "login", "PASSWORD_HASH_METHOD": policy,
+                      "RATELIMIT_ENABLED": False})
+    with app.app_context():
+        started = time.perf_counter()
+        for i in range(employees):
+            create_employee(f"bench-{i}", f"bench-{i}@example.com", PASSWORD, "user", "benchmark")
+        create_ms = (time.perf_counter() - started) * 1000 / employees
+        db.session.remove()
+
+    client = app.test_client()
+    login_ms(client, "bench-0", PASSWORD)  # warm up: templates, the policy's dummy hash
+    cases = {
+        "correct": ("bench-0", PASSWORD),
+        "wrong password": ("bench-0", "wrong-password"),
+        "unknown user": ("nobody", PASSWORD),
+    }
+    result = {"create_employee_ms": round(create_ms, 2)}
+    for name, (username, password) in cases.items():
+        result[f"{name} ms"] = round(statistics.median(
+            login_ms(client, username, password) for _ in range(repeat)), 2)
+    result["rehash login ms"] = round(login_ms(client, "legacy", PASSWORD), 2)
+    result["after rehash ms"] = round(login_ms(client, "legacy", PASSWORD), 2)
+    with app.app_context():
+        result["rehashed to"] = db.session.query(Employee.password_hash).filter_by(
+            name="legacy").scalar().split("$", 1)[0]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--policies", nargs="+",
+                        default=["fast", "pbkdf2:sha256:1000000", DEFAULT_PASSWORD_HASH_METHOD])
+    parser.add_argument("--employees", type=int, default=20, help="create_employee() calls per policy")
+    parser.add_argument("--repeat", type=int, default=5, help="logins per case")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    results = {policy: run_policy(policy, args.employees, args.repeat) for policy in args.policies}
+
+    columns = ["create_employee_ms", "correct ms", "wrong password ms", "unknown user ms",
+               "rehash login ms", "after rehash ms"]
+    print(f"{'policy':<24}" + "".join(f"{column:>20}" for column in columns))
+    for policy, row in results.items():
+        print(f"{policy:<24}" + "".join(f"{row[column]:>20}" for column in columns))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
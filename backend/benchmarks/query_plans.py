@@ -0,0 +1,144 @@
+"""
+Query plans and timings of the hot lookup queries before and after the
+index migrations (0003 "hot path indexes", 0004 "covering tag index").
+
+    cd backend
+    python benchmarks/query_plans.py --documents 20000
+
+Builds a throwaway SQLite database, drops those indexes, measures, then runs
+the real migrations (stamp 0002 + upgrade) and measures again.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from flask_migrate import stamp, upgrade  # noqa: E402
+from sqlalchemy import insert, text  # noqa: E402
+from app import create_app, init_schema  # noqa: E402
+from database import db  # noqa: E402
+from models import (  # noqa: E402
+    Department, Document, DocumentPermission, DocumentTag, DocumentVersion, Employee, Role, Tag,
+)
+
+MIGRATION_INDEXES = {
+    "uq_documents_title": "documents",
+    "uq_document_versions_document_version": "document_versions",
+    "ix_document_tags_tag_document": "document_tags",
+    "uq_document_permissions_document_department": "document_permissions",
+}
+
+QUERIES = {
+    "title lookup": (
+        "SELECT id FROM documents WHERE title = :title", "title"),
+    "version lookup": (
+        "SELECT id FROM document_versions WHERE document_id = :document_id "
+        "AND version_number = :version_number", "version"),
+    "permission check": (
+        "SELECT id FROM document_permissions WHERE document_id = :document_id "
+        "AND department_id = :department_id", "permission"),
+    "documents by tag": (
+        "SELECT document_tags.document_id FROM document_tags "
+        "JOIN tags ON tags.id = document_tags.tag_id WHERE tags.name = :tag", "tag"),
+}
+
+
+def populate(documents: int, departments: int, tags: int, versions: int, seed: int = 42):
+    rng = random.Random(seed)
+    db.session.execute(insert(Role).values([{"id": 1, "name": "user"}]))
+    db.session.execute(insert(Department), [
+        {"id": i, "name": f"dept{i}"} for i in range(1, departments + 1)])
+    db.session.execute(insert(Tag), [{"id": i, "name": f"tag{i}"} for i in range(1, tags + 1)])
+    db.session.execute(insert(Employee), [{
+        "id": 1, "name": "bench", "email": "bench@example.com",
+        "password_hash": "x", "role_id": 1, "department_id": 1}])
+
+    db.session.execute(insert(Document), [
+        {"id": d, "title": f"Document {d}", "uploader_id": 1} for d in range(1, documents + 1)])
+    db.session.execute(insert(DocumentVersion), [
+        {"document_id": d, "version_number": float(v), "filepath": "x",
+         "filename": "x.pdf", "uploader_id": 1}
+        for d in range(1, documents + 1) for v in range(1, versions + 1)])
+    db.session.execute(insert(DocumentTag), [
+        {"document_id": d, "tag_id": t}
+        for d in range(1, documents + 1) for t in rng.sample(range(1, tags + 1), 3)])
+    db.session.execute(insert(DocumentPermission), [
+        {"document_id": d, "department_id": dep}
+        for d in range(1, documents + 1) for dep in rng.sample(range(1, departments + 1), 2)])
+    db.session.commit()
+
+
+def params_for(kind: str, rng: random.Random, documents: int, departments: int, tags: int, versions: int):
+    document_id = rng.randint(1, documents)
+    return {
+        "title": {"title": f"Document {document_id}"},
+        "version": {"document_id": document_id, "version_number": float(rng.randint(1, versions))},
+        "permission": {"document_id": document_id, "department_id": rng.randint(1, departments)},
+        "tag": {"tag": f"tag{rng.randint(1, tags)}"},
+    }[kind]
+
+
+def measure(repeat: int, sizes: dict) -> dict:
+    rng = random.Random(7)
+    results = {}
+    for name, (sql, kind) in QUERIES.items():
+        plan = [row[-1] for row in db.session.execute(
+            text(f"EXPLAIN QUERY PLAN {sql}"), params_for(kind, rng, **sizes))]
+        start = time.perf_counter()
+        for _ in range(repeat):
+            db.session.execute(text(sql), params_for(kind, rng, **sizes)).fetchall()
+        elapsed = time.perf_counter() - start
+        results[name] = {"plan": plan, "mean_us": round(elapsed / repeat * 1e6, 1)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--departments", type=int, default=20)
+    parser.add_argument("--tags", type=int, default=200)
+    parser.add_argument("--versions", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    sizes = {"documents": args.documents, "departments": args.departments,
+             "tags": args.tags, "versions": args.versions}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(tmp, 'bench.db')}"})
+        with app.app_context():
+            init_schema()
+            populate(**sizes)
+
+            for index in MIGRATION_INDEXES:
+                db.session.execute(text(f"DROP INDEX {index}"))
+            db.session.commit()
+            db.session.execute(text("ANALYZE"))
+            before = measure(args.repeat, sizes)
+
+            stamp(revision="0002")  # the tables exist, the indexes were dropped
+            upgrade()
+            db.session.execute(text("ANALYZE"))
+            after = measure(args.repeat, sizes)
+            db.session.remove()
+            db.engine.dispose()
+
+    for name in QUERIES:
+        b, a = before[name], after[name]
+        print(f"\n== {name}: {b['mean_us']} us -> {a['mean_us']} us "
+              f"({b['mean_us'] / max(a['mean_us'], 0.1):.1f}x)")
+        print("   before: " + " | ".join(b["plan"]))
+        print("   after:  " + " | ".join(a["plan"]))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"sizes": sizes, "before": before, "after": after}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
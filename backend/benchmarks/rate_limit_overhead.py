@@ -0,0 +1,167 @@
+"""
+Per-request cost of the rate limiter (helpers/rate_limits.py): the same requests
+with limiting off, on the in-process memory storage and on the shared SQLite file.
+
+    cd backend
+    python benchmarks/rate_limit_overhead.py --requests 2000 --processes 4
+
+Requests go through the Flask test client to cheap paths, so the limiter check is a
+visible share: GET / (default budget, a redirect), GET /download without a title
+(route budget, a 400 before any file work) and a 1-byte Range download (route
+budget plus the bandwidth charge). Budgets are raised so nothing is refused.
+Reported: microseconds per request (median of --rounds) and the overhead over
+"off", which is within the run-to-run noise of a test-client request, so the
+dispatch of a request (Flask-Limiter's hooks and view wrapper) is also timed
+without the test client. The storage section times
+SQLiteStorage.incr alone, in one process and in --processes processes hitting the
+same file (the multi-worker case).
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+from werkzeug.datastructures import FileStorage  # noqa: E402
+from app import create_app, init_schema  # noqa: E402
+import helpers.services  # noqa: E402
+from database import db  # noqa: E402
+from models import Role  # noqa: E402
+from helpers.rate_limits import RATE_LIMITS, SQLiteStorage  # noqa: E402
+from helpers.services import create_employee, handle_document_upload  # noqa: E402
+from helpers.user_context import load_user_context  # noqa: E402
+
+UNLIMITED = "100000000 per minute"
+PATHS = {
+    "GET /": ({"path": "/"}, 302),
+    "GET /download (400)": ({"path": "/download"}, 400),
+    "GET /download 1 byte": ({"path": "/download", "query_string": {"title": "bench"},
+                              "headers": {"Range": "bytes=0-0"}}, 206),
+}
+
+
+def build_app(workdir: str, storage_uri: str | None):
+    config = {"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+              "SECRET_KEY": "rate-limits", "PASSWORD_HASH_METHOD": "fast",
+              "RATELIMIT_ENABLED": storage_uri is not None}
+    if storage_uri:
+        config["RATELIMIT_STORAGE_URI"] = storage_uri
+    config.update({f"RATELIMIT_{name.upper()}": UNLIMITED for name in RATE_LIMITS})
+    return create_app(config)
+
+
+def prepare(workdir: str) -> None:
+    helpers.services.FILES_DIR = os.path.join(workdir, "files")
+    app = build_app(workdir, None)
+    with app.app_context():
+        init_schema()
+        db.session.add(Role(name="user"))
+        db.session.commit()
+        create_employee("bench", "bench@example.com", "bench-password", "user", "benchmark")
+        handle_document_upload(
+            title="bench", uploader=load_user_context("bench"),
+            file=FileStorage(stream=io.BytesIO(b"x" * 4096), filename="bench.pdf"),
+            version_number=1, departments=[], tags=[])
+
+
+def time_requests(client, requests: int, path: str, expected: int, **kwargs) -> float:
+    """Microseconds per request."""
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path, **kwargs)
+        assert response.status_code == expected, (path, response.status_code)
+        response.close()
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def measure_mode(workdir: str, storage_uri: str | None, requests: int, rounds: int) -> dict:
+    app = build_app(workdir, storage_uri)
+    client = app.test_client()
+    client.post("/login", data={"username": "bench", "password": "bench-password"})
+    results = {}
+    for name, (kwargs, expected) in PATHS.items():
+        kwargs = dict(kwargs)
+        path = kwargs.pop("path")
+        time_requests(client, 200, path, expected, **kwargs)  # warm up
+        results[name] = round(statistics.median(
+            time_requests(client, requests, path, expected, **kwargs) for _ in range(rounds)), 1)
+    return results
+
+
+def measure_dispatch(workdir: str, storage_uri: str | None, calls: int) -> float:
+    """Microseconds per dispatch of GET /download (400) in a bare request context: hooks plus view."""
+    app = build_app(workdir, storage_uri)
+
+    def dispatch():
+        with app.test_request_context("/download"):
+            app.full_dispatch_request()
+
+    for _ in range(200):
+        dispatch()
+    started = time.perf_counter()
+    for _ in range(calls):
+        dispatch()
+    return round((time.perf_counter() - started) / calls * 1e6, 1)
+
+
+def _hammer(args) -> float:
+    path, hits, worker = args
+    storage = SQLiteStorage(f"sqlite:///{path}")
+    started = time.perf_counter()
+    for i in range(hits):
+        storage.incr(f"LIMITER/client-{worker}-{i % 50}/endpoint/100/1/minute", 60)
+    return (time.perf_counter() - started) / hits * 1e6
+
+
+def measure_storage(workdir: str, hits: int, processes: int) -> dict:
+    path = os.path.join(workdir, "storage.db")
+    single = _hammer((path, hits, 0))
+    with multiprocessing.Pool(processes) as pool:
+        shared = pool.map(_hammer, [(path, hits, worker) for worker in range(processes)])
+    return {"incr_us": round(single, 1), f"incr_us_{processes}_processes": round(statistics.mean(shared), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per path and round")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--processes", type=int, default=4, help="processes sharing the SQLite storage")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="rate-limits-")
+    prepare(workdir)
+    modes = {
+        "off": None,
+        "memory": "memory://",
+        "sqlite": f"sqlite:///{os.path.join(workdir, 'ratelimits.db')}",
+    }
+    results = {mode: measure_mode(workdir, uri, args.requests, args.rounds) for mode, uri in modes.items()}
+    dispatch = {mode: measure_dispatch(workdir, uri, args.requests * 5) for mode, uri in modes.items()}
+    storage = measure_storage(workdir, args.requests, args.processes)
+
+    print(f"{'path':<22}" + "".join(f"{mode + ' us':>12}" for mode in modes) +
+          "".join(f"{'+' + mode + ' us':>13}" for mode in list(modes)[1:]))
+    for path in PATHS:
+        off = results["off"][path]
+        print(f"{path:<22}" + "".join(f"{results[mode][path]:>12}" for mode in modes) +
+              "".join(f"{round(results[mode][path] - off, 1):>13}" for mode in list(modes)[1:]))
+    print("\nlimiter alone (dispatch without the test client, over off): " + ", ".join(
+        f"{mode} +{round(us - dispatch['off'], 1)} us" for mode, us in dispatch.items() if mode != "off"))
+    print(f"SQLiteStorage.incr: {storage['incr_us']} us in one process, "
+          f"{storage[f'incr_us_{args.processes}_processes']} us with {args.processes} processes")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"requests": results, "dispatch_us": dispatch, "storage": storage}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
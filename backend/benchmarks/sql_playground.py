@@ -0,0 +1,95 @@
+"""
+SQL playground memory and latency: the previous fetchall() + pandas to_html
+rendering against the streaming executor (helpers.sql_playground), for a
+SELECT * over a large table.
+
+    cd backend
+    python benchmarks/sql_playground.py --documents 50000
+
+Reported per mode: time to the first HTML chunk, total time, peak Python memory
+(tracemalloc) and output size. The pandas mode is skipped if pandas isn't installed.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from sqlalchemy import text  # noqa: E402
+from app import create_app, init_schema  # noqa: E402
+import helpers.services  # noqa: E402
+import seed_data  # noqa: E402
+from database import db  # noqa: E402
+from helpers.sql_playground import PLAYGROUND_MAX_BYTES, PLAYGROUND_MAX_ROWS, render_query_html  # noqa: E402
+
+QUERY = "SELECT * FROM document_versions"
+
+
+def pandas_html(query: str):
+    import pandas as pd
+    result = db.session.execute(text(query))
+    rows = result.fetchall()
+    yield pd.DataFrame(rows, columns=result.keys()).to_html(classes="table table-bordered", index=False)
+
+
+def measure(chunks) -> dict:
+    tracemalloc.start()
+    started = time.perf_counter()
+    first, size = None, 0
+    for chunk in chunks:
+        if first is None:
+            first = time.perf_counter() - started
+        size += len(chunk)
+    total = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"first_chunk_ms": round(first * 1000, 1), "total_ms": round(total * 1000, 1),
+            "peak_mb": round(peak / 2 ** 20, 1), "output_kb": size // 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=50000, help="3 versions each")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="sql-playground-")
+    helpers.services.FILES_DIR = seed_data.FILES_DIR = os.path.join(workdir, "files")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'bench.db')}"})
+
+    modes = {
+        "pandas": lambda: pandas_html(QUERY),
+        "streaming (all rows)": lambda: render_query_html(QUERY, max_rows=10 ** 9, max_bytes=10 ** 12),
+        "streaming (limits)": lambda: render_query_html(
+            QUERY, max_rows=PLAYGROUND_MAX_ROWS, max_bytes=PLAYGROUND_MAX_BYTES),
+    }
+    try:
+        import pandas  # noqa: F401
+    except ImportError:
+        del modes["pandas"]
+
+    results = {}
+    with app.app_context():
+        init_schema()
+        seed_data.seed_synthetic_data(employees=100, documents=args.documents, departments=10)
+        for name, chunks in modes.items():
+            results[name] = measure(chunks())
+            db.session.remove()
+
+    print(f"{QUERY} ({args.documents * 3} rows)")
+    print(f"{'mode':<22} {'first chunk ms':>14} {'total ms':>9} {'peak MB':>8} {'output KB':>10}")
+    for name, row in results.items():
+        print(f"{name:<22} {row['first_chunk_ms']:>14} {row['total_ms']:>9} {row['peak_mb']:>8} "
+              f"{row['output_kb']:>10}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
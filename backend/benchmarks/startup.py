@@ -0,0 +1,166 @@
+"""
+Cold start of a worker: import time, create_app(), the first requests and the
+resident memory, each in a fresh interpreter, plus an import-time profile.
+
+    cd backend
+    python benchmarks/startup.py --runs 5 --top 15
+
+Modes:
+  lazy   create_app() as it is: no schema work at boot, Alembic / seed data / pandas
+         only loaded by the commands that need them
+  eager  the previous boot: flask_migrate, seed_data and (if installed) pandas
+         imported up front, and the schema / index / access checks on every start
+
+Per mode (median over --runs): `import app`, create_app(), time to the first
+response (GET /login, templates compiled on first use) and to the first search page
+of a logged-in user, all from interpreter start, and VmRSS after import and after the
+first requests (Linux /proc). The profile lists the slowest imports under `import app`
+(python -X importtime, cumulative).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+MODES = ("lazy", "eager")
+USERNAME = "bench"
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return float("nan")
+
+
+def child(mode: str, db_uri: str) -> dict:
+    """One cold start (invoked as a subprocess by the benchmark); timings from interpreter start."""
+    sys.path.insert(0, BACKEND_DIR)
+    started = time.perf_counter()
+    import app as app_module
+    imported = time.perf_counter()
+    rss_import = rss_mb()
+
+    app = app_module.create_app({"SQLALCHEMY_DATABASE_URI": db_uri, "SECRET_KEY": "startup",
+                                 "RATELIMIT_STORAGE_URI": "sqlite:///ratelimits.db"})  # in the workdir
+    if mode == "eager":
+        import flask_migrate  # noqa: F401
+        import seed_data  # noqa: F401
+        try:
+            import pandas  # noqa: F401
+        except ImportError:
+            pass
+        with app.app_context():
+            app_module.init_schema()
+    created = time.perf_counter()
+
+    client = app.test_client()
+    assert client.get("/login").status_code == 200
+    first_response = time.perf_counter()
+    with client.session_transaction() as session:
+        session.update(user_id=1, username=USERNAME, role="user")
+    assert client.get("/search").status_code == 200
+    first_search = time.perf_counter()
+
+    def ms(t):
+        return round((t - started) * 1000, 1)
+    return {"import_ms": ms(imported), "create_app_ms": ms(created), "first_response_ms": ms(first_response),
+            "first_search_ms": ms(first_search), "rss_import_mb": rss_import, "rss_mb": rss_mb()}
+
+
+def prepare(workdir: str) -> str:
+    """A small database with one user, set up once in a throwaway process."""
+    db_uri = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    script = (
+        "import sys; sys.path.insert(0, sys.argv[1])\n"
+        "from app import create_app, init_schema\n"
+        "from models import Role\n"
+        "from database import db\n"
+        "from helpers.services import create_employee\n"
+        "app = create_app({'SQLALCHEMY_DATABASE_URI': sys.argv[2], 'PASSWORD_HASH_METHOD': 'fast'})\n"
+        "with app.app_context():\n"
+        "    init_schema()\n"
+        "    db.session.add(Role(name='user'))\n"
+        "    db.session.commit()\n"
+        f"    create_employee('{USERNAME}', 'bench@example.com', 'bench-password', 'user', 'benchmark')\n")
+    subprocess.run([sys.executable, "-c", script, BACKEND_DIR, db_uri], check=True, cwd=workdir,
+                   stdout=subprocess.DEVNULL)
+    return db_uri
+
+
+def cold_start(mode: str, db_uri: str, workdir: str) -> dict:
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode, "--db", db_uri],
+                         check=True, cwd=workdir, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def import_profile(workdir: str) -> list[dict]:
+    """Cumulative import time of `import app` and the modules it pulled in (depth 1 = direct imports)."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import sys; sys.path.insert(0, sys.argv[1]); "
+                             "import app", BACKEND_DIR], check=True, cwd=workdir, capture_output=True,
+                            text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        module = name.lstrip(" ")
+        # Children are indented two spaces per level under their parent
+        rows.append({"module": module, "depth": (len(name) - len(module) - 1) // 2,
+                     "cumulative_ms": round(int(cumulative) / 1000, 1)})
+    # A module is reported after its imports: app's subtree is the rows since the previous top-level one
+    end = next(i for i, row in enumerate(rows) if row["module"] == "app" and row["depth"] == 0)
+    start = max((i for i in range(end) if rows[i]["depth"] == 0), default=-1) + 1
+    return rows[start:end + 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="cold starts per mode")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--top", type=int, default=15, help="modules in the import-time profile")
+    parser.add_argument("--depth", type=int, default=2, help="deepest import level listed in the profile")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.child, args.db)))
+        return
+
+    workdir = tempfile.mkdtemp(prefix="startup-")
+    db_uri = prepare(workdir)
+    results = {}
+    for mode in args.modes:
+        runs = [cold_start(mode, db_uri, workdir) for _ in range(args.runs)]
+        results[mode] = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+    print(f"{'mode':<6} {'import ms':>10} {'create_app ms':>14} {'1st response ms':>16} "
+          f"{'1st search ms':>14} {'RSS import MB':>14} {'RSS MB':>7}")
+    for mode, row in results.items():
+        print(f"{mode:<6} {row['import_ms']:>10} {row['create_app_ms']:>14} {row['first_response_ms']:>16} "
+              f"{row['first_search_ms']:>14} {row['rss_import_mb']:>14} {row['rss_mb']:>7}")
+
+    profile = import_profile(workdir)
+    print(f"\nimport app: {profile[-1]['cumulative_ms']} ms; slowest imports (cumulative, indented by depth):")
+    for row in sorted((row for row in profile if 0 < row["depth"] <= args.depth),
+                      key=lambda row: row["cumulative_ms"], reverse=True)[:args.top]:
+        print(f"  {row['cumulative_ms']:>8} ms  {'  ' * (row['depth'] - 1)}{row['module']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"runs": args.runs, "results": results, "import_profile": profile}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
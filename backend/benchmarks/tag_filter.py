@@ -0,0 +1,103 @@
+"""
+Multi-tag filtering: one IN-subquery per tag (the previous search_documents)
+versus the single GROUP BY/HAVING subquery of apply_tag_filters, by tag count.
+
+    cd backend
+    python benchmarks/tag_filter.py --documents 20000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from sqlalchemy import insert  # noqa: E402
+from app import create_app, init_schema  # noqa: E402
+from database import db  # noqa: E402
+from helpers.services import apply_tag_filters  # noqa: E402
+from models import Document, DocumentTag, Employee, Role, Tag  # noqa: E402
+
+
+def populate(documents: int, tags: int, tags_per_document: int, seed: int = 42):
+    rng = random.Random(seed)
+    db.session.execute(insert(Role).values([{"id": 1, "name": "user"}]))
+    db.session.execute(insert(Employee), [{
+        "id": 1, "name": "bench", "email": "bench@example.com", "password_hash": "x", "role_id": 1}])
+    db.session.execute(insert(Tag), [{"id": i, "name": f"tag{i}"} for i in range(1, tags + 1)])
+    db.session.execute(insert(Document), [
+        {"id": d, "title": f"Document {d}", "uploader_id": 1} for d in range(1, documents + 1)])
+    db.session.execute(insert(DocumentTag), [
+        {"document_id": d, "tag_id": t}
+        for d in range(1, documents + 1)
+        for t in rng.sample(range(1, tags + 1), tags_per_document)])
+    db.session.commit()
+
+
+def legacy_tag_filter(query, tags):
+    """search_documents before user-010: one IN (subquery) per tag."""
+    for tag_name in tags:
+        tag_subquery = (
+            db.session.query(DocumentTag.document_id)
+            .join(Tag, Tag.id == DocumentTag.tag_id)
+            .filter(Tag.name == tag_name)
+            .subquery().select()
+        )
+        query = query.filter(Document.id.in_(tag_subquery))
+    return query
+
+
+def timed(build, repeat: int):
+    rows = None
+    start = time.perf_counter()
+    for _ in range(repeat):
+        rows = build().all()
+    return (time.perf_counter() - start) / repeat * 1000, {r.id for r in rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--tags", type=int, default=40)
+    parser.add_argument("--tags-per-document", type=int, default=12)
+    parser.add_argument("--counts", default="1,2,4,8,16")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(tmp, 'bench.db')}"})
+        with app.app_context():
+            init_schema()
+            populate(args.documents, args.tags, args.tags_per_document)
+            rng = random.Random(1)
+
+            print(f"{'tags':>5} {'mode':>5} {'legacy ms':>10} {'grouped ms':>11} {'matches':>8}")
+            for count in [int(c) for c in args.counts.split(",")]:
+                tags = [f"tag{t}" for t in rng.sample(range(1, args.tags + 1), count)]
+                base = lambda: db.session.query(Document.id)  # noqa: E731
+
+                legacy_ms, legacy_ids = timed(lambda: legacy_tag_filter(base(), tags), args.repeat)
+                all_ms, all_ids = timed(lambda: apply_tag_filters(base(), tags, "all"), args.repeat)
+                any_ms, any_ids = timed(lambda: apply_tag_filters(base(), tags, "any"), args.repeat)
+                assert legacy_ids == all_ids, "grouped 'all' filter disagrees with the legacy filter"
+
+                print(f"{count:>5} {'all':>5} {legacy_ms:>10.2f} {all_ms:>11.2f} {len(all_ids):>8}")
+                print(f"{count:>5} {'any':>5} {'-':>10} {any_ms:>11.2f} {len(any_ids):>8}")
+                results.append({"tags": count, "legacy_all_ms": round(legacy_ms, 3),
+                                "grouped_all_ms": round(all_ms, 3), "grouped_any_ms": round(any_ms, 3),
+                                "all_matches": len(all_ids), "any_matches": len(any_ids)})
+            db.session.remove()
+            db.engine.dispose()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Title search timings and query plans: substring (words) and fuzzy (trigram
+similarity) title modes.
+
+    cd backend
+    python benchmarks/title_search.py --documents 50000
+    python benchmarks/title_search.py --database-url postgresql+psycopg://user:pw@localhost/bench
+
+Without --database-url a throwaway SQLite database is used (FTS5 for words,
+Python similarity() for fuzzy); against PostgreSQL the plans show whether the
+pg_trgm index (migration 0005) is used. The PostgreSQL database should be empty:
+it is seeded with synthetic data and its tables are dropped afterwards.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app import create_app, init_schema  # noqa: E402
+import helpers.services  # noqa: E402
+import seed_data  # noqa: E402
+from database import db  # noqa: E402
+from models import Document, Employee  # noqa: E402
+from helpers.services import _build_search_query, search_documents_page  # noqa: E402
+from helpers.user_context import load_user_context  # noqa: E402
+
+
+def typo(title: str, rng: random.Random) -> str:
+    """Drop one character of a random word (a misspelled query)."""
+    words = title.split()
+    i = rng.randrange(len(words))
+    if len(words[i]) > 3:
+        j = rng.randrange(len(words[i]))
+        words[i] = words[i][:j] + words[i][j + 1:]
+    return " ".join(words)
+
+
+def explain(user, title: str, title_mode: str) -> list[str]:
+    query, _ = _build_search_query(user, title, [], [], None, title_mode=title_mode)
+    statement = query.statement.compile(db.engine, compile_kwargs={"literal_binds": True})
+    prefix = "EXPLAIN QUERY PLAN " if db.engine.dialect.name == "sqlite" else "EXPLAIN "
+    return [str(row[-1]) for row in db.session.execute(db.text(prefix + str(statement)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", help="database to benchmark (default: temporary SQLite)")
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="title-search-")
+    helpers.services.FILES_DIR = seed_data.FILES_DIR = os.path.join(workdir, "files")
+    app = create_app({"SQLALCHEMY_DATABASE_URI":
+                      args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"})
+
+    rng = random.Random(7)
+    results = {}
+    with app.app_context():
+        init_schema()
+        seed_data.seed_synthetic_data(employees=200, documents=args.documents, departments=10)
+        db.session.execute(db.text("ANALYZE"))
+        user = load_user_context(db.session.query(Employee.name).first()[0])
+        titles = [t for (t,) in db.session.query(Document.title).limit(1000)]
+
+        cases = {
+            "words": lambda: rng.choice(titles).split()[rng.randrange(3)][:5],
+            "fuzzy": lambda: typo(rng.choice(titles), rng),
+        }
+        for mode, make_title in cases.items():
+            timings, hits = [], 0
+            for _ in range(args.repeat):
+                title = make_title()
+                started = time.perf_counter()
+                page = search_documents_page(title, [], [], user, title_mode=mode)
+                timings.append((time.perf_counter() - started) * 1000)
+                hits += bool(page["results"])
+            timings.sort()
+            results[mode] = {
+                "p50_ms": round(timings[len(timings) // 2], 2),
+                "p95_ms": round(timings[int(len(timings) * 0.95)], 2),
+                "queries_with_results": hits,
+                "plan": explain(user, make_title(), mode),
+            }
+
+        dialect = db.engine.dialect.name
+        if args.database_url:
+            db.session.remove()
+            db.drop_all()
+
+    print(f"{dialect}, {args.documents} documents, {args.repeat} searches per mode")
+    for mode, row in results.items():
+        print(f"\n== {mode}: p50 {row['p50_ms']} ms, p95 {row['p95_ms']} ms, "
+              f"{row['queries_with_results']}/{args.repeat} with results")
+        print("   " + "\n   ".join(row["plan"]))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"dialect": dialect, "documents": args.documents, "modes": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Disk use and reconstruction latency of the document storage modes
+(DOCUMENT_STORAGE=full vs compact, helpers/blob_encoding.py) on version chains.
+
+    cd backend
+    python benchmarks/version_storage.py --versions 30 --paragraphs 2000
+
+Per format (a TXT file and a DOCX with an embedded image) a document gets
+--versions versions, each editing a few paragraphs of the previous one, uploaded
+through handle_document_upload. Reported per mode: bytes the versions take in the
+blob store against their total size, milliseconds per upload, and the latency of
+get_document_file (what /download serves from) for every version: cold (empty
+reconstruction cache, the whole delta chain is replayed) and warm (cached copy).
+"""
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from werkzeug.datastructures import FileStorage  # noqa: E402
+from app import create_app, init_schema  # noqa: E402
+import helpers.services  # noqa: E402
+from database import db  # noqa: E402
+from models import Role  # noqa: E402
+from helpers.blob_encoding import SNAPSHOT_INTERVAL  # noqa: E402
+from helpers.services import create_employee, get_document_file, handle_document_upload  # noqa: E402
+from helpers.user_context import load_user_context  # noqa: E402
+
+MODES = ("full", "compact")
+_DOCX_DATE = (2024, 1, 1, 0, 0, 0)
+
+
+def make_chain(paragraphs: int, versions: int, seed: int = 7) -> list[list[str]]:
+    """Paragraph lists of successive versions: each one edits, inserts or deletes 1-3 paragraphs."""
+    rng = random.Random(seed)
+    words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 10)))
+             for _ in range(5000)]
+
+    def paragraph():
+        return " ".join(rng.choice(words) for _ in range(rng.randint(20, 120))).capitalize() + "."
+
+    chain = [[paragraph() for _ in range(paragraphs)]]
+    for _ in range(versions - 1):
+        text = list(chain[-1])
+        for _ in range(rng.randint(1, 3)):
+            i = rng.randrange(len(text))
+            action = rng.random()
+            if action < 0.6:
+                text[i] = paragraph()
+            elif action < 0.8:
+                text.insert(i, paragraph())
+            else:
+                del text[i]
+        chain.append(text)
+    return chain
+
+
+def to_txt(paragraphs: list[str]) -> bytes:
+    return "\n\n".join(paragraphs).encode() + b"\n"
+
+
+def to_docx(paragraphs: list[str], image: bytes) -> bytes:
+    """Minimal Word document: the paragraphs in word/document.xml plus an embedded picture."""
+    body = "".join(f"<w:p><w:r><w:t>{text}</w:t></w:r></w:p>" for text in paragraphs)
+    members = {
+        "[Content_Types].xml": '<?xml version="1.0"?><Types xmlns="http://schemas.openxmlformats.org/'
+                               'package/2006/content-types"/>',
+        "word/document.xml": '<?xml version="1.0"?><w:document xmlns:w="http://schemas.openxmlformats.org/'
+                             f'wordprocessingml/2006/main"><w:body>{body}</w:body></w:document>',
+    }
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w") as archive:
+        for name, content in members.items():
+            archive.writestr(zipfile.ZipInfo(name, _DOCX_DATE), content, zipfile.ZIP_DEFLATED)
+        archive.writestr(zipfile.ZipInfo("word/media/image1.png", _DOCX_DATE), image, zipfile.ZIP_STORED)
+    return out.getvalue()
+
+
+FORMATS = {"txt": lambda paragraphs, image: to_txt(paragraphs), "docx": to_docx}
+
+
+def blob_store_bytes(files_dir: str) -> int:
+    total = 0
+    for root, _, names in os.walk(os.path.join(files_dir, "blobs")):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in names)
+    return total
+
+
+def get_ms(title: str, version: int) -> float:
+    started = time.perf_counter()
+    _, filepath = get_document_file(title, version)
+    elapsed = (time.perf_counter() - started) * 1000
+    assert filepath, (title, version)
+    return elapsed
+
+
+def run_mode(mode: str, ext: str, contents: list[bytes]) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"version-storage-{mode}-")
+    files_dir = os.path.join(workdir, "files")
+    helpers.services.FILES_DIR = files_dir
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+                      "PASSWORD_HASH_METHOD": "fast", "DOCUMENT_STORAGE": mode})
+    title = f"Handbook ({ext})"
+
+    with app.app_context():
+        init_schema()
+        db.session.add(Role(name="user"))
+        db.session.commit()
+        create_employee("bench", "bench@example.com", "bench-password", "user", "benchmark")
+        uploader = load_user_context("bench")
+
+        upload_ms = []
+        for number, content in enumerate(contents, start=1):
+            started = time.perf_counter()
+            handle_document_upload(
+                title=title, uploader=uploader,
+                file=FileStorage(stream=io.BytesIO(content), filename=f"handbook.{ext}"),
+                version_number=number, departments=[], tags=[])
+            upload_ms.append((time.perf_counter() - started) * 1000)
+
+        cold_ms = []
+        for number in range(1, len(contents) + 1):
+            shutil.rmtree(os.path.join(files_dir, "reconstructed"), ignore_errors=True)
+            cold_ms.append(get_ms(title, number))
+        for number in range(1, len(contents) + 1):
+            get_document_file(title, number)  # fill the reconstruction cache
+        warm_ms = [get_ms(title, number) for number in range(1, len(contents) + 1)]
+
+        _, latest = get_document_file(title, len(contents))
+        with open(latest, "rb") as f:
+            assert f.read() == contents[-1], "latest version does not round-trip"
+
+    raw = sum(len(content) for content in contents)
+    stored = blob_store_bytes(files_dir)
+    return {
+        "raw_bytes": raw,
+        "stored_bytes": stored,
+        "stored_pct": round(stored / raw * 100, 2),
+        "upload_ms": round(statistics.median(upload_ms), 2),
+        "cold_get_ms": round(statistics.median(cold_ms), 2),
+        "cold_get_max_ms": round(max(cold_ms), 2),
+        "warm_get_ms": round(statistics.median(warm_ms), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--versions", type=int, default=30)
+    parser.add_argument("--paragraphs", type=int, default=2000, help="paragraphs of the first version")
+    parser.add_argument("--image-kb", type=int, default=200, help="size of the picture in the DOCX")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    chain = make_chain(args.paragraphs, args.versions)
+    image = random.Random(1).randbytes(args.image_kb * 1024)
+    results = {}
+    for ext, render in FORMATS.items():
+        contents = [render(paragraphs, image) for paragraphs in chain]
+        for mode in MODES:
+            results[f"{ext} {mode}"] = run_mode(mode, ext, contents)
+
+    print(f"{args.versions} versions, a full snapshot every {SNAPSHOT_INTERVAL} in compact mode")
+    columns = ["raw_bytes", "stored_bytes", "stored_pct", "upload_ms", "cold_get_ms", "cold_get_max_ms",
+               "warm_get_ms"]
+    print(f"{'chain':<14}" + "".join(f"{column:>16}" for column in columns))
+    for name, row in results.items():
+        print(f"{name:<14}" + "".join(f"{row[column]:>16}" for column in columns))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,70 @@
+import os
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 
 db = SQLAlchemy()
+
+DEFAULT_DATABASE_URI = "sqlite:///siemens.db"
+
+# Applied to every new SQLite connection; override single values with the
+# SQLITE_PRAGMAS app config (e.g. {"journal_mode": "DELETE"})
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",  # readers and the writer don't block each other
+    "synchronous": "NORMAL",  # with WAL: durable, fsync at checkpoints only
+    "busy_timeout": 5000,  # ms to wait for the write lock instead of "database is locked"
+    "cache_size": -64000,  # 64 MB page cache (negative = KiB)
+    "mmap_size": 256 * 1024 * 1024,  # memory-mapped reads
+    "temp_store": "MEMORY",
+}
+
+# Engine/pool options read from the environment (non-SQLite backends mostly)
+_POOL_ENV = (
+    ("DB_POOL_SIZE", "pool_size", int),
+    ("DB_MAX_OVERFLOW", "max_overflow", int),
+    ("DB_POOL_TIMEOUT", "pool_timeout", float),
+    ("DB_POOL_RECYCLE", "pool_recycle", int),
+)
+
+
+def database_uri_from_env() -> str:
+    """DATABASE_URL, e.g. postgresql+psycopg://user:pw@host/db; defaults to the SQLite file."""
+    uri = os.getenv("DATABASE_URL", DEFAULT_DATABASE_URI)
+    # Heroku-style postgres:// URLs are not accepted by SQLAlchemy
+    if uri.startswith("postgres://"):
+        uri = "postgresql://" + uri[len("postgres://"):]
+    return uri
+
+
+def engine_options_from_env(uri: str) -> dict:
+    options = {name: cast(os.environ[env]) for env, name, cast in _POOL_ENV if os.getenv(env)}
+    if make_url(uri).get_backend_name() != "sqlite":
+        # Server connections can be dropped (restarts, idle timeouts)
+        options.setdefault("pool_pre_ping", True)
+    return options
+
+
+def init_database(app) -> None:
+    """
+    db.init_app with engine options from the environment (unless already configured)
+    and the SQLite pragmas on every new connection.
+    """
+    app.config.setdefault(
+        "SQLALCHEMY_ENGINE_OPTIONS", engine_options_from_env(app.config["SQLALCHEMY_DATABASE_URI"]))
+    db.init_app(app)
+
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name == "sqlite":
+        pragmas = {**SQLITE_PRAGMAS, **app.config.get("SQLITE_PRAGMAS", {})}
+        event.listen(engine, "connect", lambda dbapi_connection, record: apply_sqlite_pragmas(
+            dbapi_connection, pragmas))
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas: dict) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+    finally:
+        cursor.close()
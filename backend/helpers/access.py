@@ -0,0 +1,129 @@
+from sqlalchemy import delete, insert, literal, select, true, union
+from database import db
+from models import Department, Document, DocumentAccess, DocumentPermission
+from helpers.cache import GenerationalCache
+
+# Access key of employees without a department: they only see public documents
+PUBLIC_ONLY_KEY = 0
+
+# Per-department data derived from the accessible documents (search page tags/uploaders);
+# any change to access, tags or uploaders bumps its generation once committed
+accessible_data_cache = GenerationalCache("accessible_data")
+
+
+def access_key(department_id) -> int:
+    return department_id if department_id is not None else PUBLIC_ONLY_KEY
+
+
+def accessible_data_changed() -> None:
+    """Invalidate accessible_data_cache when the current transaction commits."""
+    accessible_data_cache.invalidate_after_commit(db.session)
+
+
+def accessible_document_ids(department_id):
+    """SELECT of the document ids a department can see (one index range scan)."""
+    return select(DocumentAccess.document_id).where(
+        DocumentAccess.department_key == access_key(department_id))
+
+
+def has_document_access(department_id, document_id: int) -> bool:
+    return db.session.get(DocumentAccess, (access_key(department_id), document_id)) is not None
+
+
+def refresh_document_access(document_id: int) -> None:
+    """
+    Recompute the access rows of one document from its DocumentPermission rows.
+    Call after any permission change of the document. Does not commit.
+    """
+    department_ids = {
+        row.department_id
+        for row in db.session.query(DocumentPermission.department_id)
+        .filter(DocumentPermission.document_id == document_id)
+    }
+
+    if None in department_ids:
+        # Public: every department plus employees without one
+        keys = {PUBLIC_ONLY_KEY, *(d for (d,) in db.session.query(Department.id))}
+    else:
+        keys = department_ids
+
+    db.session.execute(
+        delete(DocumentAccess).where(DocumentAccess.document_id == document_id))
+    accessible_data_changed()
+    if keys:
+        db.session.execute(insert(DocumentAccess).values([
+            {"department_key": key, "document_id": document_id} for key in sorted(keys)
+        ]))
+
+
+def grant_public_documents(department_ids) -> None:
+    """Give newly created departments access to every public document. Does not commit."""
+    public_docs = [
+        d for (d,) in db.session.query(DocumentPermission.document_id)
+        .filter(DocumentPermission.department_id.is_(None))
+        .distinct()
+    ]
+    rows = [
+        {"department_key": dep_id, "document_id": doc_id}
+        for dep_id in department_ids for doc_id in public_docs
+    ]
+    if rows:
+        # executemany: SQLAlchemy batches this into multi-row INSERTs
+        db.session.execute(insert(DocumentAccess), rows)
+        accessible_data_changed()
+
+
+def refresh_documents_access(document_ids) -> None:
+    """
+    Set-based refresh_document_access for many documents at once (bulk ingestion):
+    one DELETE and one INSERT ... SELECT. Does not commit.
+    """
+    document_ids = sorted(set(document_ids))
+    if not document_ids:
+        return
+    db.session.execute(
+        delete(DocumentAccess).where(DocumentAccess.document_id.in_(document_ids)))
+    db.session.execute(
+        insert(DocumentAccess).from_select(
+            ["department_key", "document_id"], _access_rows(document_ids)))
+    accessible_data_changed()
+
+
+def rebuild_document_access() -> int:
+    """
+    Recompute the whole access table from document_permissions with one
+    set-based INSERT ... SELECT (fast enough for bulk seeding). Returns rows written.
+    """
+    db.session.execute(delete(DocumentAccess))
+    db.session.execute(
+        insert(DocumentAccess).from_select(
+            ["department_key", "document_id"], _access_rows()))
+    accessible_data_changed()
+    db.session.commit()
+    return db.session.query(DocumentAccess).count()
+
+
+def _access_rows(document_ids=None):
+    """(department_key, document_id) rows implied by document_permissions, optionally for some documents."""
+    department_keys = union(
+        select(Department.id.label("key")),
+        select(literal(PUBLIC_ONLY_KEY).label("key")),
+    ).subquery()
+
+    granted = select(DocumentPermission.department_id, DocumentPermission.document_id)\
+        .where(DocumentPermission.department_id.is_not(None))
+    public = select(department_keys.c.key, DocumentPermission.document_id)\
+        .join(department_keys, true())\
+        .where(DocumentPermission.department_id.is_(None))
+    if document_ids is not None:
+        granted = granted.where(DocumentPermission.document_id.in_(document_ids))
+        public = public.where(DocumentPermission.document_id.in_(document_ids))
+    return union(granted, public)
+
+
+def ensure_document_access() -> bool:
+    """Build the access table for existing databases (documents but no access rows)."""
+    if db.session.query(DocumentAccess).first() or not db.session.query(Document).first():
+        return False
+    rebuild_document_access()
+    return True
@@ -0,0 +1,409 @@
+import csv
+import io
+import json
+import math
+import os
+import tarfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from sqlalchemy import bindparam, insert, tuple_, update
+from werkzeug.datastructures import FileStorage
+from werkzeug.utils import secure_filename
+from database import db
+from models import Blob, Document, DocumentPermission, DocumentTag, DocumentVersion, Tag
+import helpers.services as services
+from helpers.access import accessible_data_changed, refresh_documents_access
+from helpers.extraction_queue import enqueue_extraction_jobs
+from helpers.search_index import index_documents
+from helpers.storage import MAX_UPLOAD_BYTES, UploadTooLargeError, discard_file, stream_upload_to_temp
+from helpers.user_context import UserContext
+from helpers.validators import ALLOWED_EXTENSIONS
+
+INGEST_WORKERS = 4  # threads streaming + hashing entries (hashlib/zlib/file IO release the GIL)
+INGEST_BATCH_SIZE = 500  # entries per metadata transaction
+MAX_ARCHIVE_BYTES = 1024 ** 3  # /api/ingest upload limit (MAX_INGEST_BYTES config); use the CLI beyond
+MANIFEST_NAMES = ("manifest.csv", "manifest.json")
+
+
+@dataclass
+class IngestItem:
+    """One manifest row (or archive entry) and what happened to it."""
+    path: str
+    title: str
+    version_number: float
+    tags: list[str] = field(default_factory=list)
+    departments: list[str] = field(default_factory=list)
+    status: str = "pending"  # created / new_version / error
+    error: str = None
+    size: int = 0
+    document_id: int = None
+
+    def to_dict(self) -> dict:
+        return {"path": self.path, "title": self.title, "version_number": self.version_number,
+                "status": self.status, "error": self.error, "size": self.size,
+                "document_id": self.document_id}
+
+
+class IngestSourceError(ValueError):
+    """The archive, directory or manifest can't be read."""
+
+
+class DirectorySource:
+    def __init__(self, root: str):
+        self.root = os.path.realpath(root)
+
+    def names(self) -> list[str]:
+        names = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                names.append(os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, "/"))
+        return sorted(names)
+
+    @contextmanager
+    def open(self, name: str):
+        path = os.path.realpath(os.path.join(self.root, name))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise IngestSourceError(f"'{name}' is outside the ingested directory")
+        with open(path, "rb") as f:
+            yield f
+
+    def close(self) -> None:
+        pass
+
+
+class ZipSource:
+    """Entries are read concurrently (zipfile serializes the underlying seeks + reads itself)."""
+
+    def __init__(self, path: str):
+        self.archive = zipfile.ZipFile(path)
+
+    def names(self) -> list[str]:
+        return [info.filename for info in self.archive.infolist() if not info.is_dir()]
+
+    @contextmanager
+    def open(self, name: str):
+        with self.archive.open(name) as f:
+            yield f
+
+    def close(self) -> None:
+        self.archive.close()
+
+
+class TarSource:
+    """Tar members share one (possibly compressed) stream: reads are serialized."""
+
+    def __init__(self, path: str):
+        self.archive = tarfile.open(path)
+        # `tar -C dir .` stores ./name
+        self.members = {_entry_name(member.name): member
+                        for member in self.archive.getmembers() if member.isfile()}
+        self.lock = threading.Lock()
+
+    def names(self) -> list[str]:
+        return list(self.members)
+
+    @contextmanager
+    def open(self, name: str):
+        with self.lock:
+            yield self.archive.extractfile(self.members[name])
+
+    def close(self) -> None:
+        self.archive.close()
+
+
+def open_source(path: str):
+    """DirectorySource, ZipSource or TarSource for a path."""
+    if os.path.isdir(path):
+        return DirectorySource(path)
+    if zipfile.is_zipfile(path):
+        return ZipSource(path)
+    if tarfile.is_tarfile(path):
+        return TarSource(path)
+    raise IngestSourceError("Not a directory, ZIP or TAR archive.")
+
+
+def load_manifest(source, manifest_path: str = None) -> list[IngestItem]:
+    """
+    Items to ingest, from `manifest_path`, a manifest.csv / manifest.json at the root
+    of the source, or (no manifest) every file with an allowed extension as version 1
+    titled after its file name.
+    CSV columns: path, title, version, tags, departments (tags/departments separated by ';');
+    JSON: a list of objects with the same keys (tags/departments as lists or ';' strings).
+    """
+    names = source.names()
+    if manifest_path:
+        with open(manifest_path, "rb") as f:
+            return parse_manifest(f.read(), manifest_path)
+
+    for manifest_name in MANIFEST_NAMES:
+        if manifest_name in names:
+            with source.open(manifest_name) as f:
+                return parse_manifest(f.read(), manifest_name)
+
+    return [
+        IngestItem(path=name, title=os.path.splitext(os.path.basename(name))[0], version_number=1.0)
+        for name in names
+        if os.path.splitext(name)[1].lower().lstrip(".") in ALLOWED_EXTENSIONS
+    ]
+
+
+def parse_manifest(data: bytes, name: str) -> list[IngestItem]:
+    """IngestItems of a CSV or JSON (a list) manifest; `name` is only used in errors."""
+    try:
+        text = data.decode("utf-8-sig")
+        is_json = text.lstrip().startswith("[")
+        rows = json.loads(text) if is_json else list(csv.DictReader(io.StringIO(text)))
+    except (UnicodeDecodeError, ValueError, csv.Error) as e:
+        raise IngestSourceError(f"Invalid manifest {name}: {e}")
+    if not isinstance(rows, list):
+        raise IngestSourceError(f"Invalid manifest {name}: expected a list of entries")
+
+    items = []
+    for row in rows:
+        if not isinstance(row, dict) or not row.get("path"):
+            raise IngestSourceError(f"Invalid manifest {name}: every entry needs a path ({row!r})")
+        path = _entry_name(str(row["path"]).strip())
+        items.append(IngestItem(
+            path=path,
+            title=str(row.get("title") or os.path.splitext(os.path.basename(path))[0]).strip(),
+            version_number=_parse_version(row.get("version")),
+            tags=_split_names(row.get("tags")),
+            departments=_split_names(row.get("departments")),
+        ))
+    return items
+
+
+def _parse_version(value):
+    """Manifest version: 1 when blank, None (reported by validation) when not a finite number."""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return 1.0
+    if isinstance(value, bool):
+        return None
+    try:
+        version_number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return version_number if math.isfinite(version_number) else None
+
+
+def _entry_name(name: str) -> str:
+    return name[2:] if name.startswith("./") else name
+
+
+def _split_names(value) -> list[str]:
+    values = value if isinstance(value, list) else str(value or "").split(";")
+    return sorted({str(v).strip().lower() for v in values if str(v).strip()})
+
+
+def ingest_archive(path, uploader: UserContext, manifest_path: str = None,
+                   workers: int = INGEST_WORKERS, batch_size: int = INGEST_BATCH_SIZE,
+                   max_bytes: int = MAX_UPLOAD_BYTES) -> dict:
+    """
+    Bulk upload: every manifest entry of a directory / ZIP / TAR archive becomes a
+    document version as if uploaded through /upload by `uploader`.
+    Entries are streamed into the blob store and hashed by `workers` threads; metadata
+    is written per `batch_size` entries with set-based statements in one transaction.
+    A failing entry (validation, size, duplicate version) does not stop the others;
+    a failing batch transaction marks its entries as errors.
+    Returns {"items": [IngestItem.to_dict()], "summary": {...counts, bytes, seconds, rates}}.
+    """
+    started = time.perf_counter()
+    source = open_source(path) if isinstance(path, str) else path
+    try:
+        items = load_manifest(source, manifest_path)
+        available = set(source.names())
+        seen = set()
+        for item in items:
+            error = _validate_item(item, available, seen, max_bytes)
+            if error:
+                item.status, item.error = "error", error
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for start in range(0, len(items), batch_size):
+                batch = [item for item in items[start:start + batch_size] if item.status == "pending"]
+                _ingest_batch(source, pool, batch, uploader, max_bytes)
+    finally:
+        source.close()
+
+    seconds = time.perf_counter() - started
+    counts = {status: sum(item.status == status for item in items)
+              for status in ("created", "new_version", "error")}
+    total_bytes = sum(item.size for item in items if item.status in ("created", "new_version"))
+    summary = {
+        "items": len(items), **counts, "bytes": total_bytes, "seconds": round(seconds, 2),
+        "items_per_s": round((counts["created"] + counts["new_version"]) / seconds, 1) if seconds else None,
+        "mb_per_s": round(total_bytes / seconds / 2 ** 20, 2) if seconds else None,
+    }
+    return {"items": [item.to_dict() for item in items], "summary": summary}
+
+
+def _validate_item(item: IngestItem, available: set, seen: set, max_bytes: int):
+    """Checks that need no database access (same rules as validate_document)."""
+    if not item.title:
+        return "Title is required."
+    if item.path not in available:
+        return f"'{item.path}' not found in the archive."
+    ext = os.path.splitext(item.path)[1].lower().lstrip(".")
+    if ext not in ALLOWED_EXTENSIONS:
+        return f"File extension .{ext} is not allowed. Allowed: {ALLOWED_EXTENSIONS}"
+    if item.version_number is None:
+        return "Version number must be numeric."
+    if item.version_number <= 0:
+        return "Version number must be positive."
+    key = (item.title, item.version_number)
+    if key in seen:
+        return f"Version {item.version_number} for document '{item.title}' appears twice in the manifest."
+    seen.add(key)
+    return None
+
+
+def _stage(source, item: IngestItem, max_bytes: int):
+    """Stream one entry into a temp file in the blob store directory. Returns (temp_path, hash, size)."""
+    with source.open(item.path) as stream:
+        return stream_upload_to_temp(FileStorage(stream=stream), services.FILES_DIR, max_bytes=max_bytes)
+
+
+def _ingest_batch(source, pool, batch: list[IngestItem], uploader: UserContext, max_bytes: int) -> None:
+    if not batch:
+        return
+
+    # Existing documents and versions of the batch: two queries
+    documents = dict(
+        db.session.query(Document.title, Document.id)
+        .filter(Document.title.in_({item.title for item in batch})))
+    existing_versions = set(
+        db.session.query(DocumentVersion.document_id, DocumentVersion.version_number)
+        .filter(DocumentVersion.document_id.in_(documents.values())))
+    for item in batch:
+        if (documents.get(item.title), item.version_number) in existing_versions:
+            item.status = "error"
+            item.error = f"Version {item.version_number} for document '{item.title}' already exists."
+    batch = [item for item in batch if item.status == "pending"]
+
+    # Stream + hash in parallel
+    futures = [(item, pool.submit(_stage, source, item, max_bytes)) for item in batch]
+    staged = []
+    for item, future in futures:
+        try:
+            staged.append((item, future.result()))
+        except (UploadTooLargeError, OSError, IngestSourceError, tarfile.TarError, zipfile.BadZipFile) as e:
+            item.status, item.error = "error", str(e) or type(e).__name__
+    if not staged:
+        return
+
+    try:
+        stored = services.store_blobs([temp for _, temp in staged])
+    except Exception:
+        db.session.rollback()
+        for _, (temp_path, _, _) in staged:
+            discard_file(temp_path)
+        raise
+    try:
+        _record_batch(staged, stored, documents, uploader)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        committed = {b.hash for b in Blob.query.filter(
+            Blob.hash.in_({content_hash for _, (_, content_hash, _) in staged}))}
+        for (item, (_, content_hash, _)), (filepath, created) in zip(staged, stored):
+            item.status, item.error, item.document_id = "error", f"Batch failed: {e}", None
+            if created and content_hash not in committed:
+                discard_file(filepath)
+
+
+def _record_batch(staged, stored, documents: dict, uploader: UserContext) -> None:
+    """Set-based _record_document_upload for a whole batch. Does not commit."""
+    now = datetime.now()
+    items = [item for item, _ in staged]
+    for (item, (_, _, size)) in staged:
+        item.size = size
+
+    # Tags and departments of the whole batch: one lookup (+ insert) each
+    tag_ids = services.resolve_or_create_by_name(Tag, {t for item in items for t in item.tags})
+    department_ids = services.resolve_or_create_departments(
+        {d for item in items for d in item.departments})
+
+    # New documents, then their ids by title
+    new_titles = list(dict.fromkeys(item.title for item in items if item.title not in documents))
+    if new_titles:
+        db.session.execute(insert(Document), [
+            {"title": title, "uploader_id": uploader.id, "created_at": now} for title in new_titles])
+        documents.update(
+            db.session.query(Document.title, Document.id).filter(Document.title.in_(new_titles)))
+    new_document_ids = {documents[title] for title in new_titles}
+
+    # Versions in manifest order: the last one of each document becomes current
+    db.session.execute(insert(DocumentVersion), [{
+        "document_id": documents[item.title], "version_number": item.version_number,
+        "filepath": filepath, "content_hash": content_hash,
+        "filename": secure_filename(os.path.basename(item.path)) or "upload",
+        "uploaded_at": now, "uploader_id": uploader.id,
+    } for (item, (_, content_hash, _)), (filepath, _) in zip(staged, stored)])
+    version_ids = {
+        (row.document_id, row.version_number): row.id
+        for row in db.session.query(
+            DocumentVersion.id, DocumentVersion.document_id, DocumentVersion.version_number)
+        .filter(tuple_(DocumentVersion.document_id, DocumentVersion.version_number).in_(
+            [(documents[item.title], item.version_number) for item in items]))
+    }
+    current = {}
+    for item in items:
+        item.document_id = documents[item.title]
+        item.status = "created" if item.document_id in new_document_ids and \
+            item.document_id not in current else "new_version"
+        current[item.document_id] = version_ids[(item.document_id, item.version_number)]
+    db.session.connection().execute(
+        update(Document.__table__)
+        .where(Document.__table__.c.id == bindparam("document_id"))
+        .values(current_version_id=bindparam("version_id")),
+        [{"document_id": d, "version_id": v} for d, v in current.items()])
+
+    # Permissions: new documents without departments are public, departments given for a
+    # document replace its public permission (same rules as a single upload)
+    grants, public = {}, set()
+    for item in items:
+        if item.document_id in new_document_ids and item.document_id not in grants \
+                and item.document_id not in public:
+            if item.departments:
+                grants[item.document_id] = {uploader.department_id}
+            else:
+                public.add(item.document_id)
+        if item.departments:
+            grants.setdefault(item.document_id, set()).update(
+                department_ids[d] for d in item.departments)
+    public -= grants.keys()
+    if grants:
+        db.session.query(DocumentPermission).filter(
+            DocumentPermission.document_id.in_(grants), DocumentPermission.department_id.is_(None)
+        ).delete(synchronize_session=False)
+    existing_grants = set(
+        db.session.query(DocumentPermission.document_id, DocumentPermission.department_id)
+        .filter(DocumentPermission.document_id.in_(grants))) if grants else set()
+    permission_rows = [{"document_id": d, "department_id": None} for d in sorted(public)] + [
+        {"document_id": d, "department_id": dep}
+        for d, deps in grants.items() for dep in sorted(deps - {None})
+        if (d, dep) not in existing_grants
+    ]
+    if permission_rows:
+        db.session.execute(insert(DocumentPermission), permission_rows)
+    refresh_documents_access({*public, *grants})
+
+    # Tags
+    pairs = {(item.document_id, tag_ids[t]) for item in items for t in item.tags}
+    if pairs:
+        existing_pairs = set(
+            db.session.query(DocumentTag.document_id, DocumentTag.tag_id)
+            .filter(DocumentTag.document_id.in_({d for d, _ in pairs})))
+        rows = [{"document_id": d, "tag_id": t} for d, t in sorted(pairs - existing_pairs)]
+        if rows:
+            db.session.execute(insert(DocumentTag), rows)
+            accessible_data_changed()
+
+    # Search index (titles now, text of the current versions via the extraction queue)
+    index_documents([{"id": documents[title], "title": title} for title in new_titles])
+    enqueue_extraction_jobs(sorted(current.items()))
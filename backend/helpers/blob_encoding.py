@@ -0,0 +1,267 @@
+import difflib
+import gzip
+import hashlib
+import os
+import re
+import struct
+import tempfile
+import zlib
+from helpers.storage import blob_path, discard_file, move_into_place
+
+# zstd when the optional `zstandard` package is installed, gzip otherwise
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+_CODEC = b"s" if zstandard is not None else b"g"
+
+SNAPSHOT_INTERVAL = 10  # a delta chain is at most SNAPSHOT_INTERVAL - 1 deltas long, then a full copy
+COMPRESSIBLE_EXTENSIONS = {"txt", "csv", "md", "json", "xml", "html", "htm", "rtf", "log"}
+DELTA_EXTENSIONS = COMPRESSIBLE_EXTENSIONS | {"docx"}  # docx: unchanged zip members match byte for byte
+MIN_SAVING = 0.1  # an encoding is only kept if it is at least 10% smaller than the raw file
+RECONSTRUCTION_CACHE_ENTRIES = 32  # rebuilt versions kept on disk, least recently used evicted
+
+# Encoded blobs keep the content-hash name with a suffix: <hash>.gz, <hash>.zst, <hash>.delta
+ENCODED_SUFFIXES = (".delta", ".zst", ".gz")
+_DELTA_MAGIC = b"DLT1"
+_DELTA_HEADER = struct.Struct(">4scH64sQ")  # magic, codec, depth, base hash, target size
+_COPY = struct.Struct(">cQQ")  # b"C", offset in the base, length
+_INSERT = struct.Struct(">cQ")  # b"I", length, then the bytes
+_CHUNKS = re.compile(rb"[^\n]*\n|[^\n]+")
+
+
+def _compress(data: bytes):
+    if _CODEC == b"s":
+        return _CODEC, zstandard.ZstdCompressor(level=10).compress(data)
+    return _CODEC, gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _decompress(codec: bytes, data: bytes) -> bytes:
+    """Decoded `data`; ValueError if it is corrupt."""
+    if codec == b"s":
+        if zstandard is None:
+            raise RuntimeError("The zstandard package is needed to read zstd-encoded blobs")
+        try:
+            return zstandard.ZstdDecompressor().decompress(data)
+        except zstandard.ZstdError as e:
+            raise ValueError(f"Corrupt zstd data: {e}") from e
+    try:
+        return gzip.decompress(data)
+    except (OSError, EOFError, zlib.error) as e:
+        raise ValueError(f"Corrupt gzip data: {e}") from e
+
+
+def encode_blob(filepath: str, filename: str, base=None):
+    """
+    Re-encode a freshly stored raw blob (compact storage mode). Candidates: a delta
+    against `base` ((content_hash, filepath) of the document's previous version) unless
+    that chain is already SNAPSHOT_INTERVAL long, and a compressed copy for text-like
+    formats; the smallest wins if it saves MIN_SAVING. The raw file is replaced.
+    Returns (filepath, stored_size).
+    """
+    ext = os.path.splitext(filename)[1].lower().lstrip(".")
+    with open(filepath, "rb") as f:
+        data = f.read()
+
+    best = None  # (suffix, encoded bytes)
+    if ext in DELTA_EXTENSIONS and base is not None:
+        try:
+            depth = blob_depth(base[1]) + 1
+            if depth < SNAPSHOT_INTERVAL:
+                best = (".delta", _encode_delta(data, base[0], read_blob(base[1]), depth))
+        except (FileNotFoundError, ValueError):
+            pass  # base lost or corrupt: store a snapshot
+    if ext in COMPRESSIBLE_EXTENSIONS:
+        codec, compressed = _compress(data)
+        if best is None or len(compressed) < len(best[1]):
+            best = (".zst" if codec == b"s" else ".gz", compressed)
+
+    if best is None or len(best[1]) > len(data) * (1 - MIN_SAVING):
+        return filepath, len(data)
+    suffix, encoded = best
+    encoded_path = filepath + suffix
+    _write_atomic(encoded_path, encoded)
+    if read_blob(encoded_path) != data:  # never keep an encoding that does not round-trip
+        discard_file(encoded_path)
+        return filepath, len(data)
+    discard_file(filepath)
+    return encoded_path, len(encoded)
+
+
+def _encode_delta(data: bytes, base_hash: str, base: bytes, depth: int) -> bytes:
+    """Copy/insert instructions rebuilding `data` from `base`, matched line by line (any bytes split at \\n)."""
+    base_chunks = _CHUNKS.findall(base)
+    chunks = _CHUNKS.findall(data)
+    base_offsets = [0]
+    for chunk in base_chunks:
+        base_offsets.append(base_offsets[-1] + len(chunk))
+    offsets = [0]
+    for chunk in chunks:
+        offsets.append(offsets[-1] + len(chunk))
+
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base_chunks, chunks)
+    for i, j, n in matcher.get_matching_blocks():
+        if offsets[j] > (ops_end := _ops_end(ops)):
+            ops.append(("I", ops_end, offsets[j]))
+        if n:
+            ops.append(("C", base_offsets[i], base_offsets[i + n] - base_offsets[i], offsets[j + n]))
+
+    payload = bytearray()
+    for op in ops:
+        if op[0] == "C":
+            payload += _COPY.pack(b"C", op[1], op[2])
+        else:
+            payload += _INSERT.pack(b"I", op[2] - op[1]) + data[op[1]:op[2]]
+    header = _DELTA_HEADER.pack(_DELTA_MAGIC, _CODEC, depth, base_hash.encode(), len(data))
+    return header + _compress(bytes(payload))[1]
+
+
+def _ops_end(ops) -> int:
+    """Offset in the target up to which `ops` already rebuild it."""
+    if not ops:
+        return 0
+    return ops[-1][3] if ops[-1][0] == "C" else ops[-1][2]
+
+
+def _delta_header(filepath: str):
+    with open(filepath, "rb") as f:
+        header = f.read(_DELTA_HEADER.size)
+    if len(header) != _DELTA_HEADER.size:
+        raise ValueError(f"Truncated delta blob: {filepath}")
+    magic, codec, depth, base_hash, size = _DELTA_HEADER.unpack(header)
+    if magic != _DELTA_MAGIC:
+        raise ValueError(f"Not a delta blob: {filepath}")
+    return codec, depth, base_hash.decode(), size
+
+
+def blob_depth(filepath: str) -> int:
+    """Number of deltas between the blob and its full snapshot (0 for a full copy)."""
+    return _delta_header(filepath)[1] if filepath.endswith(".delta") else 0
+
+
+def delta_base(filepath: str):
+    """Content hash of the blob a delta blob is built on, None for any other blob."""
+    return _delta_header(filepath)[2] if filepath.endswith(".delta") else None
+
+
+def find_blob_file(files_dir: str, content_hash: str):
+    """On-disk file of a blob in whatever encoding it was stored, None if missing."""
+    raw = blob_path(files_dir, content_hash)
+    for path in (raw, *(raw + suffix for suffix in ENCODED_SUFFIXES)):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def read_blob(filepath: str) -> bytes:
+    """Content of a stored blob, decoding compression and rebuilding deltas; ValueError if it is corrupt."""
+    if filepath.endswith(".delta"):
+        return _apply_delta(filepath)
+    with open(filepath, "rb") as f:
+        data = f.read()
+    if filepath.endswith(".zst"):
+        return _decompress(b"s", data)
+    if filepath.endswith(".gz"):
+        return _decompress(b"g", data)
+    return data
+
+
+def _apply_delta(filepath: str) -> bytes:
+    codec, _, base_hash, size = _delta_header(filepath)
+    files_dir = _files_dir(filepath)
+    try:
+        with open(_cache_path(files_dir, base_hash), "rb") as f:
+            base = f.read()
+    except FileNotFoundError:
+        base_file = find_blob_file(files_dir, base_hash)
+        if base_file is None:
+            raise FileNotFoundError(f"Base blob {base_hash} of {filepath} is missing")
+        base = read_blob(base_file)
+
+    with open(filepath, "rb") as f:
+        f.seek(_DELTA_HEADER.size)
+        payload = _decompress(codec, f.read())
+    parts = []
+    pos = 0
+    try:
+        while pos < len(payload):
+            if payload[pos:pos + 1] == b"C":
+                _, offset, length = _COPY.unpack_from(payload, pos)
+                parts.append(base[offset:offset + length])
+                pos += _COPY.size
+            else:
+                _, length = _INSERT.unpack_from(payload, pos)
+                pos += _INSERT.size
+                parts.append(payload[pos:pos + length])
+                pos += length
+    except struct.error as e:
+        raise ValueError(f"Truncated delta blob {filepath}") from e
+    data = b"".join(parts)
+    if len(data) != size:
+        raise ValueError(f"Delta blob {filepath} rebuilt {len(data)} bytes, expected {size}")
+    return data
+
+
+def readable_blob_path(filepath: str) -> str:
+    """
+    Path of a plain file with the blob's content, for send_file and the extractors.
+    Raw blobs are their own file; encoded ones are rebuilt into the reconstruction
+    cache (<files dir>/reconstructed), which keeps the RECONSTRUCTION_CACHE_ENTRIES
+    most recently used. Raises FileNotFoundError if a file of a delta chain is missing,
+    ValueError if the blob is corrupt.
+    """
+    if not filepath.endswith(ENCODED_SUFFIXES):
+        return filepath
+    files_dir = _files_dir(filepath)
+    content_hash = os.path.basename(filepath).split(".", 1)[0]
+    cached = _cache_path(files_dir, content_hash)
+    try:
+        os.utime(cached)  # mark as recently used
+        return cached
+    except FileNotFoundError:
+        pass
+
+    data = read_blob(filepath)
+    if hashlib.sha256(data).hexdigest() != content_hash:
+        raise ValueError(f"Blob {filepath} does not rebuild to its content hash")
+    _write_atomic(cached, data)
+    _evict(os.path.dirname(cached), keep=cached)
+    return cached
+
+
+def _files_dir(filepath: str) -> str:
+    # <files dir>/blobs/<ab>/<hash>[.suffix]
+    return os.path.dirname(os.path.dirname(os.path.dirname(filepath)))
+
+
+def _cache_path(files_dir: str, content_hash: str) -> str:
+    return os.path.join(files_dir, "reconstructed", content_hash)
+
+
+def _evict(directory: str, keep: str) -> None:
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.startswith("."):
+            continue  # another process' file in the making
+        try:
+            entries.append((entry.stat().st_mtime, entry.path))
+        except FileNotFoundError:
+            pass
+    entries.sort(reverse=True)
+    for _, path in entries[RECONSTRUCTION_CACHE_ENTRIES:]:
+        if path != keep:
+            discard_file(path)
+
+
+def _write_atomic(filepath: str, data: bytes) -> None:
+    directory = os.path.dirname(filepath)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".encode-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(data)
+        move_into_place(temp_path, filepath)
+    except BaseException:
+        discard_file(temp_path)
+        raise
@@ -0,0 +1,183 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Small thread-safe in-process LRU cache with an optional per-entry TTL (seconds).
+    Values are shared between callers: treat them as read-only.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCache:
+    """
+    Key/value store in a local SQLite file, shared by the worker processes of one host.
+    Values are stored as JSON; entries expire after `ttl` seconds (expired rows are
+    purged whenever a counter is incremented).
+    """
+
+    def __init__(self, path: str, ttl: float = 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str, default=None):
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return default
+        return json.loads(row[0])
+
+    def set(self, key: str, value, ttl: float = _MISSING) -> None:
+        ttl = self.ttl if ttl is _MISSING else ttl
+        self._connection().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl if ttl is not None else None))
+
+    def incr(self, key: str) -> int:
+        """Atomically increment an integer entry (created as 1; never expires). Returns the new value."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO cache (key, value, expires_at) VALUES (?, '1', NULL) "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1", (key,))
+            value = int(conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()[0])
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM cache")
+
+
+class GenerationalCache:
+    """
+    Cache invalidated as a whole by bumping a generation counter: entries are stored
+    under (generation, key), so after a bump every old entry is unreachable.
+    Writers call invalidate_after_commit(session); the bump happens once their
+    transaction commits (a rollback drops it), so no reader can cache pre-commit data
+    under the new generation.
+    Entries live in an in-process LRUCache; with a shared store (SQLiteCache) they are
+    also written there and the generation lives in the store, so a bump in one worker
+    process invalidates all of them. Values must then be JSON-serializable.
+    """
+
+    def __init__(self, namespace: str, maxsize: int = 1024, shared: "SQLiteCache" = None):
+        self.namespace = namespace
+        self.local = LRUCache(maxsize)
+        self.shared = shared
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def use_shared_store(self, shared: "SQLiteCache") -> None:
+        self.shared = shared
+        self.local.clear()
+
+    @property
+    def generation(self) -> int:
+        if self.shared is not None:
+            return self.shared.get(f"{self.namespace}:generation", 0)
+        return self._generation
+
+    def get_or_load(self, key, loader):
+        """Cached value of `key` for the current generation, computing it with loader() on a miss."""
+        generation = self.generation  # read before loading: a concurrent bump makes this entry stale
+        value = self.local.get((generation, key), _MISSING)
+        if value is not _MISSING:
+            return value
+
+        shared_key = f"{self.namespace}:{generation}:{key}"
+        if self.shared is not None:
+            value = self.shared.get(shared_key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            if self.shared is not None:
+                self.shared.set(shared_key, value)
+        self.local.set((generation, key), value)
+        return value
+
+    def bump(self) -> None:
+        if self.shared is not None:
+            self.shared.incr(f"{self.namespace}:generation")
+        else:
+            with self._lock:
+                self._generation += 1
+        self.local.clear()
+
+    def invalidate_after_commit(self, session) -> None:
+        """Bump the generation when `session` commits its current transaction."""
+        session.info.setdefault(_PENDING_BUMPS, set()).add(self)
+
+
+_PENDING_BUMPS = "generational_cache_bumps"
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_after_commit(session):
+    for cache in session.info.pop(_PENDING_BUMPS, ()):
+        cache.bump()
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending_bumps(session):
+    session.info.pop(_PENDING_BUMPS, None)
@@ -0,0 +1,254 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from sqlalchemy import insert, update
+from database import db
+from models import Document, DocumentVersion, ExtractionJob
+from helpers.search_index import index_document
+from helpers.text_extraction import extract_document
+from helpers.blob_encoding import readable_blob_path
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 5  # retry after 5s, 10s, 20s, 40s
+POLL_INTERVAL_SECONDS = 1.0
+LEASE_SECONDS = 300  # a running job whose worker stopped renewing it for this long is recovered
+
+# Set by enqueue_extraction_job so an in-process worker wakes up immediately
+_wakeup = threading.Event()
+
+
+def enqueue_extraction_job(document_id: int, version_id: int) -> ExtractionJob:
+    """Queue text extraction for an uploaded version. Does not commit."""
+    job = ExtractionJob(document_id=document_id, version_id=version_id,
+                        status="pending", next_attempt_at=datetime.now())
+    db.session.add(job)
+    _wakeup.set()
+    return job
+
+
+def enqueue_extraction_jobs(versions) -> None:
+    """Batch enqueue_extraction_job for [(document_id, version_id)] (bulk ingestion). Does not commit."""
+    now = datetime.now()
+    rows = [{"document_id": document_id, "version_id": version_id, "status": "pending",
+             "attempts": 0, "next_attempt_at": now} for document_id, version_id in versions]
+    if rows:
+        db.session.execute(insert(ExtractionJob), rows)
+        _wakeup.set()
+
+
+def recover_stale_jobs(lease_seconds: float = LEASE_SECONDS) -> int:
+    """
+    Put jobs left 'running' by a worker that died back in the queue (or fail them once
+    their attempts are used up). Only expired leases: live workers renew theirs
+    (renew_leases), so a worker starting next to them doesn't take their jobs.
+    """
+    now = datetime.now()
+    stale = (ExtractionJob.status == "running") & (ExtractionJob.updated_at < now - timedelta(seconds=lease_seconds))
+    count = db.session.execute(
+        update(ExtractionJob)
+        .where(stale, ExtractionJob.attempts >= MAX_ATTEMPTS)
+        .values(status="failed", last_error="worker lost", updated_at=now)
+    ).rowcount
+    count += db.session.execute(
+        update(ExtractionJob)
+        .where(stale)
+        .values(status="pending", next_attempt_at=now, updated_at=now)
+    ).rowcount
+    db.session.commit()
+    return count
+
+
+def renew_leases(job_ids) -> None:
+    """Extend the lease of running jobs (their updated_at) so no other worker recovers them."""
+    db.session.execute(
+        update(ExtractionJob)
+        .where(ExtractionJob.id.in_(job_ids), ExtractionJob.status == "running")
+        .values(updated_at=datetime.now())
+    )
+    db.session.commit()
+
+
+def claim_jobs(limit: int) -> list[ExtractionJob]:
+    """
+    Atomically move up to `limit` due jobs from pending to running.
+    Safe with several worker processes: a job is only claimed by the UPDATE that flips it.
+    """
+    candidates = (
+        db.session.query(ExtractionJob.id)
+        .filter(ExtractionJob.status == "pending",
+                ExtractionJob.next_attempt_at <= datetime.now())
+        .order_by(ExtractionJob.next_attempt_at, ExtractionJob.id)
+        .limit(limit)
+        .all()
+    )
+
+    claimed = []
+    for (job_id,) in candidates:
+        flipped = db.session.execute(
+            update(ExtractionJob)
+            .where(ExtractionJob.id == job_id, ExtractionJob.status == "pending")
+            .values(status="running", attempts=ExtractionJob.attempts + 1,
+                    updated_at=datetime.now())
+        ).rowcount
+        if flipped:
+            claimed.append(job_id)
+    db.session.commit()
+
+    if not claimed:
+        return []
+    return ExtractionJob.query.filter(ExtractionJob.id.in_(claimed)).all()
+
+
+def complete_job(job_id: int, result: dict) -> None:
+    """Write extraction results back: search index + job row."""
+    job = db.session.get(ExtractionJob, job_id)
+    document = db.session.get(Document, job.document_id)
+
+    # A newer version may have been uploaded meanwhile; only the current one is indexed
+    if document and document.current_version_id == job.version_id:
+        index_document(document.id, document.title, result["text"])
+
+    job.status = "done"
+    job.page_count = result["page_count"]
+    job.char_count = len(result["text"])
+    job.last_error = None
+    db.session.commit()
+
+
+def fail_job(job_id: int, error: str) -> None:
+    """Schedule a retry with exponential backoff, or give up after MAX_ATTEMPTS."""
+    job = db.session.get(ExtractionJob, job_id)
+    job.last_error = error
+    if job.attempts >= MAX_ATTEMPTS:
+        job.status = "failed"
+    else:
+        job.status = "pending"
+        job.next_attempt_at = datetime.now() + timedelta(
+            seconds=BACKOFF_BASE_SECONDS * 2 ** (job.attempts - 1))
+    db.session.commit()
+
+
+class ExtractionWorker:
+    """
+    Drains the extraction_jobs table with a ProcessPoolExecutor.
+    At most `max_workers` jobs are in flight; results are written back from the
+    dispatcher thread, so worker processes never touch the database.
+    Claimed jobs are leased (EXTRACTION_LEASE_SECONDS): the dispatcher renews the
+    leases of its in-flight jobs and recovers expired ones of dead workers. If a
+    worker process dies the pool is rebuilt and its in-flight jobs are retried.
+    """
+
+    def __init__(self, app, max_workers: int = 2, poll_interval: float = POLL_INTERVAL_SECONDS):
+        self.app = app
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = app.config.get("EXTRACTION_LEASE_SECONDS", LEASE_SECONDS)
+        self._stop = threading.Event()
+        self._thread = None
+        self._pool = None
+        self._renewed_at = 0.0
+        self._recovered_at = None  # recover on the first tick
+
+    def start(self) -> None:
+        """Run the dispatcher in a daemon thread (in-process mode)."""
+        self._thread = threading.Thread(
+            target=self.run_forever, name="extraction-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        _wakeup.set()
+        if self._thread:
+            self._thread.join()
+
+    def run_forever(self) -> None:
+        self._pool = self._make_pool()
+        try:
+            in_flight = {}  # future -> job id
+            while not self._stop.is_set():
+                self._tick(in_flight)
+                if in_flight:
+                    time.sleep(0.05)
+                else:
+                    _wakeup.wait(self.poll_interval)
+                    _wakeup.clear()
+        finally:
+            self._pool.shutdown()
+
+    def run_until_empty(self) -> None:
+        """Process every due job, then return (used by the CLI --once flag)."""
+        self._pool = self._make_pool()
+        try:
+            in_flight = {}
+            while self._tick(in_flight) or in_flight:
+                time.sleep(0.05)
+        finally:
+            self._pool.shutdown()
+
+    def _make_pool(self) -> ProcessPoolExecutor:
+        # spawn: worker processes must not inherit the dispatcher's threads/DB connections
+        return ProcessPoolExecutor(max_workers=self.max_workers,
+                                   mp_context=multiprocessing.get_context("spawn"))
+
+    def _restart_pool(self, job_ids, error: BrokenProcessPool) -> None:
+        """A worker process died: retry (or fail) the jobs it took down and start a fresh pool."""
+        db.session.rollback()
+        for job_id in job_ids:
+            fail_job(job_id, f"BrokenProcessPool: {error}")
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._make_pool()
+
+    def _tick(self, in_flight: dict) -> int:
+        """Write back finished jobs, fill free slots and keep leases. Returns the number submitted."""
+        with self.app.app_context():
+            now = time.monotonic()
+            if self._recovered_at is None or now - self._recovered_at >= self.lease_seconds:
+                recover_stale_jobs(self.lease_seconds)
+                self._recovered_at = now
+            self._collect(in_flight)
+            free = self.max_workers - len(in_flight)
+            submitted = self._submit(in_flight, free) if free > 0 else 0
+            if in_flight and now - self._renewed_at >= self.lease_seconds / 3:
+                renew_leases(list(in_flight.values()))
+                self._renewed_at = now
+            db.session.remove()
+        return submitted
+
+    def _submit(self, in_flight: dict, limit: int) -> int:
+        jobs = claim_jobs(limit)
+        for i, job in enumerate(jobs):
+            version = db.session.get(DocumentVersion, job.version_id)
+            if version is None:
+                fail_job(job.id, "version not found")
+                continue
+            try:
+                # Encoded blobs (compact storage) are rebuilt here, the workers read plain files
+                filepath = readable_blob_path(version.filepath)
+            except (OSError, ValueError) as e:
+                fail_job(job.id, f"{type(e).__name__}: {e}")
+                continue
+            try:
+                future = self._pool.submit(extract_document, filepath, version.filename)
+            except BrokenProcessPool as e:
+                # Claimed jobs not submitted yet go back to the queue with the in-flight ones
+                self._restart_pool([*in_flight.values(), *(pending.id for pending in jobs[i:])], e)
+                in_flight.clear()
+                return i
+            in_flight[future] = job.id
+        return len(jobs)
+
+    def _collect(self, in_flight: dict) -> None:
+        for future in [f for f in in_flight if f.done()]:
+            job_id = in_flight.pop(future)
+            try:
+                complete_job(job_id, future.result())
+            except BrokenProcessPool as e:
+                self._restart_pool([job_id, *in_flight.values()], e)
+                in_flight.clear()
+                return
+            except Exception as e:
+                db.session.rollback()
+                fail_job(job_id, f"{type(e).__name__}: {e}")
@@ -0,0 +1,144 @@
+import mimetypes
+import os
+import secrets
+from flask import Response, request, send_file
+from werkzeug.datastructures import ContentRange
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from helpers.storage import CHUNK_SIZE
+from helpers.rate_limits import record_transfer
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600  # explicit versions never change
+MAX_RANGES = 16  # requests asking for more ranges get the whole file (RFC 9110 allows ignoring Range)
+
+
+def send_document_file(filepath: str, download_name: str, etag: str,
+                       as_attachment: bool, immutable: bool) -> Response:
+    """
+    send_file with caching for stored document versions:
+    - strong ETag `etag` (content hash), 304 for a matching If-None-Match
+      without opening the file;
+    - `immutable`: Cache-Control private, max-age 1 year, immutable (explicit version),
+      otherwise private, no-cache (the latest version can change; revalidate via ETag);
+    - byte ranges, single (206 with Content-Range) or multiple (multipart/byteranges),
+      honouring If-Range;
+    - the bytes to send are recorded for the client's bandwidth budget (helpers/rate_limits.py).
+    """
+    if request.if_none_match.contains_weak(etag):
+        return _cache_headers(Response(status=304), etag, immutable)
+
+    size = os.path.getsize(filepath)
+    ranges = _requested_ranges(size, etag)
+    if ranges == []:
+        raise RequestedRangeNotSatisfiable(length=size)
+    record_transfer(size if ranges is None else sum(stop - start for start, stop in ranges))
+    if ranges is None:
+        response = send_file(filepath, as_attachment=as_attachment,
+                             download_name=download_name, conditional=False)
+    else:
+        response = _partial_content(filepath, size, download_name, as_attachment, ranges)
+    return _cache_headers(response, etag, immutable)
+
+
+def _cache_headers(response: Response, etag: str, immutable: bool) -> Response:
+    response.set_etag(etag)
+    response.accept_ranges = "bytes"
+    response.cache_control.private = True
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+def _requested_ranges(size: int, etag: str):
+    """
+    Satisfiable (start, stop) byte ranges of the Range header, sorted and merged.
+    None means send the whole file (no, malformed or ignored Range header, stale If-Range);
+    [] means none of the ranges is satisfiable (416).
+    Parsed here rather than with werkzeug, which rejects overlapping or unordered ranges.
+    """
+    header = request.headers.get("Range")
+    if not header or size == 0:
+        return None
+    if_range = request.if_range
+    if (if_range.etag or if_range.date) and if_range.etag != etag:
+        return None  # client copy is stale (or date-based): full response
+
+    units, _, spec = header.partition("=")
+    items = [item.strip() for item in spec.split(",") if item.strip()]
+    if units.strip().lower() != "bytes" or not items or len(items) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for item in items:
+        first, dash, last = item.partition("-")
+        if not dash or not (first or last) \
+                or (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+        if not first:  # suffix range: the last N bytes
+            start, stop = max(0, size - int(last)), size
+        else:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            stop = size if not last else min(int(last) + 1, size)
+        if start < stop:
+            ranges.append((start, stop))
+
+    merged = []
+    for start, stop in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+def _partial_content(filepath: str, size: int, download_name: str, as_attachment: bool,
+                     ranges) -> Response:
+    """206 response: the raw bytes for one range, multipart/byteranges for several."""
+    mimetype = mimetypes.guess_type(download_name)[0] or "application/octet-stream"
+
+    if len(ranges) == 1:
+        start, stop = ranges[0]
+        response = Response(_read_ranges(filepath, [(b"", start, stop, b"")]), status=206,
+                            mimetype=mimetype, direct_passthrough=True)
+        response.content_length = stop - start
+        response.content_range = ContentRange("bytes", start, stop, size)
+    else:
+        boundary = secrets.token_hex(16)
+        parts = [
+            ((f"--{boundary}\r\nContent-Type: {mimetype}\r\n"
+              f"Content-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n").encode(),
+             start, stop, b"\r\n")
+            for start, stop in ranges
+        ]
+        parts.append((f"--{boundary}--\r\n".encode(), 0, 0, b""))
+        response = Response(_read_ranges(filepath, parts), status=206, direct_passthrough=True,
+                            mimetype=f"multipart/byteranges; boundary={boundary}")
+        response.content_length = sum(
+            len(head) + (stop - start) + len(tail) for head, start, stop, tail in parts)
+
+    response.headers.set("Content-Disposition", "attachment" if as_attachment else "inline",
+                         filename=download_name)
+    return response
+
+
+def _read_ranges(filepath: str, parts):
+    """Yield head, the bytes [start, stop) of the file and tail of every part, in CHUNK_SIZE reads."""
+    with open(filepath, "rb") as f:
+        for head, start, stop, tail in parts:
+            if head:
+                yield head
+            f.seek(start)
+            remaining = stop - start
+            while remaining:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+            if tail:
+                yield tail
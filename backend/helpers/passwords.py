@@ -0,0 +1,46 @@
+import secrets
+from functools import lru_cache
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_PASSWORD_HASH_METHOD = "scrypt:32768:8:1"  # werkzeug's default
+# Test / benchmark fixtures only: hashes in microseconds, rehashed at the first login
+# under a real policy
+FAST_PASSWORD_HASH_METHOD = "pbkdf2:sha256:1"
+PASSWORD_HASH_ALIASES = {"fast": FAST_PASSWORD_HASH_METHOD, "default": DEFAULT_PASSWORD_HASH_METHOD}
+
+
+def password_hash_method() -> str:
+    """The hashing policy of the current app (PASSWORD_HASH_METHOD, werkzeug method string or alias)."""
+    method = current_app.config.get("PASSWORD_HASH_METHOD") or DEFAULT_PASSWORD_HASH_METHOD
+    return PASSWORD_HASH_ALIASES.get(method, method)
+
+
+def hash_password(password: str) -> str:
+    return generate_password_hash(password, method=password_hash_method())
+
+
+@lru_cache(maxsize=8)
+def _reference_hash(method: str) -> str:
+    """
+    A hash of a random password under `method`: its prefix is the method with all
+    parameters spelled out, and checking against it costs what checking a real hash does.
+    """
+    return generate_password_hash(secrets.token_hex(16), method=method)
+
+
+def verify_password(password_hash: str | None, password: str) -> bool:
+    """
+    Check a password against a stored hash. Unknown users (None) are checked against a
+    dummy hash of the current policy, so they take as long as a wrong password.
+    """
+    if password_hash is None:
+        check_password_hash(_reference_hash(password_hash_method()), password)
+        return False
+    return check_password_hash(password_hash, password)
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """True if the hash was made with another method or cost than the current policy."""
+    expected = _reference_hash(password_hash_method()).split("$", 1)[0]
+    return password_hash.split("$", 1)[0] != expected
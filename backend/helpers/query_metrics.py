@@ -0,0 +1,182 @@
+import os
+import re
+import threading
+import time
+from flask import g, request
+from sqlalchemy import event
+from database import db
+
+SLOW_QUERY_MS = 200  # default threshold for the slow-query log
+SLOWEST_PER_REQUEST = 3  # slowest statements kept per request
+METRIC_PREFIX = "docrepo"
+_READ_QUERY = re.compile(r"\s*(SELECT|WITH)\b", re.IGNORECASE)
+
+
+class QueryMetrics:
+    """
+    Process-wide request/SQL counters, labelled by endpoint.
+    Filled by the engine and request hooks of init_query_metrics(), read by /metrics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}  # (endpoint, method, status) -> count
+        self.endpoints = {}  # endpoint -> {"requests", "seconds", "queries", "db_seconds", "max_queries"}
+        self.slow_queries = 0
+
+    def record_request(self, endpoint: str, method: str, status: int, seconds: float, stats: dict) -> None:
+        with self._lock:
+            key = (endpoint, method, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            totals = self.endpoints.setdefault(endpoint, {
+                "requests": 0, "seconds": 0.0, "queries": 0, "db_seconds": 0.0, "max_queries": 0})
+            totals["requests"] += 1
+            totals["seconds"] += seconds
+            totals["queries"] += stats["count"]
+            totals["db_seconds"] += stats["seconds"]
+            totals["max_queries"] = max(totals["max_queries"], stats["count"])
+
+    def record_slow_query(self) -> None:
+        with self._lock:
+            self.slow_queries += 1
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        p = METRIC_PREFIX
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+                lines.append(f"{p}_{name}{{{label_text}}} {value}" if label_text else f"{p}_{name} {value}")
+
+        def summary(name, help_text, samples):
+            # No quantiles: a _sum/_count pair per label set
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} summary")
+            for labels, total, count in samples:
+                label_text = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+                lines.append(f"{p}_{name}_sum{{{label_text}}} {total}")
+                lines.append(f"{p}_{name}_count{{{label_text}}} {count}")
+
+        with self._lock:
+            requests = sorted(self.requests.items())
+            endpoints = sorted((e, dict(t)) for e, t in self.endpoints.items())
+            slow_queries = self.slow_queries
+
+        metric("http_requests_total", "counter", "HTTP requests handled.",
+               [({"endpoint": e, "method": m, "status": s}, n) for (e, m, s), n in requests])
+        summary("http_request_duration_seconds", "Time spent handling requests.",
+                [({"endpoint": e}, round(t["seconds"], 6), t["requests"]) for e, t in endpoints])
+        metric("db_queries_total", "counter", "SQL statements executed while handling requests.",
+               [({"endpoint": e}, t["queries"]) for e, t in endpoints])
+        summary("db_query_duration_seconds", "SQL time while handling requests.",
+                [({"endpoint": e}, round(t["db_seconds"], 6), t["queries"]) for e, t in endpoints])
+        metric("db_queries_per_request_max", "gauge", "Most SQL statements seen in a single request.",
+               [({"endpoint": e}, t["max_queries"]) for e, t in endpoints])
+        metric("db_slow_queries_total", "counter", "SQL statements slower than SLOW_QUERY_MS.",
+               [({}, slow_queries)])
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def init_query_metrics(app) -> QueryMetrics:
+    """
+    Count SQL statements and DB time per request (engine events) and expose them as
+    X-DB-* / Server-Timing response headers and in the QueryMetrics counters.
+    Statements slower than SLOW_QUERY_MS are logged with their query plan.
+    """
+    app.config.setdefault("SLOW_QUERY_MS", float(os.getenv("SLOW_QUERY_MS", SLOW_QUERY_MS)))
+    metrics = QueryMetrics()
+    app.extensions["query_metrics"] = metrics
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+
+        stats = g.get("query_stats") if g else None
+        if stats is not None:
+            stats["count"] += 1
+            stats["seconds"] += elapsed
+            stats["slowest"].append((elapsed, statement))
+            stats["slowest"].sort(key=lambda item: item[0], reverse=True)
+            del stats["slowest"][SLOWEST_PER_REQUEST:]
+
+        if elapsed * 1000 >= app.config["SLOW_QUERY_MS"]:
+            metrics.record_slow_query()
+            plan = None if executemany else explain_query_plan(conn, statement, parameters)
+            # Writes carry credentials and document data (e.g. password hashes): parameters of reads only
+            shown = _truncate(repr(parameters)) if _READ_QUERY.match(statement) else "(redacted)"
+            app.logger.warning(
+                "Slow query (%.1f ms)%s:\n%s\nparameters: %s\nplan:\n%s",
+                elapsed * 1000, f" in {request.endpoint}" if g and request else "",
+                statement, shown, plan or "(not available)")
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = {"count": 0, "seconds": 0.0, "slowest": []}
+        g.request_started_at = time.perf_counter()
+
+    @app.after_request
+    def add_query_stats(response):
+        stats = g.pop("query_stats", None)
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - g.pop("request_started_at")
+
+        metrics.record_request(request.endpoint or "unmatched", request.method,
+                               response.status_code, elapsed, stats)
+        response.headers["X-DB-Query-Count"] = str(stats["count"])
+        response.headers["X-DB-Time-ms"] = f"{stats['seconds'] * 1000:.2f}"
+        response.headers["Server-Timing"] = (
+            f"db;dur={stats['seconds'] * 1000:.2f};desc=\"{stats['count']} queries\", "
+            f"app;dur={elapsed * 1000:.2f}")
+        if stats["slowest"]:
+            app.logger.debug(
+                "%s %s: %d queries, %.1f ms in the database; slowest:\n%s",
+                request.method, request.path, stats["count"], stats["seconds"] * 1000,
+                "\n".join(f"  {s * 1000:.1f} ms  {_one_line(sql)}" for s, sql in stats["slowest"]))
+        return response
+
+    return metrics
+
+
+def explain_query_plan(conn, statement: str, parameters) -> str:
+    """
+    Query plan of a statement, run on a raw DB-API cursor of the same connection
+    (bypasses the engine events, so it isn't counted or re-explained).
+    """
+    if not _READ_QUERY.match(statement):
+        return None
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    try:
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+    except Exception as e:
+        return f"(EXPLAIN failed: {e})"
+    # SQLite rows are (id, parent, notused, detail); other backends return one text column
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+def _one_line(statement: str) -> str:
+    return _truncate(" ".join(statement.split()))
+
+
+def _truncate(value: str, limit: int = 200) -> str:
+    return value if len(value) <= limit else value[:limit] + "…"
@@ -0,0 +1,175 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from flask import g, request, session
+from flask_limiter import Limiter, RateLimitExceeded
+from limits import parse
+from limits.storage import Storage
+
+# Budgets per client (username, else IP address); RATELIMIT_<NAME> overrides one
+RATE_LIMITS = {
+    "default": "100 per minute",  # per endpoint, for routes without a budget of their own
+    "search": "300 per minute",  # light: one indexed query
+    "transfer": "30 per minute",  # /download, /view: a file read each
+    "upload": "10 per minute",  # /upload, /api/ingest: hashing and writes
+    "bandwidth": "1024 per minute",  # MB sent by /download and /view
+}
+BANDWIDTH_UNIT = 1024 * 1024  # bytes per unit of the bandwidth budget
+
+
+def rate_limit_key() -> str:
+    return session.get("username") or request.remote_addr or "127.0.0.1"
+
+
+def rate_limit(name: str, methods: list[str] = None):
+    """
+    Put a view under a named budget; views sharing a name share the counter
+    (/search and /api/search). init_rate_limits() turns it into a Flask-Limiter
+    shared_limit. Views without one count against "default", per endpoint.
+    """
+    if name not in RATE_LIMITS:
+        raise ValueError(f"Unknown rate limit budget '{name}'")
+
+    def decorator(view):
+        view.rate_limit = (name, methods)
+        return view
+    return decorator
+
+
+def record_transfer(num_bytes: int) -> None:
+    """Bytes the current response sends; charged to the bandwidth budget after the request."""
+    g.transfer_bytes = num_bytes
+
+
+def init_rate_limits(app):
+    """
+    Flask-Limiter for `app`, after its blueprints are registered. Counters live in a
+    storage all worker processes of the host share: a SQLite file in the instance
+    folder unless RATELIMIT_STORAGE_URI says otherwise (memory:// for a single
+    process, redis://... across hosts). RATELIMIT_ENABLED=0 switches limiting off.
+
+    Views with a rate_limit() budget get a shared_limit scoped by its name; "transfer"
+    views also get the bandwidth budget: before the request it only needs 1 MB left,
+    after it the MB recorded by record_transfer() are deducted (the cost), so once the
+    budget is used up further transfers are refused until the window resets.
+    Returns the Limiter, or None when limiting is off.
+    """
+    app.config.setdefault("RATELIMIT_ENABLED", os.getenv("RATELIMIT_ENABLED", "1") != "0")
+    if not app.config["RATELIMIT_ENABLED"]:
+        return None
+    if not app.config.get("RATELIMIT_STORAGE_URI"):
+        storage_uri = os.getenv("RATELIMIT_STORAGE_URI")
+        if not storage_uri:
+            os.makedirs(app.instance_path, exist_ok=True)
+            storage_uri = f"sqlite:///{os.path.join(app.instance_path, 'ratelimits.db')}"
+        app.config["RATELIMIT_STORAGE_URI"] = storage_uri
+    # RATELIMIT_DEFAULT is also Flask-Limiter's own name for the default limits
+    budgets = {name: app.config.get(f"RATELIMIT_{name.upper()}", value) for name, value in RATE_LIMITS.items()}
+
+    limiter = Limiter(key_func=rate_limit_key, default_limits=[budgets["default"]],
+                      storage_uri=app.config["RATELIMIT_STORAGE_URI"], strategy="fixed-window")
+    limiter.init_app(app)
+
+    bandwidth = parse(budgets["bandwidth"])
+    for endpoint, view in list(app.view_functions.items()):
+        if not hasattr(view, "rate_limit"):
+            continue
+        name, methods = view.rate_limit
+        # Decorated limits are checked by the wrapper when the view is called, not in before_request
+        if name == "transfer":
+            view = limiter.shared_limit(
+                budgets["bandwidth"], scope="bandwidth", error_message=str(bandwidth).replace(" per ", " MB per ", 1),
+                cost=lambda: min(bandwidth.amount, _transfer_units()),
+                deduct_when=lambda response: "transfer_bytes" in g)(view)
+        app.view_functions[endpoint] = limiter.shared_limit(budgets[name], scope=name, methods=methods)(view)
+
+    @app.errorhandler(RateLimitExceeded)
+    def rate_limit_exceeded(e):
+        response = e.get_response()
+        if limiter.current_limit is not None:
+            response.headers["Retry-After"] = str(max(1, math.ceil(limiter.current_limit.reset_at - time.time())))
+        return response
+
+    app.extensions["rate_limits"] = limiter
+    return limiter
+
+
+def _transfer_units() -> int:
+    """Whole MB of the response (rounded up); 1 before the view has run."""
+    return max(1, math.ceil(g.get("transfer_bytes", 0) / BANDWIDTH_UNIT))
+
+
+class SQLiteStorage(Storage):
+    """
+    `limits` storage in a local SQLite file (sqlite:///path, like SQLAlchemy URLs),
+    shared by the worker processes of one host. Fixed-window counters only: a hit is
+    one upsert. The counters aren't worth an fsync, so the file runs with
+    synchronous = OFF; expired rows are purged every PURGE_EVERY hits.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+    PURGE_EVERY = 1000
+
+    _INCR = (
+        "INSERT INTO ratelimits (key, count, expires_at) VALUES (?1, ?2, ?3) "
+        "ON CONFLICT(key) DO UPDATE SET "
+        "count = CASE WHEN expires_at <= ?4 THEN excluded.count ELSE count + excluded.count END, "
+        "expires_at = CASE WHEN expires_at <= ?4 THEN excluded.expires_at ELSE expires_at END "
+        "RETURNING count")
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = uri.split("://", 1)[1][1:]
+        self._local = threading.local()
+        self._hits = 0
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # A connection must not cross a fork (app created before the workers fork)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = OFF")
+            # Created on first use: apps that never serve a request leave no file behind
+            conn.execute("CREATE TABLE IF NOT EXISTS ratelimits "
+                         "(key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL) WITHOUT ROWID")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        now = time.time()
+        conn = self._connection()
+        count = conn.execute(self._INCR, (key, amount, now + expiry, now)).fetchone()[0]
+        self._hits += 1
+        if self._hits % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM ratelimits WHERE expires_at <= ?", (now,))
+        return count
+
+    def get(self, key: str) -> int:
+        row = self._connection().execute(
+            "SELECT count FROM ratelimits WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        row = self._connection().execute(
+            "SELECT expires_at FROM ratelimits WHERE key = ?", (key,)).fetchone()
+        return row[0] if row and row[0] > time.time() else time.time()
+
+    def check(self) -> bool:
+        try:
+            self._connection().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int:
+        return self._connection().execute("DELETE FROM ratelimits").rowcount
+
+    def clear(self, key: str) -> None:
+        self._connection().execute("DELETE FROM ratelimits WHERE key = ?", (key,))
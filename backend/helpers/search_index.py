@@ -0,0 +1,164 @@
+import re
+from functools import lru_cache
+from markupsafe import Markup, escape
+from sqlalchemy import bindparam, column, event, func, inspect, literal_column, table, text
+from database import db
+from models import Document
+
+# FTS5 virtual table, one row per document (rowid = documents.id) holding the
+# title and the text of the current version. Declared as a lightweight table()
+# so db.create_all() never tries to create it as a regular table.
+SEARCH_TABLE = "document_search"
+document_search = table(
+    SEARCH_TABLE, column("rowid"), column("title"), column("content"))
+
+# Snippet highlight markers; replaced by <mark> after the text is HTML-escaped
+_HIGHLIGHT_START = "\x02"
+_HIGHLIGHT_END = "\x03"
+
+
+# Minimum trigram similarity of a fuzzy title match (pg_trgm's default similarity_threshold)
+FUZZY_TITLE_THRESHOLD = 0.3
+
+
+def search_index_available() -> bool:
+    """FTS5 is SQLite-only; other backends fall back to ILIKE title search."""
+    return db.engine.dialect.name == "sqlite"
+
+
+def ensure_search_index() -> bool:
+    """Create the FTS5 table if missing. Returns True if it was just created."""
+    if not search_index_available():
+        return False
+    if inspect(db.engine).has_table(SEARCH_TABLE):
+        return False
+
+    db.session.execute(text(
+        f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+        "title, content, tokenize='unicode61 remove_diacritics 2')"
+    ))
+    db.session.commit()
+    return True
+
+
+def index_document(document_id: int, title: str, content: str) -> None:
+    """Insert or replace the index row of a document. Does not commit."""
+    if not search_index_available():
+        return
+    db.session.execute(
+        text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = :id"), {"id": document_id})
+    db.session.execute(
+        text(f"INSERT INTO {SEARCH_TABLE} (rowid, title, content) VALUES (:id, :title, :content)"),
+        {"id": document_id, "title": title, "content": content or ""},
+    )
+
+
+def index_documents(rows) -> None:
+    """Batch index_document for [{"id", "title", "content"}] (bulk ingestion). Does not commit."""
+    if not search_index_available() or not rows:
+        return
+    db.session.execute(
+        text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN :ids").bindparams(
+            bindparam("ids", expanding=True)),
+        {"ids": [row["id"] for row in rows]})
+    db.session.execute(
+        text(f"INSERT INTO {SEARCH_TABLE} (rowid, title, content) VALUES (:id, :title, :content)"),
+        [{**row, "content": row.get("content") or ""} for row in rows])
+
+
+def build_match_query(title: str = None, content: str = None):
+    """
+    Turn free-text user input into a safe FTS5 MATCH expression.
+    Every word becomes a quoted prefix term, so user input can't inject FTS syntax.
+    `title` terms are restricted to the title column, `content` terms search both.
+    Returns None if there is nothing to match.
+    """
+    clauses = []
+    title_terms = _prefix_terms(title)
+    if title_terms:
+        clauses.append("{title} : (" + " AND ".join(title_terms) + ")")
+    clauses.extend(_prefix_terms(content))
+    return " AND ".join(clauses) or None
+
+
+def _prefix_terms(value: str) -> list[str]:
+    return [f'"{word}"*' for word in re.findall(r"\w+", value or "")]
+
+
+def match_clause(match: str):
+    """WHERE clause for a build_match_query() expression."""
+    return text(f"{SEARCH_TABLE} MATCH :match").bindparams(match=match)
+
+
+def rank_column():
+    """bm25 score of the current match (lower is better); title hits weigh 10x."""
+    return literal_column(f"bm25({SEARCH_TABLE}, 10.0, 1.0)")
+
+
+def snippet_column(tokens: int = 16):
+    """Snippet around the best matching column, with highlight markers."""
+    return literal_column(
+        f"snippet({SEARCH_TABLE}, -1, '{_HIGHLIGHT_START}', '{_HIGHLIGHT_END}', '…', {tokens})")
+
+
+def render_snippet(snippet: str):
+    """HTML-escape a raw snippet and turn its markers into <mark> tags."""
+    if not snippet:
+        return None
+    html = str(escape(snippet))
+    html = html.replace(_HIGHLIGHT_START, "<mark>").replace(_HIGHLIGHT_END, "</mark>")
+    return Markup(html)
+
+
+def trigram_index_available() -> bool:
+    """PostgreSQL has pg_trgm (migration 0005): ILIKE and similarity use a GIN index on the title."""
+    return db.engine.dialect.name == "postgresql"
+
+
+def title_contains_clause(title: str):
+    """
+    Case-insensitive substring match on the title, user wildcards escaped.
+    The pattern is a single literal parameter so PostgreSQL can answer it from the
+    trigram index (3+ characters); elsewhere it is a scan.
+    """
+    pattern = title.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return Document.title.ilike(f"%{pattern}%", escape="\\")
+
+
+def fuzzy_title_clause(title: str):
+    """Titles similar to `title` (trigram similarity >= FUZZY_TITLE_THRESHOLD), typos allowed."""
+    if trigram_index_available():
+        # The % operator is the indexable form of similarity() >= pg_trgm.similarity_threshold
+        return Document.title.op("%")(title)
+    return func.similarity(Document.title, title) >= FUZZY_TITLE_THRESHOLD
+
+
+def title_distance_column(title: str):
+    """1 - trigram similarity to `title`: the fuzzy match rank, lower is better (like bm25)."""
+    return 1 - func.similarity(Document.title, title)
+
+
+@lru_cache(maxsize=65536)  # SQLite calls similarity() once per candidate row with the same query
+def trigrams(value: str) -> frozenset[str]:
+    """pg_trgm's trigrams: lower-cased words padded with two leading and one trailing space."""
+    result = set()
+    for word in re.findall(r"[^\W_]+", (value or "").lower()):
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(result)
+
+
+def trigram_similarity(a: str, b: str) -> float:
+    """Same result as pg_trgm's similarity(a, b): shared trigrams / all trigrams."""
+    ta, tb = trigrams(a), trigrams(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+def init_search_functions(engine) -> None:
+    """Provide pg_trgm's similarity() on SQLite connections (fuzzy title search)."""
+    if engine.dialect.name != "sqlite":
+        return
+    event.listen(engine, "connect", lambda dbapi_connection, record: dbapi_connection.create_function(
+        "similarity", 2, trigram_similarity, deterministic=True))
@@ -1,11 +1,29 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from database import db
 from models import *
-from werkzeug.security import generate_password_hash
 import os
 from werkzeug.utils import secure_filename
-from flask import jsonify
+from helpers.storage import stream_upload_to_temp, blob_path, move_into_place, iter_blob_files, discard_file
+from helpers.blob_encoding import encode_blob, delta_base, readable_blob_path
+from helpers.text_extraction import extract_text
+from helpers.extraction_queue import enqueue_extraction_job
+from helpers.cache import GenerationalCache
+from helpers.passwords import hash_password
+from helpers.user_context import UserContext
+from helpers.access import (
+    accessible_data_cache, accessible_data_changed,
+    refresh_document_access, grant_public_documents, rebuild_document_access,
+)
+from helpers.search_index import (
+    SEARCH_TABLE, document_search, search_index_available, index_document,
+    build_match_query, match_clause, rank_column, snippet_column, render_snippet,
+    title_contains_clause, fuzzy_title_clause, title_distance_column,
+)
+from flask import current_app, jsonify
+from sqlalchemy import bindparam, delete, func, insert, literal, select, text, union_all, update
 import uuid
+import base64
+import json
 
 FILES_DIR = "./files"
 
@@ -43,10 +61,12 @@ def create_employee(username: str,email: str, password: str, role_name: str, dep
     if not department:
         department = Department(name=department_name)
         db.session.add(department)
+        db.session.flush()
+        grant_public_documents([department.id])
         db.session.commit()
 
-    # Hash password
-    password_hash = generate_password_hash(password)
+    # Hash password (PASSWORD_HASH_METHOD policy)
+    password_hash = hash_password(password)
 
     # Create employee
     employee = Employee(
@@ -65,7 +85,7 @@ def create_employee(username: str,email: str, password: str, role_name: str, dep
 
 def handle_document_upload(
     title: str,
-    uploader_name: str,
+    uploader: UserContext,
     file,  # this should be a FileStorage object from Flask
     version_number: float,
     departments: list[str],
@@ -76,42 +96,233 @@ def handle_document_upload(
                          for d in departments or [] if d and d.strip()]))
     
     tags = sorted(set([t.strip().lower() for t in tags or [] if t and t.strip()]))
-    uploader_name = uploader_name.strip().lower()
-    
-    os.makedirs(FILES_DIR, exist_ok=True)
-    print("Departments:", departments)
-    print("Tags:", tags)
-    # 2. Find uploader
-    uploader = Employee.query.filter_by(name=uploader_name).first()
-    if not uploader:
-        raise ValueError(f"Uploader '{uploader_name}' not found")
-
-    # 3. Secure filename and save the file
+
+    # 3. Stream the upload to a temp file (hash + size limit), then store it by content hash
     filename = secure_filename(file.filename)
+    ext = os.path.splitext(filename)[1]
+    filename = filename if filename else f"upload_{uuid.uuid4().hex}{ext}"
+
+    temp_path, content_hash, size = stream_upload_to_temp(file, FILES_DIR)
+    base = _current_version_blob(title) if compact_storage_enabled() else None
+    filepath, created = store_blob(temp_path, content_hash, size, filename, base)
+
+    try:
+        document = _record_document_upload(
+            title, uploader, filepath, content_hash, filename, version_number, departments, tags)
+    except Exception:
+        db.session.rollback()
+        # Drop the file only if no committed blob row points at it
+        if created and db.session.get(Blob, content_hash) is None:
+            discard_file(filepath)
+        raise
+    return document
 
-    base_name, ext = os.path.splitext(filename)
-    candidate = filename if filename else f"upload_{uuid.uuid4().hex}{ext}"
-    filepath = os.path.join(FILES_DIR, candidate)
 
-    # Ensure unique filename to avoid collisions
-    if os.path.exists(filepath):
-        unique_suffix = f"_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
-        candidate = f"{base_name}{unique_suffix}{ext}"
-        filepath = os.path.join(FILES_DIR, candidate)
+def compact_storage_enabled() -> bool:
+    """DOCUMENT_STORAGE=compact: new blobs are stored as deltas or compressed (helpers/blob_encoding.py)."""
+    return current_app.config.get("DOCUMENT_STORAGE") == "compact"
 
-    # Save file using the final unique name
-    file.save(filepath)
-    filename = candidate
-    
+
+def _current_version_blob(title: str):
+    """(content_hash, filepath) of the current version of `title`: the delta base of its next version."""
+    return (
+        db.session.query(Blob.hash, Blob.filepath)
+        .join(DocumentVersion, DocumentVersion.content_hash == Blob.hash)
+        .join(Document, Document.current_version_id == DocumentVersion.id)
+        .filter(Document.title == title)
+        .first()
+    )
+
+
+def store_blob(temp_path: str, content_hash: str, size: int, filename: str = "", base=None):
+    """
+    Store a streamed temp file in the content-addressed blob store and take a reference.
+    If a blob with the same hash exists the temp file is dropped and nothing is written.
+    In compact storage mode a new blob is encoded (a delta against `base`, the
+    (content_hash, filepath) of the previous version, or compressed) when that saves space.
+    Returns (filepath, created). Does not commit.
+    """
+    # Taking the reference stamps last_referenced_at and locks the row until commit,
+    # so a concurrent collect_unreferenced_blobs either deleted it first (no row is
+    # updated) or skips it
+    referenced = db.session.execute(
+        update(Blob)
+        .where(Blob.hash == content_hash)
+        .values(ref_count=Blob.ref_count + 1, last_referenced_at=datetime.now())
+        .returning(Blob.filepath)
+    ).first()
+
+    if referenced and os.path.exists(referenced.filepath):
+        discard_file(temp_path)
+        return referenced.filepath, False
+
+    filepath = blob_path(FILES_DIR, content_hash)
+    move_into_place(temp_path, filepath)
+    if compact_storage_enabled():
+        # A lost blob can be the base of other deltas, `base` among them: restoring it
+        # as a delta could close a cycle, so it is stored as a snapshot
+        filepath, _ = encode_blob(filepath, filename, None if referenced else base)
+
+    if referenced:
+        _restore_blob(content_hash, referenced.filepath, filepath)
+    else:
+        db.session.add(Blob(hash=content_hash, filepath=filepath,
+                       size=size, ref_count=1))
+    return filepath, True
+
+
+def _restore_blob(content_hash: str, old_path: str, filepath: str) -> None:
+    """Point a blob whose file was lost, and the versions stored under its old path, at the restored file."""
+    db.session.execute(update(Blob).where(Blob.hash == content_hash).values(filepath=filepath))
+    if filepath != old_path:
+        db.session.execute(
+            update(DocumentVersion).where(DocumentVersion.filepath == old_path).values(filepath=filepath))
+        document_detail_changed()
+
+
+def store_blobs(staged) -> list:
+    """
+    Batch store_blob for bulk ingestion: staged is [(temp_path, content_hash, size)].
+    One lookup for all hashes, duplicates within the batch share one blob, and
+    reference counts are raised with one executemany UPDATE.
+    Returns [(filepath, created)] in the same order. Does not commit.
+    """
+    hashes = {h for _, h, _ in staged}
+    # Stamped (and locked) before the lookup, as in store_blob
+    db.session.execute(
+        update(Blob).where(Blob.hash.in_(hashes)).values(last_referenced_at=datetime.now()))
+    existing = {
+        blob.hash: blob
+        for blob in Blob.query.filter(Blob.hash.in_(hashes))
+    }
+    new_rows = {}
+    increments = {}
+    stored = []
+
+    for temp_path, content_hash, size in staged:
+        if content_hash in new_rows:
+            discard_file(temp_path)
+            new_rows[content_hash]["ref_count"] += 1
+            stored.append((new_rows[content_hash]["filepath"], False))
+            continue
+
+        blob = existing.get(content_hash)
+        if blob and os.path.exists(blob.filepath):
+            discard_file(temp_path)
+            increments[content_hash] = increments.get(content_hash, 0) + 1
+            stored.append((blob.filepath, False))
+            continue
+
+        filepath = blob_path(FILES_DIR, content_hash)
+        move_into_place(temp_path, filepath)
+        if blob:
+            _restore_blob(content_hash, blob.filepath, filepath)
+            increments[content_hash] = increments.get(content_hash, 0) + 1
+        else:
+            new_rows[content_hash] = {"hash": content_hash, "filepath": filepath,
+                                      "size": size, "ref_count": 1}
+        stored.append((filepath, True))
+
+    if new_rows:
+        db.session.execute(insert(Blob), list(new_rows.values()))
+    if increments:
+        db.session.connection().execute(
+            update(Blob.__table__)
+            .where(Blob.__table__.c.hash == bindparam("content_hash"))
+            .values(ref_count=Blob.__table__.c.ref_count + bindparam("increment")),
+            [{"content_hash": h, "increment": n} for h, n in increments.items()],
+        )
+    return stored
+
+
+def collect_unreferenced_blobs(grace_seconds: int = 3600) -> dict:
+    """
+    Garbage-collect the blob store.
+    - Recompute every blob's ref_count from document_versions
+    - Delete blobs (row + file) that no version references and that were not
+      referenced (created or deduplicated onto) in the last `grace_seconds`, so
+      in-flight uploads keep theirs, unless a kept delta blob is built on them
+    - Delete blob files on disk that have no row and are older than `grace_seconds`
+      (left behind by uploads that died before committing)
+    Returns counts of what was reclaimed.
+    """
+    ref_counts = dict(
+        db.session.query(Blob.hash, db.func.count(DocumentVersion.id))
+        .outerjoin(DocumentVersion, DocumentVersion.content_hash == Blob.hash)
+        .group_by(Blob.hash)
+        .all()
+    )
+
+    cutoff = datetime.now() - timedelta(seconds=grace_seconds)
+    blobs = Blob.query.all()
+    keep = {blob.hash for blob in blobs
+            if ref_counts.get(blob.hash, 0) or blob.last_referenced_at > cutoff}
+    # Delta chains: every blob a kept delta is rebuilt from stays too
+    bases = {}
+    for content_hash, filepath in iter_blob_files(FILES_DIR):
+        base_hash = delta_base(filepath)
+        if base_hash:
+            bases[content_hash] = base_hash
+    pending = list(keep)
+    while pending:
+        base_hash = bases.get(pending.pop())
+        if base_hash and base_hash not in keep:
+            keep.add(base_hash)
+            pending.append(base_hash)
+
+    db.session.execute(update(Blob).values(ref_count=(
+        select(func.count(DocumentVersion.id))
+        .where(DocumentVersion.content_hash == Blob.hash)
+        .scalar_subquery())))
+
+    removed_blobs = 0
+    reclaimed_bytes = 0
+    for blob in blobs:
+        if blob.hash in keep:
+            continue
+        # Only if no upload referenced it since: store_blob stamps the row first
+        deleted = db.session.execute(
+            delete(Blob).where(Blob.hash == blob.hash, Blob.last_referenced_at <= cutoff)
+        ).rowcount
+        if not deleted:
+            keep.add(blob.hash)
+            continue
+        # Encoded blobs take less than their content size on disk
+        reclaimed_bytes += os.path.getsize(blob.filepath) if os.path.exists(blob.filepath) else blob.size
+        # Before the commit, while the row is locked: an upload of the same content
+        # waits for it and then stores a new file
+        discard_file(blob.filepath)
+        removed_blobs += 1
+    db.session.commit()
+
+    removed_orphans = 0
+    cutoff_timestamp = cutoff.timestamp()
+    for content_hash, filepath in iter_blob_files(FILES_DIR):
+        if content_hash in ref_counts or content_hash in keep or os.path.getmtime(filepath) > cutoff_timestamp:
+            continue
+        reclaimed_bytes += os.path.getsize(filepath)
+        discard_file(filepath)
+        removed_orphans += 1
+
+    return {
+        "removed_blobs": removed_blobs,
+        "removed_orphan_files": removed_orphans,
+        "reclaimed_bytes": reclaimed_bytes,
+    }
+
+
+def _record_document_upload(title, uploader, filepath, content_hash, filename, version_number, departments, tags):
     # 4. Check if document already exists (based on title)
     document = Document.query.filter_by(title=title).first()
+    is_new_document = document is None
 
-    if not document:
+    if is_new_document:
         # New Document
         new_version = DocumentVersion(
             document_id=-1,  # we’ll set later
             version_number=version_number,
             filepath=filepath,
+            content_hash=content_hash,
             filename=filename,
             uploaded_at=datetime.now(),
             uploader_id=uploader.id,
@@ -133,29 +344,21 @@ def handle_document_upload(
 
         # Permissions
         if not departments:
-            exists = db.session.query(DocumentPermission).filter_by(
-                document_id=document.id).first()
-            if not exists:
-                db.session.add(DocumentPermission(
-                    document_id=document.id, department_id=None))
+            db.session.add(DocumentPermission(
+                document_id=document.id, department_id=None))
+            refresh_document_access(document.id)
         else:
-            set_document_department_permission(document.id, uploader.department_id)
-            for dep_name in departments:
-                dep = Department.query.filter_by(name=dep_name).first()
-                if not dep:
-                    dep = Department(name=dep_name)
-                    db.session.add(dep)
-                    db.session.flush()
-                set_document_department_permission(document.id, dep.id)
+            department_ids = resolve_or_create_departments(departments)
+            # The uploader's department can see the document too. An uploader without one
+            # adds no grant: restricted documents are never visible on PUBLIC_ONLY_KEY
+            grants = list(department_ids.values())
+            if uploader.department_id is not None:
+                grants.append(uploader.department_id)
+            set_document_department_permissions(document.id, grants)
 
         # Tags
-        for tag_name in tags:
-            tag = Tag.query.filter_by(name=tag_name).first()
-            if not tag:
-                tag = Tag(name=tag_name)
-                db.session.add(tag)
-                db.session.flush()
-            add_document_tag_if_missing(document.id, tag.id)
+        tag_ids = resolve_or_create_by_name(Tag, tags)
+        add_document_tags_if_missing(document.id, tag_ids.values())
 
     else:
         # Existing Document → Add new version
@@ -163,6 +366,7 @@ def handle_document_upload(
             document_id=document.id,
             version_number=version_number,
             filepath=filepath,
+            content_hash=content_hash,
             filename=filename,
             uploaded_at=datetime.now(),
             uploader_id=uploader.id,
@@ -175,49 +379,135 @@ def handle_document_upload(
 
         # Permissions update
         if departments:
-            for dep_name in departments:
-                dep = Department.query.filter_by(name=dep_name).first()
-                if not dep:
-                    dep = Department(name=dep_name)
-                    db.session.add(dep)
-                    db.session.flush()
-                set_document_department_permission(document.id, dep.id)
+            department_ids = resolve_or_create_departments(departments)
+            set_document_department_permissions(document.id, department_ids.values())
 
         # Tags update
-        for tag_name in tags:
-            tag = Tag.query.filter_by(name=tag_name).first()
-            if not tag:
-                tag = Tag(name=tag_name)
-                db.session.add(tag)
-                db.session.flush()
-            
-            add_document_tag_if_missing(document.id, tag.id)
-
-    # Commit all changes
+        tag_ids = resolve_or_create_by_name(Tag, tags)
+        add_document_tags_if_missing(document.id, tag_ids.values())
+
+    # Full-text index: new documents are searchable by title right away, the text of
+    # the new version is extracted in the background (helpers.extraction_queue)
+    if is_new_document:
+        index_document(document.id, document.title, "")
+    enqueue_extraction_job(document.id, new_version.id)
+
+    # Commit all changes (single transaction for the whole upload)
     db.session.commit()
     return document
 
 
-def set_document_department_permission(document_id: int, department_id: int) -> None:
+def resolve_or_create_by_name(model, names) -> dict[str, int]:
+    """
+    Resolve a set of names to ids for a model with a unique ``name`` column
+    (Tag, Department), inserting the missing ones.
+    Uses one IN (...) lookup and one multi-row INSERT. Does not commit.
+    """
+    ids, _ = _resolve_or_create_names(model, names)
+    return ids
+
+
+def resolve_or_create_departments(names) -> dict[str, int]:
+    """resolve_or_create_by_name for departments; new departments get the public documents."""
+    ids, created = _resolve_or_create_names(Department, names)
+    if created:
+        grant_public_documents([ids[name] for name in created])
+    return ids
+
+
+def _resolve_or_create_names(model, names):
+    """Returns ({name: id}, [names that were inserted])."""
+    names = set(names or [])
+    if not names:
+        return {}, []
+
+    existing = dict(
+        db.session.query(model.name, model.id)
+        .filter(model.name.in_(names))
+        .all()
+    )
+
+    missing = sorted(names - existing.keys())
+    if missing:
+        db.session.execute(
+            insert(model).values([{"name": name} for name in missing]))
+        existing.update(
+            db.session.query(model.name, model.id)
+            .filter(model.name.in_(missing))
+            .all()
+        )
+
+    return existing, missing
+
+
+def set_document_department_permissions(document_id: int, department_ids) -> None:
     """
+    Batch version of set_document_department_permission. Does not commit.
     - Remove 'public' (NULL) permission for the document if it exists
-    - Add (document_id, department_id) if it does not already exist
+    - Add every (document_id, department_id) that does not already exist
+    None ids are ignored: making a document public again is not a department grant.
     """
-    # Remove public access (NULL department)
+    department_ids = {d for d in department_ids if d is not None}
+    if not department_ids:
+        return
+
     db.session.query(DocumentPermission).filter_by(
         document_id=document_id, department_id=None
     ).delete(synchronize_session=False)
 
-    # Add specific department permission if missing
-    exists = db.session.query(DocumentPermission).filter_by(
-        document_id=document_id, department_id=department_id
-    ).first()
+    existing = {
+        row.department_id
+        for row in db.session.query(DocumentPermission.department_id).filter(
+            DocumentPermission.document_id == document_id,
+            DocumentPermission.department_id.in_(department_ids),
+        )
+    }
+
+    missing = sorted(department_ids - existing)
+    if missing:
+        db.session.execute(insert(DocumentPermission).values([
+            {"document_id": document_id, "department_id": dep_id}
+            for dep_id in missing
+        ]))
+
+    refresh_document_access(document_id)
+    document_detail_changed()
+
+
+def add_document_tags_if_missing(document_id: int, tag_ids) -> int:
+    """
+    Batch version of add_document_tag_if_missing. Does not commit.
+    Returns the number of (document_id, tag_id) rows inserted.
+    """
+    tag_ids = set(tag_ids)
+    if not tag_ids:
+        return 0
+
+    existing = {
+        row.tag_id
+        for row in db.session.query(DocumentTag.tag_id).filter(
+            DocumentTag.document_id == document_id,
+            DocumentTag.tag_id.in_(tag_ids),
+        )
+    }
 
-    if not exists:
-        db.session.add(DocumentPermission(
-            document_id=document_id, department_id=department_id
-        ))
+    missing = sorted(tag_ids - existing)
+    if missing:
+        db.session.execute(insert(DocumentTag).values([
+            {"document_id": document_id, "tag_id": tag_id}
+            for tag_id in missing
+        ]))
+        accessible_data_changed()
+        document_detail_changed()
+    return len(missing)
 
+
+def set_document_department_permission(document_id: int, department_id: int) -> None:
+    """
+    - Remove 'public' (NULL) permission for the document if it exists
+    - Add (document_id, department_id) if it does not already exist
+    """
+    set_document_department_permissions(document_id, [department_id])
     db.session.commit()
 
 
@@ -226,71 +516,330 @@ def add_document_tag_if_missing(document_id: int, tag_id: int) -> bool:
     Insert (document_id, tag_id) into document_tags if it does not already exist.
     Returns True if inserted, False if it already existed.
     """
-    exists = DocumentTag.query.filter_by(
-        document_id=document_id, tag_id=tag_id
-    ).first()
+    inserted = add_document_tags_if_missing(document_id, [tag_id])
+    db.session.commit()
+    return inserted > 0
 
-    if exists:
-        return False
 
-    db.session.add(DocumentTag(document_id=document_id, tag_id=tag_id))
-    db.session.commit()
-    return True
+def search_documents(title: str, tags: list[str], uploader_names: list[str], user: UserContext, content: str = None,
+                     tag_mode: str = "all", exclude_tags: list[str] = None, title_mode: str = "words"):
+    """
+    Search documents the user can access.
+    `title` matches words (prefixes) of the title, `content` matches the extracted
+    text or the title. Both go through the FTS5 index and results are ranked by bm25;
+    without an index (PostgreSQL) title is a substring match (ILIKE on the trigram
+    index) and content is ignored.
+    title_mode="fuzzy" matches titles by trigram similarity instead (typos allowed),
+    most similar first.
+    `tags` must all match (tag_mode="all") or at least one (tag_mode="any");
+    documents with any of `exclude_tags` are left out.
+    Returns [{"title": ..., "snippet": ...}], snippet is None when nothing was matched.
+    """
+    query, score = _build_search_query(
+        user, title, tags, uploader_names, content, tag_mode, exclude_tags, title_mode)
+    if score is not None:
+        query = query.order_by(text("score"))
 
+    return [
+        {"title": row.title, "snippet": render_snippet(row.snippet)}
+        for row in query.all()
+    ]
 
-def search_documents(title: str, tags: list[str], uploader_names: list[str], username: str):
-    # Find requesting user
-    user = Employee.query.filter_by(name=username).first()
-    if not user:
-        raise ValueError(f"User '{username}' not found")
 
-    # Base query: join document + latest version + uploader
-    query = Document.query
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+
+def search_documents_page(title: str, tags: list[str], uploader_names: list[str], user: UserContext,
+                          content: str = None, page_size: int = SEARCH_PAGE_SIZE, cursor: str = None,
+                          tag_mode: str = "all", exclude_tags: list[str] = None, title_mode: str = "words"):
+    """
+    One page of search_documents, using keyset (cursor) pagination.
+    Rows are ordered by (score, id) for ranked searches (bm25, fuzzy title distance)
+    and by (title, id) otherwise; the cursor encodes the last row's sort key so the next page is a
+    range seek instead of an OFFSET. Only columns are selected, never Document objects.
+    Returns {"results": [{"id", "title", "snippet"}], "next_cursor": str or None}.
+    Raises ValueError for a malformed cursor.
+    """
+    page_size = max(1, min(int(page_size), SEARCH_MAX_PAGE_SIZE))
+    query, score = _build_search_query(
+        user, title, tags, uploader_names, content, tag_mode, exclude_tags, title_mode)
+    ranked = score is not None
+
+    if ranked:
+        sort_key = (score, Document.id)
+    else:
+        sort_key = (Document.title, Document.id)
+
+    if cursor:
+        last_value, last_id = _decode_search_cursor(cursor, "score" if ranked else "title")
+        query = query.filter(
+            (sort_key[0] > last_value) | ((sort_key[0] == last_value) & (Document.id > last_id))
+        )
+
+    rows = query.order_by(*sort_key).limit(page_size + 1).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = _encode_search_cursor(
+            "score" if ranked else "title", last.score if ranked else last.title, last.document_id)
+
+    return {
+        "results": [
+            {"id": row.document_id, "title": row.title,
+             "snippet": str(render_snippet(row.snippet)) if row.snippet else None}
+            for row in rows
+        ],
+        "next_cursor": next_cursor,
+    }
 
-    # Filter by title (smart partial search)
-    if title:
-        query = query.filter(Document.title.ilike(f"%{title}%"))
+
+def _encode_search_cursor(kind: str, value, document_id: int) -> str:
+    payload = json.dumps({"k": kind, "v": value, "i": document_id}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def _decode_search_cursor(cursor: str, kind: str):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if payload["k"] != kind:
+            raise ValueError("cursor belongs to a different search")
+        return payload["v"], int(payload["i"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def search_with_facets(title: str, tags: list[str], uploader_names: list[str], user: UserContext,
+                       content: str = None, include_results: bool = True,
+                       tag_mode: str = "all", exclude_tags: list[str] = None, title_mode: str = "words"):
+    """
+    search_documents plus per-tag and per-uploader counts over the matching documents,
+    in a single statement (the match set is a CTE shared by all three parts).
+    Counts narrow with the filters; selected tags/uploaders with no match are kept with
+    count 0 so they stay selectable. With include_results=False only the facets are computed.
+    Returns {"results": [...] or None, "facets": {"tags": [...], "uploaders": [...]}}
+    where facet entries are {"name": ..., "count": ...}, most frequent first.
+    """
+    query, score = _build_search_query(
+        user, title, tags, uploader_names, content, tag_mode, exclude_tags, title_mode)
+    matches = query.cte("matches")
+
+    parts = [
+        select(literal("tag").label("kind"), Tag.name.label("name"),
+               literal(None).label("snippet"), func.count().label("value"))
+        .select_from(matches)
+        .join(DocumentTag, DocumentTag.document_id == matches.c.document_id)
+        .join(Tag, Tag.id == DocumentTag.tag_id)
+        .group_by(Tag.name),
+        select(literal("uploader").label("kind"), Employee.name.label("name"),
+               literal(None).label("snippet"), func.count().label("value"))
+        .select_from(matches)
+        .join(Employee, Employee.id == matches.c.uploader_id)
+        .group_by(Employee.name),
+    ]
+    if include_results:
+        parts.insert(0, select(literal("document").label("kind"), matches.c.title.label("name"),
+                               matches.c.snippet, matches.c.score.label("value")))
+
+    results = [] if include_results else None
+    facets = {"tags": [], "uploaders": []}
+    for row in db.session.execute(union_all(*parts)):
+        if row.kind == "document":
+            results.append({"title": row.name, "snippet": render_snippet(row.snippet),
+                            "score": row.value})
+        else:
+            facets[f"{row.kind}s"].append({"name": row.name, "count": row.value})
+
+    if results and score is not None:
+        results.sort(key=lambda r: r["score"])
+    selected_tags = [*(tags or []), *(exclude_tags or [])]
+    for key, selected in (("tags", selected_tags), ("uploaders", uploader_names)):
+        for name in set(selected or []) - {f["name"] for f in facets[key]}:
+            facets[key].append({"name": name, "count": 0})
+    for entries in facets.values():
+        entries.sort(key=lambda f: (-f["count"], f["name"]))
+
+    return {"results": results, "facets": facets}
+
+
+TAG_MODES = ("all", "any")
+
+
+def apply_tag_filters(query, tags: list[str], tag_mode: str = "all", exclude_tags: list[str] = None):
+    """
+    Restrict a query over Document to the tag filters with a single grouped subquery:
+    - "all": documents having every tag (GROUP BY document HAVING COUNT(tag) = n)
+    - "any": documents having at least one of the tags
+    Documents carrying any of `exclude_tags` are removed (one NOT IN subquery).
+    """
+    if tag_mode not in TAG_MODES:
+        raise ValueError(f"Unknown tag mode '{tag_mode}', expected one of {TAG_MODES}")
+
+    tags = set(tags or [])
+    if tags:
+        tagged = (
+            db.session.query(DocumentTag.document_id)
+            .join(Tag, Tag.id == DocumentTag.tag_id)
+            .filter(Tag.name.in_(tags))
+        )
+        if tag_mode == "all":
+            # (document_id, tag_id) is the primary key, so COUNT(*) counts distinct tags
+            tagged = tagged.group_by(DocumentTag.document_id)\
+                           .having(func.count() == len(tags))
+        query = query.filter(Document.id.in_(tagged.subquery().select()))
+
+    exclude_tags = set(exclude_tags or [])
+    if exclude_tags:
+        excluded = (
+            db.session.query(DocumentTag.document_id)
+            .join(Tag, Tag.id == DocumentTag.tag_id)
+            .filter(Tag.name.in_(exclude_tags))
+        )
+        query = query.filter(Document.id.notin_(excluded.subquery().select()))
+
+    return query
+
+
+TITLE_MODES = ("words", "fuzzy")
+
+
+def _build_search_query(user, title, tags, uploader_names, content, tag_mode="all", exclude_tags=None,
+                        title_mode="words"):
+    """
+    Query of the documents matching the search filters that `user` can access.
+    Columns: document_id, title, uploader_id, snippet, score (snippet is NULL without a
+    full-text match, score is NULL for unranked searches).
+    Returns (query, score) where score is the rank expression (lower is better) or None.
+    """
+    if title_mode not in TITLE_MODES:
+        raise ValueError(f"Unknown title mode '{title_mode}', expected one of {TITLE_MODES}")
+
+    fuzzy = title if title_mode == "fuzzy" and title else None
+    match = build_match_query(None if fuzzy else title, content) if search_index_available() else None
+    columns = [Document.id.label("document_id"), Document.title, Document.uploader_id]
+    score = None
+
+    if match:
+        # Full-text search: FTS5 drives the query, documents looked up by id
+        query = (
+            db.session.query(
+                *columns,
+                snippet_column().label("snippet"),
+                rank_column().label("score"),
+            )
+            .select_from(document_search)
+            .join(Document, Document.id == document_search.c.rowid)
+            .filter(match_clause(match))
+        )
+        score = rank_column()
+    elif fuzzy:
+        score = title_distance_column(fuzzy)
+        query = db.session.query(
+            *columns, literal(None).label("snippet"), score.label("score"))
+    else:
+        query = db.session.query(
+            *columns, literal(None).label("snippet"), literal(None).label("score"))
+
+        # Filter by title (smart partial search, trigram index on PostgreSQL)
+        if title:
+            query = query.filter(title_contains_clause(title))
+
+    # Fuzzy title: trigram similarity (pg_trgm, or similarity() registered on SQLite)
+    if fuzzy:
+        query = query.filter(fuzzy_title_clause(fuzzy))
 
     # Filter by uploader names
     if uploader_names:
         query = query.join(Employee, Employee.id == Document.uploader_id)\
                      .filter(Employee.name.in_(uploader_names))
 
+    # Filter by tags (all / any of them, minus excluded ones)
+    query = apply_tag_filters(query, tags, tag_mode, exclude_tags)
 
-# Filter by tags (must match ALL provided tags)
-    if tags:
-        # Use a subquery approach to avoid duplicate joins
-        for tag_name in tags:
-            tag_subquery = (
-                db.session.query(DocumentTag.document_id)
-                .join(Tag, Tag.id == DocumentTag.tag_id)
-                .filter(Tag.name == tag_name)
-                .subquery().select()
-            )
-            query = query.filter(Document.id.in_(tag_subquery))
+    # Permissions: user’s department OR public, precomputed in document_access
+    query = query.join(DocumentAccess, Document.id == DocumentAccess.document_id)\
+                 .filter(DocumentAccess.department_key == user.access_key)
+
+    return query, score
 
-    # Permissions: user’s department OR public (null)
-    query = query.join(DocumentPermission, Document.id == DocumentPermission.document_id)\
-                 .filter(
-                     (DocumentPermission.department_id == user.department_id) |
-                     (DocumentPermission.department_id.is_(None))
+
+def rebuild_search_index() -> int:
+    """
+    (Re)build the full-text index from every document's current version.
+    Returns the number of documents indexed.
+    """
+    if not search_index_available():
+        return 0
+
+    rows = (
+        db.session.query(Document.id, Document.title,
+                         DocumentVersion.filepath, DocumentVersion.filename)
+        .outerjoin(DocumentVersion, DocumentVersion.id == Document.current_version_id)
+        .all()
     )
 
-    # Remove duplicates (in case of joins)
-    query = query.distinct()
+    db.session.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    for row in rows:
+        content = extract_text(_readable_path(row.filepath), row.filename) if row.filepath else ""
+        index_document(row.id, row.title, content)
+    db.session.commit()
+    return len(rows)
 
-    results = query.all()
-    return [doc.title for doc in results]
+
+# Document detail pages keyed by (document_id, current_version_id): every upload moves
+# current_version_id; tag/permission changes and restored blob paths bump the generation
+document_detail_cache = GenerationalCache("document_detail")
+
+
+def document_detail_changed() -> None:
+    """Invalidate document_detail_cache when the current transaction commits."""
+    document_detail_cache.invalidate_after_commit(db.session)
+
+
+def get_document_detail(user: UserContext, title: str):
+    """
+    Access check + document info for /document_info.
+    One statement checks access and reads the document and its creator; the
+    versions/tags are served from document_detail_cache while the document is unchanged.
+    Returns {"error": ...} if the user can't see the document (or it doesn't exist).
+    """
+    document = db.session.execute(
+        select(Document.id, Document.title, Document.current_version_id,
+               Employee.name.label("creator_name"))
+        .join(DocumentAccess,
+              (DocumentAccess.document_id == Document.id)
+              & (DocumentAccess.department_key == user.access_key))
+        .outerjoin(Employee, Employee.id == Document.uploader_id)
+        .where(Document.title == title)
+    ).first()
+    if document is None:
+        return {"error": "Access denied."}
+
+    return document_detail_cache.get_or_load(
+        (document.id, document.current_version_id),
+        lambda: _load_document_detail(document.id, document.title, document.creator_name))
 
 
 def get_document_version_history(title: str):
     
-    # Find document
-    document = Document.query.filter_by(title=title).first()
+    # Find document with its creator
+    document = (
+        db.session.query(Document.id, Document.title, Employee.name.label("creator_name"))
+        .outerjoin(Employee, Employee.id == Document.uploader_id)
+        .filter(Document.title == title)
+        .first()
+    )
     if not document:
         return {"error": f"Document with title '{title}' not found"}
 
-    # Query all versions with uploader info
+    return _load_document_detail(document.id, document.title, document.creator_name)
+
+
+def _load_document_detail(document_id: int, title: str, creator_name: str) -> dict:
+    # All versions with uploader info
     versions = (
         db.session.query(
             DocumentVersion.id.label("version_id"),
@@ -301,29 +850,24 @@ def get_document_version_history(title: str):
             Employee.name.label("uploader_name")
         )
         .join(Employee, Employee.id == DocumentVersion.uploader_id)
-        .filter(DocumentVersion.document_id == document.id)
+        .filter(DocumentVersion.document_id == document_id)
         .order_by(DocumentVersion.version_number.desc())  # newest first
         .all()
     )
 
-    # Query uploader (creator) of the document
-    creator = db.session.query(Employee.name).filter(Employee.id == document.uploader_id).first()
-    creator_name = creator.name if creator else None
-
-    # Query document tags
+    # Document tags
     tag_rows = (
         db.session.query(Tag.name)
         .join(DocumentTag, Tag.id == DocumentTag.tag_id)
-        .filter(DocumentTag.document_id == document.id)
+        .filter(DocumentTag.document_id == document_id)
         .all()
     )
-    doc_tags = [t.name for t in tag_rows]
 
     # Format result as JSON
-    result = {
-        "document_title": document.title,
+    return {
+        "document_title": title,
         "uploader_name": creator_name,
-        "tags": doc_tags,
+        "tags": [t.name for t in tag_rows],
         "versions": [
             {
                 "version_id": v.version_id,
@@ -337,8 +881,6 @@ def get_document_version_history(title: str):
         ],
     }
 
-    return result
-
 
 def get_document_file(title: str, version_number: int = None):
     
@@ -352,11 +894,14 @@ def get_document_file(title: str, version_number: int = None):
             DocumentVersion.id.label("version_id"),
             DocumentVersion.version_number,
             DocumentVersion.filename,
-            DocumentVersion.filepath,
+            # The blob's path is current even if it was re-encoded or restored since
+            func.coalesce(Blob.filepath, DocumentVersion.filepath).label("filepath"),
             DocumentVersion.uploaded_at,
             Employee.name.label("uploader_name"),
+            DocumentVersion.content_hash,
         )
         .join(Employee, Employee.id == DocumentVersion.uploader_id)
+        .outerjoin(Blob, Blob.hash == DocumentVersion.content_hash)
         .filter(DocumentVersion.document_id == document.id)
     )
 
@@ -378,115 +923,75 @@ def get_document_file(title: str, version_number: int = None):
         "filename": version.filename,
         "uploaded_at": version.uploaded_at.isoformat(),
         "uploader_name": version.uploader_name,
+        # Versions are immutable: the content hash (or, for files stored before
+        # content addressing, the version id) is a strong ETag
+        "etag": version.content_hash or f"version-{version.version_id}",
     }
 
-    file_path = version.filepath if os.path.exists(version.filepath) else None
+    file_path = _readable_path(version.filepath) if os.path.exists(version.filepath) else None
 
     return metadata, file_path
 
 
-def get_accessible_tags_for_user(username: str):
+def _readable_path(filepath: str):
+    """Plain file with the content of a stored version (encoded blobs are rebuilt), None if it can't be."""
+    try:
+        return readable_blob_path(filepath)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        # Corrupt blob (bad delta, hash mismatch): served as missing rather than a 500
+        current_app.logger.warning("Unreadable blob %s: %s", filepath, e)
+        return None
+
+
+def get_accessible_facets(user: UserContext):
     """
-    Returns a list of unique tag names for documents accessible by the given user.
-    Accessible = documents public or in user's department.
+    Tags and uploaders (with document counts) of every document the user can access,
+    i.e. the search page dropdowns. Depends only on the department, so it is cached
+    per access key in accessible_data_cache until the next upload / permission / tag
+    change: zero queries in steady state. The returned dict is shared, don't modify it.
+    Returns {"tags": [{"name", "count"}], "uploaders": [{"name", "count"}]}.
     """
-    # Find the user
-    user = Employee.query.filter_by(name=username).first()
-    if not user:
-        raise ValueError(f"User '{username}' not found")
-
-    # Query all accessible documents (public or user's department)
-    accessible_docs = (
-        db.session.query(Document.id)
-        .join(DocumentPermission, Document.id == DocumentPermission.document_id)
-        .filter(
-            (DocumentPermission.department_id == user.department_id) |
-            (DocumentPermission.department_id.is_(None))
-        )
-        .distinct()
-        .subquery().select()
-    )
+    return accessible_data_cache.get_or_load(
+        f"facets:{user.access_key}",
+        lambda: search_with_facets(
+            title="", tags=[], uploader_names=[], user=user, include_results=False)["facets"])
 
-    # Query all tags for those documents
-    tags = (
-        db.session.query(Tag.name)
-        .join(DocumentTag, Tag.id == DocumentTag.tag_id)
-        .filter(DocumentTag.document_id.in_(accessible_docs))
-        .distinct()
-        .all()
-    )
 
-    # Return as a flat list of tag names
-    return [tag.name for tag in tags]
+def get_accessible_tags_for_user(user: UserContext):
+    """
+    Returns a list of unique tag names for documents accessible by the given user.
+    Accessible = documents public or in user's department.
+    """
+    return [tag["name"] for tag in get_accessible_facets(user)["tags"]]
 
 
-def get_accessible_uploaders_for_user(username: str):
+def get_accessible_uploaders_for_user(user: UserContext):
     """
     Returns a list of unique uploader names for documents accessible by the given user.
     Accessible = documents public or in user's department.
     """
-    # Find the user
-    user = Employee.query.filter_by(name=username).first()
-    if not user:
-        raise ValueError(f"User '{username}' not found")
-
-    # Query all accessible documents (public or user's department)
-    accessible_docs = (
-        db.session.query(Document.id)
-        .join(DocumentPermission, Document.id == DocumentPermission.document_id)
-        .filter(
-            (DocumentPermission.department_id == user.department_id) |
-            (DocumentPermission.department_id.is_(None))
-        )
-        .distinct()
-        .subquery().select()
-    )
-
-    # Query all unique uploader names for those documents
-    uploaders = (
-        db.session.query(Employee.name)
-        .join(Document, Employee.id == Document.uploader_id)
-        .filter(Document.id.in_(accessible_docs))
-        .distinct()
-        .all()
-    )
+    return [uploader["name"] for uploader in get_accessible_facets(user)["uploaders"]]
 
-    # Return as a flat list of uploader names
-    return [uploader.name for uploader in uploaders]
 
-
-def get_accessible_tags_uploaders(userName: str):
+def get_accessible_tags_uploaders(user: UserContext):
     
-    tags = get_accessible_tags_for_user(userName)
-    uploaders = get_accessible_uploaders_for_user(userName)
+    tags = get_accessible_tags_for_user(user)
+    uploaders = get_accessible_uploaders_for_user(user)
     return {"tags": tags, "uploaders": uploaders}
 
 
-def verify_user_document_access(username: str, document_title: str) -> bool:
-    
-    # Find the user
-    user = Employee.query.filter_by(name=username).first()
-    if not user:
-        return False
-    
-    # Find the document
-    document = Document.query.filter_by(title=document_title).first()
-    if not document:
-        return False
+def verify_user_document_access(user: UserContext, document_title: str) -> bool:
     
-    # Check if user has access to the document
     # Access is granted if:
     # 1. Document is public (department_id is None in DocumentPermission)
     # 2. User's department has permission to access the document
-    
-    has_access = (
-        db.session.query(DocumentPermission)
-        .filter(DocumentPermission.document_id == document.id)
-        .filter(
-            (DocumentPermission.department_id == user.department_id) |
-            (DocumentPermission.department_id.is_(None))
-        )
-        .first()
-    ) is not None
-    
-    return has_access
\ No newline at end of file
+    # Both are materialized in document_access, so this is one indexed lookup
+    if user is None:
+        return False
+    return db.session.query(DocumentAccess.document_id)\
+        .join(Document, Document.id == DocumentAccess.document_id)\
+        .filter(Document.title == document_title,
+                DocumentAccess.department_key == user.access_key)\
+        .first() is not None
@@ -0,0 +1,213 @@
+import csv
+import io
+import json
+import time
+from markupsafe import escape
+from sqlalchemy.exc import DBAPIError
+from database import db
+
+PLAYGROUND_MAX_ROWS = 1000  # rows shown in the page
+PLAYGROUND_MAX_BYTES = 2 * 1024 * 1024  # approximate size of the shown values
+PLAYGROUND_EXPORT_MAX_ROWS = 100_000
+PLAYGROUND_EXPORT_MAX_BYTES = 50 * 1024 * 1024
+PLAYGROUND_TIMEOUT_SECONDS = 5.0  # database time per statement (waiting on the client doesn't count)
+FETCH_BATCH_SIZE = 200
+_PROGRESS_STEPS = 1000  # SQLite VM instructions between deadline checks
+
+
+class PlaygroundTimeout(Exception):
+    """The statement used up its database time budget."""
+
+
+class PlaygroundQuery:
+    """
+    One playground statement on a dedicated connection, fetched in batches under
+    row, byte and time limits. The transaction is always rolled back.
+
+        with PlaygroundQuery(sql, max_rows=100) as query:
+            for rows in query.batches():
+                ...
+            query.truncated  # None, "rows" or "bytes"
+
+    The time limit is a budget of database time: SQLite checks it through a progress
+    handler while it steps the statement, PostgreSQL gets a statement_timeout.
+    """
+
+    def __init__(self, sql: str, max_rows: int = PLAYGROUND_MAX_ROWS,
+                 max_bytes: int = PLAYGROUND_MAX_BYTES, timeout: float = PLAYGROUND_TIMEOUT_SECONDS,
+                 batch_size: int = FETCH_BATCH_SIZE):
+        self.sql = sql
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.columns = []
+        self.returns_rows = False
+        self.row_count = 0
+        self.byte_count = 0
+        self.truncated = None
+        self._remaining = timeout
+        self._deadline = None
+        self._connection = None
+        self._driver_connection = None
+        self._result = None
+
+    def __enter__(self):
+        self._connection = db.engine.connect()
+        try:
+            if self._connection.dialect.name == "sqlite":
+                self._driver_connection = self._connection.connection.driver_connection
+                self._driver_connection.set_progress_handler(self._check_deadline, _PROGRESS_STEPS)
+            elif self._connection.dialect.name == "postgresql":
+                self._connection.exec_driver_sql(
+                    f"SET LOCAL statement_timeout = {int(self.timeout * 1000)}")
+            # Raw driver SQL: no bind parameter parsing of ':' in the statement
+            self._result = self._timed(self._connection.exec_driver_sql, self.sql)
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        self.returns_rows = self._result.returns_rows
+        self.columns = list(self._result.keys()) if self.returns_rows else []
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._driver_connection is not None:
+            self._driver_connection.set_progress_handler(None, 0)
+        if self._connection is not None:
+            self._connection.rollback()
+            self._connection.close()
+        self._connection = self._driver_connection = self._result = None
+        return False
+
+    def batches(self):
+        """Yield lists of row tuples until the result or one of the limits is exhausted."""
+        if not self.returns_rows:
+            return
+        while self.row_count < self.max_rows:
+            rows = self._timed(self._result.fetchmany, min(self.batch_size, self.max_rows - self.row_count))
+            if not rows:
+                return
+            batch = []
+            for row in rows:
+                self.byte_count += _row_size(row)
+                if self.byte_count > self.max_bytes:
+                    self.truncated = "bytes"
+                    break
+                batch.append(tuple(row))
+            self.row_count += len(batch)
+            if batch:
+                yield batch
+            if self.truncated:
+                return
+        # Row limit reached: only truncated if there is more
+        if self._timed(self._result.fetchmany, 1):
+            self.truncated = "rows"
+
+    def _timed(self, fn, *args):
+        """Run a DB call against the remaining time budget."""
+        started = time.monotonic()
+        self._deadline = started + self._remaining
+        try:
+            return fn(*args)
+        except DBAPIError as e:
+            if self._remaining <= 0 or time.monotonic() >= self._deadline:
+                raise PlaygroundTimeout(f"Query exceeded the {self.timeout:g} s time limit.") from e
+            raise
+        finally:
+            self._remaining -= time.monotonic() - started
+
+    def _check_deadline(self) -> int:
+        # Non-zero interrupts the statement ("interrupted" OperationalError)
+        return 1 if time.monotonic() >= self._deadline else 0
+
+
+def _row_size(row) -> int:
+    return sum(len(value) if isinstance(value, (str, bytes)) else 8 for value in row)
+
+
+def _error_message(error: Exception) -> str:
+    if isinstance(error, DBAPIError):
+        return str(error.orig)
+    return str(error)
+
+
+def render_query_html(sql: str, **limits):
+    """
+    Yield the HTML of a statement's result piece by piece (table head, then one
+    chunk per fetched batch), ending with a note if a limit cut it short.
+    Errors, including ones after the first rows, end the output with an error paragraph.
+    """
+    try:
+        with PlaygroundQuery(sql, **limits) as query:
+            if not query.returns_rows:
+                yield "<p>Statement executed, it returns no rows (changes are rolled back).</p>"
+                return
+            header = "".join(f"<th>{escape(column)}</th>" for column in query.columns)
+            started = False
+            for rows in query.batches():
+                if not started:
+                    yield f'<table class="table table-bordered"><thead><tr>{header}</tr></thead><tbody>'
+                    started = True
+                yield "".join(
+                    "<tr>" + "".join(f"<td>{escape(_display(value))}</td>" for value in row) + "</tr>"
+                    for row in rows)
+            if not started:
+                yield "<p>No rows returned.</p>"
+                return
+            yield "</tbody></table>"
+            if query.truncated:
+                limit = f"{query.max_rows} rows" if query.truncated == "rows" else \
+                    f"{query.max_bytes // 1024} KB"
+                yield (f"<p class='text-muted'>Showing the first {query.row_count} rows "
+                       f"(limit: {limit}). Export the result for more.</p>")
+    except Exception as e:
+        yield f"<p style='color:red;'>Error: {escape(_error_message(e))}</p>"
+
+
+def _display(value) -> str:
+    return "" if value is None else str(value)
+
+
+def stream_query_csv(sql: str, **limits):
+    """CSV export: a header line, then the rows in batches; a trailing '# ...' line marks a cut or error."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    try:
+        with PlaygroundQuery(sql, **limits) as query:
+            writer.writerow(query.columns)
+            yield flush()
+            for rows in query.batches():
+                writer.writerows(rows)
+                yield flush()
+            if query.truncated:
+                yield f"# truncated after {query.row_count} rows ({query.truncated} limit)\n"
+    except Exception as e:
+        yield f"# error: {_error_message(e)}\n"
+
+
+def stream_query_json(sql: str, **limits):
+    """
+    JSON export, streamed: {"columns": [...], "rows": [[...], ...], "truncated": ..., "error": ...}.
+    The document stays valid when a limit or an error ends the rows early.
+    """
+    columns, truncated, error = [], None, None
+    yield '{"rows": ['
+    try:
+        with PlaygroundQuery(sql, **limits) as query:
+            columns = query.columns
+            first = True
+            for rows in query.batches():
+                chunk = ",".join(json.dumps(list(row), default=str) for row in rows)
+                yield chunk if first else "," + chunk
+                first = False
+            truncated = query.truncated
+    except Exception as e:
+        error = _error_message(e)
+    yield "], " + json.dumps({"columns": columns, "truncated": truncated, "error": error})[1:]
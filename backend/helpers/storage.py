@@ -0,0 +1,84 @@
+import hashlib
+import os
+import tempfile
+
+CHUNK_SIZE = 64 * 1024  # 64 KB per read/write
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024  # 10 MB
+MAX_FORM_OVERHEAD_BYTES = 1024 * 1024  # other form fields and multipart headers around an upload
+
+
+class UploadTooLargeError(ValueError):
+    """Raised while streaming an upload once it grows past the size limit."""
+
+
+def stream_upload_to_temp(file, directory: str, max_bytes: int = MAX_UPLOAD_BYTES,
+                          chunk_size: int = CHUNK_SIZE):
+    """
+    Stream an uploaded file (FileStorage) into a temp file inside `directory`
+    in fixed-size chunks, hashing and counting bytes on the way.
+    Returns (temp_path, sha256_hex, size_in_bytes).
+    The temp file is removed if anything goes wrong (including the size limit).
+    """
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(
+        dir=directory, prefix=".upload-", suffix=".part")
+
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = file.stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(
+                        f"File size exceeds {max_bytes // (1024 * 1024)} MB.")
+                hasher.update(chunk)
+                out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+    except BaseException:
+        discard_file(temp_path)
+        raise
+
+    return temp_path, hasher.hexdigest(), size
+
+
+def blob_path(directory: str, content_hash: str) -> str:
+    """Location of a content-addressed blob: <directory>/blobs/<ab>/<abcdef...>."""
+    return os.path.join(directory, "blobs", content_hash[:2], content_hash)
+
+
+def move_into_place(temp_path: str, filepath: str) -> None:
+    """
+    Atomically move a streamed temp file to `filepath`.
+    Blob paths are derived from the content, so replacing an existing file is safe.
+    """
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    os.replace(temp_path, filepath)
+
+
+def iter_blob_files(directory: str):
+    """
+    Yield (content_hash, filepath) for every blob file found on disk
+    (encoded blobs are named <hash>.<encoding>).
+    """
+    root = os.path.join(directory, "blobs")
+    if not os.path.isdir(root):
+        return
+    for prefix in os.listdir(root):
+        prefix_dir = os.path.join(root, prefix)
+        if not os.path.isdir(prefix_dir):
+            continue
+        for name in os.listdir(prefix_dir):
+            yield name.split(".", 1)[0], os.path.join(prefix_dir, name)
+
+
+def discard_file(path: str) -> None:
+    """Remove a file, ignoring it if it is already gone."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
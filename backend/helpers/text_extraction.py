@@ -0,0 +1,99 @@
+import logging
+import os
+import zipfile
+from xml.etree import ElementTree
+
+MAX_TEXT_CHARS = 1_000_000  # cap what we keep per document
+
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_APP_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/extended-properties}"
+
+logger = logging.getLogger(__name__)
+
+
+def extract_text(filepath: str, filename: str) -> str:
+    """
+    Best-effort plain text of a stored document, used for full-text search.
+    Returns "" for unsupported or unreadable files.
+    """
+    try:
+        return extract_document(filepath, filename)["text"]
+    except FileNotFoundError:
+        return ""
+    except Exception:
+        logger.warning("Text extraction failed for %s", filename, exc_info=True)
+        return ""
+
+
+def extract_document(filepath: str, filename: str) -> dict:
+    """
+    Extract {"text": ..., "page_count": ...} from a stored document.
+    `filename` (the original upload name) decides the format, since blob paths
+    have no extension. page_count is None when the format has no notion of pages.
+    Raises on unreadable files so callers (the extraction queue) can retry.
+    Pure function with no DB access: safe to run in a worker process.
+    """
+    ext = os.path.splitext(filename)[1].lower().lstrip(".")
+    extractor = _EXTRACTORS.get(ext)
+    if not extractor:
+        return {"text": "", "page_count": None}
+    if not filepath or not os.path.exists(filepath):
+        raise FileNotFoundError(filepath)
+
+    text, page_count = extractor(filepath)
+    return {"text": text[:MAX_TEXT_CHARS], "page_count": page_count}
+
+
+def _extract_txt(filepath: str):
+    with open(filepath, "rb") as f:
+        return f.read(MAX_TEXT_CHARS * 4).decode("utf-8", errors="replace"), None
+
+
+def _extract_docx(filepath: str):
+    with zipfile.ZipFile(filepath) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+        page_count = _docx_page_count(archive)
+
+    paragraphs = []
+    for paragraph in root.iter(f"{_WORD_NS}p"):
+        runs = [node.text or "" for node in paragraph.iter(f"{_WORD_NS}t")]
+        if runs:
+            paragraphs.append("".join(runs))
+    return "\n".join(paragraphs), page_count
+
+
+def _docx_page_count(archive: zipfile.ZipFile):
+    # Word stores the page count of the last save in docProps/app.xml
+    try:
+        root = ElementTree.fromstring(archive.read("docProps/app.xml"))
+    except KeyError:
+        return None
+    pages = root.find(f"{_APP_NS}Pages")
+    return int(pages.text) if pages is not None and (pages.text or "").isdigit() else None
+
+
+def _extract_pdf(filepath: str):
+    # pypdf is only needed for indexing PDFs; without it PDFs are indexed by title only
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return "", None
+
+    reader = PdfReader(filepath)
+    pages = []
+    size = 0
+    for page in reader.pages:
+        text = page.extract_text() or ""
+        pages.append(text)
+        size += len(text)
+        if size >= MAX_TEXT_CHARS:
+            break
+    return "\n".join(pages), len(reader.pages)
+
+
+_EXTRACTORS = {
+    "txt": _extract_txt,
+    "docx": _extract_docx,
+    "pdf": _extract_pdf,
+    # legacy .doc (binary Word) has no extractor: indexed by title only
+}
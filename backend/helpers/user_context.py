@@ -0,0 +1,113 @@
+from dataclasses import dataclass
+from flask import g, session
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+from database import db
+from models import Employee, Role
+from helpers.access import access_key, accessible_data_cache
+from helpers.cache import LRUCache
+
+# Bounds how long another process can serve a changed employee (invalidation is per process)
+USER_CONTEXT_TTL_SECONDS = 60
+
+
+@dataclass(frozen=True)
+class UserContext:
+    """What services need to know about the requesting employee."""
+    id: int
+    name: str
+    department_id: int | None
+    role: str | None
+
+    @property
+    def access_key(self) -> int:
+        return access_key(self.department_id)
+
+    @property
+    def is_admin(self) -> bool:
+        return (self.role or "").lower() == "admin"
+
+
+user_context_cache = LRUCache(maxsize=4096, ttl=USER_CONTEXT_TTL_SECONDS)
+
+
+def load_user_context(username: str):
+    """UserContext of an employee by name (cached), or None if there is no such employee."""
+    user = user_context_cache.get(username)
+    if user is None:
+        row = (
+            db.session.query(Employee.id, Employee.name, Employee.department_id,
+                             Role.name.label("role"))
+            .outerjoin(Role, Role.id == Employee.role_id)
+            .filter(Employee.name == username)
+            .first()
+        )
+        if row is None:
+            return None
+        user = UserContext(row.id, row.name, row.department_id, row.role)
+        user_context_cache.set(username, user)
+    return user
+
+
+def current_user_context():
+    """The logged-in employee of this request, resolved once and kept in flask.g (None if logged out)."""
+    if "user_context" not in g:
+        username = session.get("username")
+        g.user_context = load_user_context(username) if username else None
+    return g.user_context
+
+
+def invalidate_user_context(username: str = None) -> None:
+    """Drop one cached employee, or all of them."""
+    if username is None:
+        user_context_cache.clear()
+    else:
+        user_context_cache.pop(username)
+
+
+def invalidate_user_context_after_commit(session, username: str = None) -> None:
+    """Drop one cached employee (or all of them) when `session` commits its current transaction."""
+    if session is None:
+        invalidate_user_context(username)
+        return
+    session.info.setdefault(_PENDING_EVICTIONS, set()).add(username if username is not None else _ALL)
+
+
+_PENDING_EVICTIONS = "user_context_evictions"
+_ALL = object()
+
+
+@event.listens_for(Session, "after_commit")
+def _evict_after_commit(session):
+    usernames = session.info.pop(_PENDING_EVICTIONS, ())
+    if _ALL in usernames:
+        invalidate_user_context()
+        return
+    for username in usernames:
+        invalidate_user_context(username)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending_evictions(session):
+    session.info.pop(_PENDING_EVICTIONS, None)
+
+
+@event.listens_for(Employee, "after_update")
+@event.listens_for(Employee, "after_delete")
+def _employee_changed(mapper, connection, target):
+    # Evicted at commit: a reader in between would re-cache the row as it was before the flush
+    session = object_session(target)
+    invalidate_user_context_after_commit(session, target.name)
+    renamed = False
+    for old_name in inspect(target).attrs.name.history.deleted or ():
+        invalidate_user_context_after_commit(session, old_name)
+        renamed = True
+    if renamed and session is not None:
+        # Uploader names are part of the cached search dropdowns
+        accessible_data_cache.invalidate_after_commit(session)
+
+
+@event.listens_for(Role, "after_update")
+@event.listens_for(Role, "after_delete")
+def _role_changed(mapper, connection, target):
+    invalidate_user_context_after_commit(object_session(target))
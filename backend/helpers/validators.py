@@ -2,6 +2,9 @@ import re
 import os
 from werkzeug.datastructures import FileStorage
 from models import Document,DocumentVersion
+from helpers.storage import MAX_UPLOAD_BYTES
+
+ALLOWED_EXTENSIONS = {"pdf", "doc", "docx", "txt"}
 
 def validate_user_input(email: str, username: str, password: str, role_name: str, department_name: str) -> list:
     """
@@ -46,16 +49,13 @@ def validate_document(title: str, file: FileStorage, version_number: int) -> lis
             return "Filename cannot be empty."
 
         # allowed extensions
-        allowed_extensions = {"pdf", "doc", "docx", "txt"}
         ext = os.path.splitext(filename)[1].lower().lstrip(".")
-        if ext not in allowed_extensions:
-            return f"File extension .{ext} is not allowed. Allowed: {allowed_extensions}"
+        if ext not in ALLOWED_EXTENSIONS:
+            return f"File extension .{ext} is not allowed. Allowed: {ALLOWED_EXTENSIONS}"
 
-        # max size check (e.g., 10 MB)
-        file.stream.seek(0, os.SEEK_END)
-        size_mb = file.stream.tell() / (1024 * 1024)
-        file.stream.seek(0)  # reset pointer
-        if size_mb > 10:
+        # max size check (10 MB): cheap early reject when the client declared a length,
+        # the real limit is enforced while streaming in helpers.storage
+        if file.content_length and file.content_length > MAX_UPLOAD_BYTES:
             return "File size exceeds 10 MB."
 
     # --- Version Validation ---
@@ -0,0 +1,30 @@
+"""covering tag index
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 04:40:12.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Tag filters group the matching rows by document: (tag_id, document_id)
+    # answers them from the index alone
+    with op.batch_alter_table('document_tags', schema=None) as batch_op:
+        batch_op.drop_index('ix_document_tags_tag_id')
+        batch_op.create_index('ix_document_tags_tag_document', ['tag_id', 'document_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('document_tags', schema=None) as batch_op:
+        batch_op.drop_index('ix_document_tags_tag_document')
+        batch_op.create_index('ix_document_tags_tag_id', ['tag_id'], unique=False)
@@ -0,0 +1,32 @@
+"""title trigram index (PostgreSQL)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 09:15:40.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ILIKE '%..%' and similarity() on the title can only use an index with pg_trgm;
+    # SQLite searches titles through FTS5 instead
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_documents_title_trgm', 'documents', ['title'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_documents_title_trgm', table_name='documents')
@@ -0,0 +1,37 @@
+"""document version content hash
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 11:02:37.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Versions reference their blob by hash instead of by file path, which changes
+    # when a blob is re-encoded or restored
+    with op.batch_alter_table('document_versions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_document_versions_content_hash', ['content_hash'], unique=False)
+        batch_op.create_foreign_key('fk_document_versions_content_hash', 'blobs', ['content_hash'], ['hash'])
+
+    op.execute(
+        "UPDATE document_versions SET content_hash = "
+        "(SELECT blobs.hash FROM blobs WHERE blobs.filepath = document_versions.filepath)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('document_versions', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_document_versions_content_hash', type_='foreignkey')
+        batch_op.drop_index('ix_document_versions_content_hash')
+        batch_op.drop_column('content_hash')
@@ -0,0 +1,32 @@
+"""blob last referenced timestamp
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 14:20:05.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Lets garbage collection skip blobs an upload has just deduplicated onto
+    with op.batch_alter_table('blobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_referenced_at', sa.DateTime(), nullable=True))
+
+    op.execute("UPDATE blobs SET last_referenced_at = COALESCE(created_at, CURRENT_TIMESTAMP)")
+
+    with op.batch_alter_table('blobs', schema=None) as batch_op:
+        batch_op.alter_column('last_referenced_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('blobs', schema=None) as batch_op:
+        batch_op.drop_column('last_referenced_at')
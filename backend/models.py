@@ -1,4 +1,5 @@
 from datetime import datetime
+from sqlalchemy import DDL, event
 from database import db
 
 
@@ -33,6 +34,14 @@ class Employee(db.Model):
 
 class Document(db.Model):
     __tablename__ = "documents"
+    __table_args__ = (
+        # title identifies a document (upload, download, info all look it up by title)
+        db.Index("uq_documents_title", "title", unique=True),
+        # PostgreSQL only: trigram index for ILIKE '%..%' and fuzzy (similarity) title search
+        db.Index("ix_documents_title_trgm", "title", postgresql_using="gin",
+                 postgresql_ops={"title": "gin_trgm_ops"},
+                 info={"dialect": "postgresql"}).ddl_if(dialect="postgresql"),  # see migrations/env.py
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     current_version_id = db.Column(
@@ -52,14 +61,25 @@ class Document(db.Model):
     )
 
 
+event.listen(Document.__table__, "before_create",
+             DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+
+
 class DocumentVersion(db.Model):
     __tablename__ = "document_versions"
+    __table_args__ = (
+        db.Index("uq_document_versions_document_version",
+                 "document_id", "version_number", unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     document_id = db.Column(db.Integer, db.ForeignKey(
         "documents.id"), nullable=False)
     version_number = db.Column(db.Float, nullable=False)
     filepath = db.Column(db.String(255), nullable=False)  # updated field
+    # Blob holding the content; None for files stored before content addressing
+    content_hash = db.Column(db.String(64), db.ForeignKey(
+        "blobs.hash", name="fk_document_versions_content_hash"), index=True)
     filename = db.Column(db.String(255), nullable=False)
     uploaded_at = db.Column(db.DateTime, default=datetime.now)
     uploader_id = db.Column(db.Integer, db.ForeignKey(
@@ -86,6 +106,11 @@ class Tag(db.Model):
 
 class DocumentTag(db.Model):
     __tablename__ = "document_tags"
+    __table_args__ = (
+        # the PK covers lookups by document; tag filters look up by tag and
+        # group by document, so the index covers both columns
+        db.Index("ix_document_tags_tag_document", "tag_id", "document_id"),
+    )
 
     document_id = db.Column(db.Integer, db.ForeignKey(
         "documents.id"), primary_key=True)
@@ -98,6 +123,10 @@ class DocumentTag(db.Model):
 
 class DocumentPermission(db.Model):
     __tablename__ = "document_permissions"
+    __table_args__ = (
+        db.Index("uq_document_permissions_document_department",
+                 "document_id", "department_id", unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     document_id = db.Column(db.Integer, db.ForeignKey(
@@ -106,3 +135,54 @@ class DocumentPermission(db.Model):
         "departments.id"), nullable=True)
 
 
+
+
+class Blob(db.Model):
+    """Content-addressed file on disk, shared by every version with the same bytes."""
+    __tablename__ = "blobs"
+
+    hash = db.Column(db.String(64), primary_key=True)  # sha256 hex digest
+    filepath = db.Column(db.String(255), unique=True, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    # Stamped whenever an upload references the blob; GC keeps recently referenced blobs
+    last_referenced_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+
+class ExtractionJob(db.Model):
+    """Queued text extraction for an uploaded version (drained by helpers.extraction_queue)."""
+    __tablename__ = "extraction_jobs"
+    __table_args__ = (
+        db.Index("ix_extraction_jobs_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey(
+        "documents.id"), nullable=False)
+    version_id = db.Column(db.Integer, db.ForeignKey(
+        "document_versions.id"), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="pending")  # pending/running/done/failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.now)
+    last_error = db.Column(db.Text)
+
+    # results
+    page_count = db.Column(db.Integer)
+    char_count = db.Column(db.Integer)
+
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+class DocumentAccess(db.Model):
+    """
+    Materialized DocumentPermission: one row per (department, document) the department can see,
+    with public documents expanded to every department. Maintained by helpers.access.
+    """
+    __tablename__ = "document_access"
+
+    # departments.id, or 0 (PUBLIC_ONLY_KEY) for employees without a department
+    department_key = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey(
+        "documents.id"), primary_key=True)
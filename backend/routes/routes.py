@@ -1,14 +1,45 @@
-from flask import Blueprint, send_file, request, render_template, session, url_for, jsonify, redirect, flash
-from models import *
-from helpers.services import *
-from helpers.validators import *
+from flask import Blueprint, current_app, send_file, request, render_template, session, url_for, jsonify, redirect, flash
+from database import db
+from models import Department, Document, DocumentPermission, DocumentTag, DocumentVersion, Employee, Role, Tag
+from helpers.services import (
+    SEARCH_PAGE_SIZE, create_employee, get_accessible_facets, get_document_detail, get_document_file,
+    handle_document_upload, search_documents_page, search_with_facets, verify_user_document_access,
+)
+from helpers.validators import validate_document, validate_user_input
+from helpers.storage import (
+    MAX_FORM_OVERHEAD_BYTES, MAX_UPLOAD_BYTES, UploadTooLargeError, discard_file, stream_upload_to_temp,
+)
+from helpers.batch_ingest import MAX_ARCHIVE_BYTES, IngestSourceError, ingest_archive
+from helpers.file_responses import send_document_file
+from helpers.user_context import current_user_context
+from helpers.passwords import hash_password, needs_rehash, verify_password
+from helpers.rate_limits import rate_limit
+import sqlalchemy
 from sqlalchemy.exc import IntegrityError
-from werkzeug.security import check_password_hash
+from sqlalchemy.orm import joinedload
+from werkzeug.exceptions import RequestEntityTooLarge
 from datetime import timedelta
+import tempfile
 
 auth_bp = Blueprint("auth", __name__)
 main_bp = Blueprint("main", __name__)
 helpers_bp = Blueprint("helpers", __name__)
+api_bp = Blueprint("api", __name__, url_prefix="/api")
+
+
+# Bodies over MAX_CONTENT_LENGTH are refused before they are read (see create_app)
+@main_bp.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    if request.endpoint != "main.upload_document":
+        return e
+    error = f"File size exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB."
+    return render_template("upload.html", error=error), 413
+
+
+@api_bp.errorhandler(RequestEntityTooLarge)
+def api_too_large(e):
+    return jsonify({"error": "Request body too large"}), 413
+
 
 #%% auth routes ------------------------------
 @auth_bp.route("/signup", methods=["GET", "POST"])
@@ -59,8 +90,13 @@ def login():
         username = request.form.get("username")
         password = request.form.get("password")
 
-        user = Employee.query.filter_by(name=username).first()
-        if user and check_password_hash(user.password_hash, password):
+        user = Employee.query.options(joinedload(Employee.role)).filter_by(name=username).first()
+        # Unknown users cost a (dummy) hash check too: no timing hint about which names exist
+        if verify_password(user.password_hash if user else None, password):
+            if needs_rehash(user.password_hash):
+                # The hashing policy changed since this password was set
+                user.password_hash = hash_password(password)
+                db.session.commit()
             session["user_id"] = user.id
             session["username"] = user.name
             session["role"] = user.role.name if user.role else None
@@ -77,9 +113,11 @@ def login():
 #%% main routes ------------------------------
 
 @main_bp.route("/upload", methods=["GET", "POST"])
+@rate_limit("upload", methods=["POST"])
 def upload_document():
     # ✅ Check if user is logged in
-    if "username" not in session or "role" not in session:
+    user = current_user_context()
+    if user is None or user.role is None:
         flash("You must be logged in to upload documents.", "error")
         return redirect(url_for("auth.login"))
 
@@ -90,7 +128,6 @@ def upload_document():
         tags = request.form.get("tags")  # multiple select
         file = request.files.get("file")
 
-        uploader_name = session["username"]
         departments = [dept.strip().lower() for dept in departments.split(",")] if departments else []
         tags = [dept.strip().lower() for dept in tags.split(",")] if tags else []
         # print(departments, tags)
@@ -102,7 +139,7 @@ def upload_document():
         try:
             handle_document_upload(
                 title=title,
-                uploader_name=uploader_name,
+                uploader=user,
                 file=file,
                 version_number=version_number,
                 departments=departments,
@@ -111,6 +148,8 @@ def upload_document():
             flash("Document uploaded successfully!", "success")
             return redirect(url_for("main.index"))
 
+        except UploadTooLargeError as e:
+            return render_template("upload.html", error=str(e))
         except sqlalchemy.exc.IntegrityError:
             # Example: duplicate title/version
             return render_template("upload.html", error="A document with the same title or version already exists.")
@@ -124,59 +163,56 @@ def upload_document():
     return render_template("upload.html")
 
 @main_bp.route("/search", methods=["GET", "POST"])
+@rate_limit("search")
 def index(): #---------------- search documents route -----------------::
     # ✅ Ensure user is logged in
-    if "username" not in session:
+    user = current_user_context()
+    if user is None:
         flash("You must be logged in to search documents.", "error")
         return redirect(url_for("auth.login"))
-    
-    
-
-    username = session["username"]
 
     if request.method == "GET":
-        # Return accessible tags and uploaders for form dropdowns
-        accessible = get_accessible_tags_uploaders(username)
-        return render_template("search.html", accessible=accessible, results=None)
+        # Facets (accessible tags and uploaders with counts) for form dropdowns, cached per department
+        return render_template("search.html", facets=get_accessible_facets(user), results=None)
 
     if request.method == "POST":
         # Get form data
         title = request.form.get("title", "").strip()
+        content = request.form.get("content", "").strip()
         tags = request.form.getlist("tags")  # Multiple select returns a list
+        tag_mode = request.form.get("tag_mode", "all")  # "all" or "any" of the tags
+        title_mode = request.form.get("title_mode", "words")  # "words" or "fuzzy" (similar titles)
+        exclude_tags = request.form.getlist("exclude_tags")
         uploader_names = request.form.getlist("uploader_names")  # Multiple select returns a list
         
-        # Call service function
+        # Call service function: results and facet counts narrowed by the filters
         try:
-            results = search_documents(
-                title=title, tags=tags, uploader_names=uploader_names, username=username)
-        except Exception as e :
-            results = []
-            print(e)
+            search = search_with_facets(
+                title=title, tags=tags, uploader_names=uploader_names, user=user,
+                content=content, tag_mode=tag_mode, exclude_tags=exclude_tags, title_mode=title_mode)
+        except Exception:
+            search = {"results": [], "facets": {"tags": [], "uploaders": []}}
+            current_app.logger.exception("Document search failed")
             flash("An error occurred while searching documents.", "error")
 
-        accessible = get_accessible_tags_uploaders(username)
-        return render_template("search.html", accessible=accessible, results=results)
+        return render_template("search.html", facets=search["facets"], results=search["results"])
 
 @main_bp.route("/document_info", methods=["GET"])
 def document_info():
     # Ensure user is logged in
-    if "username" not in session:
+    user = current_user_context()
+    if user is None:
         flash("You must be logged in to view document details.", "error")
         return redirect(url_for("auth.login"))
 
-    username = session["username"]
     title = request.args.get("title", type=str)
 
     if not title or not title.strip():
         flash("Missing document title.", "error")
         return redirect(url_for("main.index"))
 
-    # Verify access before revealing metadata
-    if not verify_user_document_access(username, title):
-        return render_template("document_info.html", error="Access denied.", info=None)
-
-    # Fetch version history
-    info = get_document_version_history(title)
+    # Access check + version history (cached while the document is unchanged)
+    info = get_document_detail(user, title)
     if isinstance(info, dict) and info.get("error"):
         return render_template("document_info.html", error=info.get("error"), info=None)
 
@@ -196,7 +232,8 @@ def test_all():
                 "role": e.role.name if e.role else None,
                 "department": e.department.name if e.department else None,
             }
-            for e in Employee.query.all()
+            for e in Employee.query.options(
+                joinedload(Employee.role), joinedload(Employee.department)).all()
         ],
         "departments": [{"id": d.id, "name": d.name} for d in Department.query.all()],
         "roles": [{"id": r.id, "name": r.name} for r in Role.query.all()],
@@ -240,6 +277,7 @@ def test_all():
 #%% helpers routes ------------------------------
 
 @helpers_bp.route("/download", methods=["GET"])
+@rate_limit("transfer")
 def download_document():
     # Get parameters from query string
     title = request.args.get("title")
@@ -249,11 +287,11 @@ def download_document():
     if not title:
         return jsonify({"error": "Title parameter is required"}), 400
     
-    # Get current user (you may need to adjust this based on your session handling)
-    username = session.get("username")  # Fallback for testing
+    # Get current user (resolved once per request)
+    user = current_user_context()
     
     # Verify user has access to the document
-    if not verify_user_document_access(username, title):
+    if not verify_user_document_access(user, title):
         return jsonify({"error": "Access denied. You don't have permission to access this document."}), 403
     
     # Get document file
@@ -261,10 +299,12 @@ def download_document():
     if not filepath:
         return jsonify(metadata), 404
 
-    # Return file for download
-    return send_file(filepath, as_attachment=True, download_name=metadata["filename"])
+    # Return file for download; an explicit version never changes, so it is cached as immutable
+    return send_document_file(filepath, metadata["filename"], metadata["etag"],
+                              as_attachment=True, immutable=version_number is not None)
 
 @helpers_bp.route("/view", methods=["GET"])
+@rate_limit("transfer")
 def view_document():
     # Get parameters from query string
     title = request.args.get("title")
@@ -274,11 +314,11 @@ def view_document():
     if not title:
         return jsonify({"error": "Title parameter is required"}), 400
     
-    # Get current user (you may need to adjust this based on your session handling)
-    username = session.get("username")  # Fallback for testing
+    # Get current user (resolved once per request)
+    user = current_user_context()
     
     # Verify user has access to the document
-    if not verify_user_document_access(username, title):
+    if not verify_user_document_access(user, title):
         return jsonify({"error": "Access denied. You don't have permission to access this document."}), 403
     
     # Get document file
@@ -286,7 +326,85 @@ def view_document():
     if not filepath:
         return jsonify(metadata), 404
     
-    # Return file for viewing (not download)
-    return send_file(filepath, as_attachment=False)
-
+    # Return file for viewing (not download); blob paths have no extension,
+    # so the stored filename drives the mimetype
+    return send_document_file(filepath, metadata["filename"], metadata["etag"],
+                              as_attachment=False, immutable=version_number is not None)
+
+#%% end helpers routes ------------------------------
+
+#%% api routes ------------------------------
+
+@api_bp.route("/search", methods=["GET"])
+@rate_limit("search")
+def api_search():
+    """
+    JSON search with keyset pagination:
+    /api/search?title=..&title_mode=words|fuzzy&content=..&tags=a&tags=b&tag_mode=all|any
+               &exclude_tags=c&uploaders=x&page_size=20&cursor=..
+    Pass the returned next_cursor back as `cursor` to get the following page.
+    """
+    user = current_user_context()
+    if user is None:
+        return jsonify({"error": "Authentication required"}), 401
+
+    page_size = request.args.get(
+        "page_size", default=current_app.config.get("SEARCH_PAGE_SIZE", SEARCH_PAGE_SIZE), type=int)
 
+    try:
+        page = search_documents_page(
+            title=request.args.get("title", "").strip(),
+            title_mode=request.args.get("title_mode", "words"),
+            content=request.args.get("content", "").strip(),
+            tags=request.args.getlist("tags"),
+            tag_mode=request.args.get("tag_mode", "all"),
+            exclude_tags=request.args.getlist("exclude_tags"),
+            uploader_names=request.args.getlist("uploaders"),
+            user=user,
+            page_size=page_size,
+            cursor=request.args.get("cursor"),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(page)
+
+
+@api_bp.route("/ingest", methods=["POST"])
+@rate_limit("upload")
+def api_ingest():
+    """
+    Bulk upload (admins): multipart `archive` (ZIP or TAR) and optional `manifest`
+    (CSV/JSON; default: manifest.csv/json inside the archive, else every file as version 1).
+    Returns per-item results and a summary (counts, bytes, throughput).
+    """
+    user = current_user_context()
+    if user is None:
+        return jsonify({"error": "Authentication required"}), 401
+    if not user.is_admin:
+        return jsonify({"error": "Only admins can ingest archives"}), 403
+
+    max_bytes = current_app.config.get("MAX_INGEST_BYTES", MAX_ARCHIVE_BYTES)
+    # Set before the form is parsed: the archive, a manifest and the form overhead
+    request.max_content_length = max_bytes + MAX_UPLOAD_BYTES + MAX_FORM_OVERHEAD_BYTES
+    archive = request.files.get("archive")
+    if not archive:
+        return jsonify({"error": "An archive file is required"}), 400
+    manifest = request.files.get("manifest")
+
+    temp_paths = []
+    try:
+        archive_path, _, _ = stream_upload_to_temp(archive, tempfile.gettempdir(), max_bytes=max_bytes)
+        temp_paths.append(archive_path)
+        manifest_path = None
+        if manifest:
+            manifest_path, _, _ = stream_upload_to_temp(manifest, tempfile.gettempdir())
+            temp_paths.append(manifest_path)
+        result = ingest_archive(archive_path, user, manifest_path=manifest_path)
+    except (UploadTooLargeError, IngestSourceError) as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        for path in temp_paths:
+            discard_file(path)
+
+    return jsonify(result)
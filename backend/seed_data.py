@@ -1,5 +1,13 @@
+import hashlib
+import os
+import random
+import time
+from sqlalchemy import func, select, text, update
 from models import *
-from werkzeug.security import generate_password_hash
+from helpers.passwords import hash_password
+from helpers.services import FILES_DIR, rebuild_search_index, rebuild_document_access
+from helpers.storage import blob_path
+from helpers.search_index import SEARCH_TABLE, search_index_available
 
 
 def seed_data():
@@ -24,14 +32,14 @@ def seed_data():
 
     # Employees (usernames lowercase)
     employees = [
-        Employee(name="alice admin", email="alice@siemens.com", password_hash=generate_password_hash("admin123"), role_id=admin_role.id, department_id=it.id),
-        Employee(name="bob hr", email="bob@siemens.com", password_hash=generate_password_hash("bob123"), role_id=user_role.id, department_id=hr.id),
-        Employee(name="charlie it", email="charlie@siemens.com", password_hash=generate_password_hash("password123"), role_id=user_role.id, department_id=it.id),
-        Employee(name="diana finance", email="diana@siemens.com", password_hash=generate_password_hash("password123"), role_id=manager_role.id, department_id=finance.id),
-        Employee(name="eve legal", email="eve@siemens.com", password_hash=generate_password_hash("password123"), role_id=user_role.id, department_id=legal.id),
-        Employee(name="frank sales", email="frank@siemens.com", password_hash=generate_password_hash("password123"), role_id=user_role.id, department_id=sales.id),
-        Employee(name="grace hr", email="grace@siemens.com", password_hash=generate_password_hash("password123"), role_id=user_role.id, department_id=hr.id),
-        Employee(name="henry it", email="henry@siemens.com", password_hash=generate_password_hash("password123"), role_id=manager_role.id, department_id=it.id),
+        Employee(name="alice admin", email="alice@siemens.com", password_hash=hash_password("admin123"), role_id=admin_role.id, department_id=it.id),
+        Employee(name="bob hr", email="bob@siemens.com", password_hash=hash_password("bob123"), role_id=user_role.id, department_id=hr.id),
+        Employee(name="charlie it", email="charlie@siemens.com", password_hash=hash_password("password123"), role_id=user_role.id, department_id=it.id),
+        Employee(name="diana finance", email="diana@siemens.com", password_hash=hash_password("password123"), role_id=manager_role.id, department_id=finance.id),
+        Employee(name="eve legal", email="eve@siemens.com", password_hash=hash_password("password123"), role_id=user_role.id, department_id=legal.id),
+        Employee(name="frank sales", email="frank@siemens.com", password_hash=hash_password("password123"), role_id=user_role.id, department_id=sales.id),
+        Employee(name="grace hr", email="grace@siemens.com", password_hash=hash_password("password123"), role_id=user_role.id, department_id=hr.id),
+        Employee(name="henry it", email="henry@siemens.com", password_hash=hash_password("password123"), role_id=manager_role.id, department_id=it.id),
     ]
     db.session.add_all(employees)
     db.session.commit()
@@ -135,5 +143,151 @@ def seed_data():
         created_docs.append(doc)
 
     db.session.commit()
+    rebuild_document_access()
+    rebuild_search_index()
 
     print("✅ Database seeded with rich sample data!")
+
+
+_TITLE_WORDS = [
+    "policy", "report", "handbook", "security", "finance", "quarterly", "onboarding",
+    "compliance", "network", "budget", "audit", "guidelines", "overview", "roadmap",
+    "contract", "training", "incident", "architecture", "benefits", "sales",
+]
+
+
+def _bulk_insert(model, rows: list[dict]) -> None:
+    # Core executemany: skips the ORM bulk path (per-batch RETURNING of primary keys)
+    db.session.execute(model.__table__.insert(), rows)
+
+
+def seed_synthetic_data(employees: int = 1000, documents: int = 10000, versions: int = 3,
+                        tags: int = 200, departments: int = 20, tags_per_document: int = 3,
+                        departments_per_document: int = 2, public_ratio: float = 0.2,
+                        sample_files: int = 8, seed: int = 42) -> dict:
+    """
+    Bulk-insert a large synthetic data set for benchmarks and load tests.
+    Rows are generated with explicit ids and written with executemany INSERTs
+    (no per-row lookups); versions share a few real blob files so downloads work.
+    Appends to whatever is already in the database. Returns the row counts.
+    """
+    rng = random.Random(seed)
+    start = time.perf_counter()
+
+    def next_id(model):
+        return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+    # Roles (reuse the standard ones)
+    roles = {r.name: r.id for r in Role.query.all()}
+    for name in ("admin", "user", "manager"):
+        if name not in roles:
+            role = Role(name=name)
+            db.session.add(role)
+            db.session.flush()
+            roles[name] = role.id
+
+    # Departments and tags
+    dep_start, tag_start = next_id(Department), next_id(Tag)
+    department_ids = list(range(dep_start, dep_start + departments))
+    tag_ids = list(range(tag_start, tag_start + tags))
+    _bulk_insert(Department, [
+        {"id": d, "name": f"dept-{d:04d}"} for d in department_ids])
+    _bulk_insert(Tag, [{"id": t, "name": f"tag-{t:04d}"} for t in tag_ids])
+
+    # Employees: one shared password hash, hashing per row would dominate the run
+    emp_start = next_id(Employee)
+    employee_ids = list(range(emp_start, emp_start + employees))
+    password_hash = hash_password("password123")
+    _bulk_insert(Employee, [{
+        "id": e, "name": f"user-{e:06d}", "email": f"user-{e:06d}@example.com",
+        "password_hash": password_hash,
+        "role_id": roles["admin"] if i == 0 else roles["user"],
+        "department_id": rng.choice(department_ids),
+    } for i, e in enumerate(employee_ids)])
+
+    # A handful of real files in the blob store, shared by every version
+    blobs = []
+    os.makedirs(FILES_DIR, exist_ok=True)
+    for i in range(sample_files):
+        words = " ".join(rng.choice(_TITLE_WORDS) for _ in range(200))
+        data = f"Synthetic sample document {i}\n{words}\n".encode()
+        content_hash = hashlib.sha256(data).hexdigest()
+        filepath = blob_path(FILES_DIR, content_hash)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, "wb") as f:
+            f.write(data)
+        blobs.append({"hash": content_hash, "filepath": filepath, "size": len(data),
+                      "text": data.decode(), "ref_count": 0})
+
+    # Documents, then versions, then current_version_id in one UPDATE
+    doc_start = next_id(Document)
+    document_ids = list(range(doc_start, doc_start + documents))
+    _bulk_insert(Document, [{
+        "id": d,
+        "title": " ".join(rng.sample(_TITLE_WORDS, 3)).capitalize() + f" {d:07d}",
+        "uploader_id": rng.choice(employee_ids),
+    } for d in document_ids])
+
+    version_rows = []
+    current_blob = {}
+    for d in document_ids:
+        for v in range(1, versions + 1):
+            blob = rng.choice(blobs)
+            blob["ref_count"] += 1
+            current_blob[d] = blob
+            version_rows.append({
+                "document_id": d, "version_number": float(v), "filepath": blob["filepath"],
+                "content_hash": blob["hash"], "filename": f"document-{d}-v{v}.txt",
+                "uploader_id": rng.choice(employee_ids),
+            })
+    # Blob rows first: versions reference them by hash
+    existing_blobs = {b.hash: b for b in Blob.query.filter(Blob.hash.in_([b["hash"] for b in blobs]))}
+    for blob in blobs:
+        if blob["hash"] in existing_blobs:
+            existing_blobs[blob["hash"]].ref_count += blob["ref_count"]
+        else:
+            db.session.add(Blob(hash=blob["hash"], filepath=blob["filepath"],
+                                size=blob["size"], ref_count=blob["ref_count"]))
+    db.session.flush()
+    _bulk_insert(DocumentVersion, version_rows)
+    db.session.execute(
+        update(Document)
+        .where(Document.id >= doc_start)
+        .values(current_version_id=select(func.max(DocumentVersion.id))
+                .where(DocumentVersion.document_id == Document.id)
+                .scalar_subquery())
+    )
+
+    # Tag and permission fan-out
+    _bulk_insert(DocumentTag, [
+        {"document_id": d, "tag_id": t}
+        for d in document_ids for t in rng.sample(tag_ids, min(tags_per_document, len(tag_ids)))])
+    permission_rows = []
+    for d in document_ids:
+        if rng.random() < public_ratio:
+            permission_rows.append({"document_id": d, "department_id": None})
+        else:
+            permission_rows.extend(
+                {"document_id": d, "department_id": dep}
+                for dep in rng.sample(department_ids, min(departments_per_document, len(department_ids))))
+    _bulk_insert(DocumentPermission, permission_rows)
+    db.session.commit()
+
+    # Derived tables: access (set-based) and the full-text index (sample text as content)
+    rebuild_document_access()
+    if search_index_available():
+        titles = dict(db.session.query(Document.id, Document.title).filter(Document.id >= doc_start))
+        db.session.execute(
+            text(f"INSERT INTO {SEARCH_TABLE} (rowid, title, content) VALUES (:id, :title, :content)"),
+            [{"id": d, "title": titles[d], "content": current_blob[d]["text"]} for d in document_ids])
+        db.session.commit()
+
+    counts = {
+        "employees": employees, "departments": departments, "tags": tags,
+        "documents": documents, "versions": len(version_rows),
+        "document_tags": documents * min(tags_per_document, len(tag_ids)),
+        "document_permissions": len(permission_rows),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    print(f"✅ Synthetic data seeded: {counts}")
+    return counts
@@ -0,0 +1,70 @@
+"""
+Bulk ingestion manifests: parse_manifest and the per-row validation of ingest_archive.
+
+    cd backend
+    python -m pytest tests
+"""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from helpers.batch_ingest import IngestSourceError, _validate_item, parse_manifest  # noqa: E402
+
+
+def validation_error(item):
+    return _validate_item(item, available={item.path}, seen=set(), max_bytes=1024)
+
+
+def test_csv_manifest_rows():
+    items = parse_manifest(
+        b"path,title,version,tags,departments\n"
+        b"./docs/a.pdf,Alpha,2,Finance; HR ;finance,Sales\n"
+        b"docs/b.txt,,,,\n", "manifest.csv")
+    assert [(i.path, i.title, i.version_number, i.tags, i.departments) for i in items] == [
+        ("docs/a.pdf", "Alpha", 2.0, ["finance", "hr"], ["sales"]),
+        ("docs/b.txt", "b", 1.0, [], []),
+    ]
+
+
+def test_json_manifest_rows():
+    items = parse_manifest(json.dumps([
+        {"path": "a.pdf", "title": "Alpha", "version": 1.5, "tags": ["X", "y"]},
+        {"path": "b.txt", "version": None, "departments": "qa;ops"},
+    ]).encode(), "manifest.json")
+    assert [(i.title, i.version_number, i.tags, i.departments) for i in items] == [
+        ("Alpha", 1.5, ["x", "y"], []),
+        ("b", 1.0, [], ["ops", "qa"]),
+    ]
+
+
+@pytest.mark.parametrize("version", ["", "  ", None])
+def test_blank_version_defaults_to_one(version):
+    [item] = parse_manifest(json.dumps([{"path": "a.txt", "version": version}]).encode(), "manifest.json")
+    assert item.version_number == 1.0
+    assert validation_error(item) is None
+
+
+@pytest.mark.parametrize("version, error", [
+    (0, "Version number must be positive."),
+    ("0", "Version number must be positive."),
+    (-1, "Version number must be positive."),
+    ("abc", "Version number must be numeric."),
+    ("nan", "Version number must be numeric."),
+    ("inf", "Version number must be numeric."),
+    ("-Infinity", "Version number must be numeric."),
+    (False, "Version number must be numeric."),
+    ([2], "Version number must be numeric."),
+])
+def test_invalid_version_is_a_row_error(version, error):
+    [item] = parse_manifest(json.dumps([{"path": "a.txt", "version": version}]).encode(), "manifest.json")
+    assert validation_error(item) == error
+
+
+@pytest.mark.parametrize("data", [b"\xff\xfe", b"[{", b"[1, 2]", b'[{"title": "no path"}]'])
+def test_unreadable_manifest_is_rejected(data):
+    with pytest.raises(IngestSourceError):
+        parse_manifest(data, "manifest.json")
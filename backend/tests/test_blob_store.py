@@ -0,0 +1,213 @@
+"""
+Content-addressed blob store: deduplication, restoring lost blobs and garbage collection.
+
+    cd backend
+    python -m pytest tests
+
+Runs against DATABASE_URL (an empty database: its tables are dropped afterwards),
+or a throwaway SQLite database when it is unset.
+"""
+import io
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from werkzeug.datastructures import FileStorage  # noqa: E402
+from app import create_app, init_schema  # noqa: E402
+import helpers.services  # noqa: E402
+from database import db  # noqa: E402
+from sqlalchemy import update  # noqa: E402
+from models import Blob, Document, DocumentVersion  # noqa: E402
+from helpers.batch_ingest import ingest_archive  # noqa: E402
+from helpers.services import (  # noqa: E402
+    collect_unreferenced_blobs, create_employee, handle_document_upload, store_blob)
+from helpers.storage import blob_path, stream_upload_to_temp  # noqa: E402
+from helpers.user_context import load_user_context  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("blob-store")
+    database_url = os.getenv("DATABASE_URL")
+    files_dir, helpers.services.FILES_DIR = helpers.services.FILES_DIR, str(workdir / "files")
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": database_url or f"sqlite:///{workdir / 'test.db'}",
+        "SECRET_KEY": "test", "PASSWORD_HASH_METHOD": "fast", "RATELIMIT_ENABLED": False, "TESTING": True})
+    with app.app_context():
+        init_schema()
+        create_employee("tester", "tester@example.com", "tester-password", "user", "qa")
+        yield app
+        db.session.remove()
+        if database_url:
+            db.drop_all()
+    helpers.services.FILES_DIR = files_dir
+
+
+@pytest.fixture
+def storage(app):
+    """Switch DOCUMENT_STORAGE for the rest of a test."""
+    def switch(mode: str):
+        app.config["DOCUMENT_STORAGE"] = mode
+    yield switch
+    app.config["DOCUMENT_STORAGE"] = "full"
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    user = load_user_context("tester")
+    with client.session_transaction() as session:
+        session["user_id"], session["username"], session["role"] = user.id, user.name, user.role
+    return client
+
+
+def upload(title: str, content: bytes, version_number: float = 1):
+    return handle_document_upload(
+        title=title, uploader=load_user_context("tester"),
+        file=FileStorage(stream=io.BytesIO(content), filename="notes.txt"),
+        version_number=version_number, departments=[], tags=[])
+
+
+def version_of(title: str, version_number: float) -> DocumentVersion:
+    return (DocumentVersion.query.join(Document, Document.id == DocumentVersion.document_id)
+            .filter(Document.title == title, DocumentVersion.version_number == version_number)
+            .one())
+
+
+def lose_blob_file(title: str, version_number: float) -> str:
+    blob = db.session.get(Blob, version_of(title, version_number).content_hash)
+    os.remove(blob.filepath)
+    return blob.filepath
+
+
+def unreferenced_blob(content: bytes, age: timedelta) -> Blob:
+    """A committed blob no version references (an upload that died after store_blob), last referenced `age` ago."""
+    temp_path, content_hash, size = stream_upload_to_temp(
+        FileStorage(stream=io.BytesIO(content)), helpers.services.FILES_DIR)
+    store_blob(temp_path, content_hash, size)
+    db.session.execute(update(Blob).where(Blob.hash == content_hash).values(
+        created_at=datetime.now() - age, last_referenced_at=datetime.now() - age))
+    db.session.commit()
+    return db.session.get(Blob, content_hash)
+
+
+def download(client, title: str, version_number: float):
+    return client.get("/download", query_string={"title": title, "version_number": version_number})
+
+
+@pytest.mark.parametrize("stored_as, restored_as", [
+    ("full", "full"), ("full", "compact"), ("compact", "full"), ("compact", "compact")])
+def test_reuploading_lost_blob_restores_old_versions(storage, client, stored_as, restored_as):
+    content = f"lost and found ({stored_as}, {restored_as})\n".encode() * 50
+    title = f"Lost Blob {stored_as} {restored_as}"
+    storage(stored_as)
+    upload(title, content)
+    assert download(client, title, 1).data == content
+
+    lose_blob_file(title, 1)
+    assert download(client, title, 1).status_code == 404
+
+    storage(restored_as)
+    upload(f"{title} Copy", content)
+    response = download(client, title, 1)
+    assert response.status_code == 200
+    assert response.data == content
+    blob = db.session.get(Blob, version_of(title, 1).content_hash)
+    assert version_of(title, 1).filepath == blob.filepath
+    assert blob.ref_count == 2
+
+
+def test_bulk_ingest_restores_lost_blob(storage, client, tmp_path):
+    content = b"bulk restore\n" * 50
+    storage("compact")  # compressed, while bulk ingestion stores blobs as they are
+    upload("Bulk Lost Blob", content)
+    lose_blob_file("Bulk Lost Blob", 1)
+
+    (tmp_path / "copy.txt").write_bytes(content)
+    (tmp_path / "manifest.csv").write_text("path,title,version\ncopy.txt,Bulk Lost Blob,2\n")
+    result = ingest_archive(str(tmp_path), load_user_context("tester"), workers=1)
+    assert result["summary"]["new_version"] == 1
+
+    response = download(client, "Bulk Lost Blob", 1)
+    assert response.status_code == 200
+    assert response.data == content
+    assert version_of("Bulk Lost Blob", 1).filepath == version_of("Bulk Lost Blob", 2).filepath
+
+
+def test_identical_uploads_share_one_blob(app):
+    content = b"shared content\n" * 20
+    upload("Shared One", content)
+    upload("Shared Two", content)
+    upload("Shared One", content, version_number=2)
+
+    hashes = {version_of(title, number).content_hash
+              for title, number in (("Shared One", 1), ("Shared Two", 1), ("Shared One", 2))}
+    assert len(hashes) == 1
+    blob = db.session.get(Blob, hashes.pop())
+    assert blob.ref_count == 3
+    assert os.listdir(os.path.dirname(blob.filepath)) == [os.path.basename(blob.filepath)]
+
+
+def test_collect_removes_unreferenced_blobs_after_grace(app):
+    stale = unreferenced_blob(b"stale upload", timedelta(hours=2))
+    fresh = unreferenced_blob(b"fresh upload", timedelta(minutes=5))
+    upload("Referenced", b"referenced upload")
+    referenced = db.session.get(Blob, version_of("Referenced", 1).content_hash)
+    stale_hash, stale_path, fresh_hash = stale.hash, stale.filepath, fresh.hash
+
+    stats = collect_unreferenced_blobs(grace_seconds=3600)
+    assert stats["removed_blobs"] == 1
+    assert db.session.get(Blob, stale_hash) is None
+    assert not os.path.exists(stale_path)
+    assert db.session.get(Blob, fresh_hash).ref_count == 0
+    assert db.session.get(Blob, referenced.hash).ref_count == 1
+    assert os.path.exists(referenced.filepath)
+
+
+def test_collect_keeps_blob_an_upload_deduplicated_onto(app):
+    blob = unreferenced_blob(b"old leftover, uploaded again", timedelta(days=2))
+    upload("Deduplicated Late", b"old leftover, uploaded again")
+
+    collect_unreferenced_blobs(grace_seconds=3600)
+    blob = db.session.get(Blob, blob.hash)
+    assert blob.ref_count == 1
+    assert blob.last_referenced_at > datetime.now() - timedelta(minutes=1)
+    assert os.path.exists(blob.filepath)
+
+
+def test_collect_skips_blob_referenced_while_it_runs(app, monkeypatch):
+    blob = unreferenced_blob(b"referenced during collection", timedelta(days=2))
+    content_hash, filepath = blob.hash, blob.filepath
+    iter_blob_files = helpers.services.iter_blob_files
+
+    def dedup_concurrently(directory):
+        # Another worker's store_blob takes a reference after GC read the blob rows
+        with db.engine.begin() as connection:
+            connection.execute(update(Blob).where(Blob.hash == content_hash).values(
+                ref_count=Blob.ref_count + 1, last_referenced_at=datetime.now()))
+        monkeypatch.setattr(helpers.services, "iter_blob_files", iter_blob_files)
+        return iter_blob_files(directory)
+
+    monkeypatch.setattr(helpers.services, "iter_blob_files", dedup_concurrently)
+    assert collect_unreferenced_blobs(grace_seconds=3600)["removed_blobs"] == 0
+    assert db.session.get(Blob, content_hash) is not None
+    assert os.path.exists(filepath)
+
+
+def test_collect_removes_old_orphan_files(app):
+    orphan, recent = (blob_path(helpers.services.FILES_DIR, name * 64) for name in "ab")
+    for path in (orphan, recent):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"left behind")
+    old = time.time() - 7200
+    os.utime(orphan, (old, old))
+
+    assert collect_unreferenced_blobs(grace_seconds=3600)["removed_orphan_files"] == 1
+    assert not os.path.exists(orphan)
+    assert os.path.exists(recent)
@@ -0,0 +1,97 @@
+"""
+Upload permissions and the document_access rows derived from them.
+
+    cd backend
+    python -m pytest tests
+
+Runs against DATABASE_URL (an empty database: its tables are dropped afterwards),
+or a throwaway SQLite database when it is unset.
+"""
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from werkzeug.datastructures import FileStorage  # noqa: E402
+from app import create_app, init_schema  # noqa: E402
+import helpers.services  # noqa: E402
+from database import db  # noqa: E402
+from models import Department, Document, DocumentAccess, DocumentPermission, Employee  # noqa: E402
+from helpers.access import PUBLIC_ONLY_KEY, rebuild_document_access  # noqa: E402
+from helpers.services import create_employee, handle_document_upload  # noqa: E402
+from helpers.user_context import load_user_context  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("document-access")
+    database_url = os.getenv("DATABASE_URL")
+    files_dir, helpers.services.FILES_DIR = helpers.services.FILES_DIR, str(workdir / "files")
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": database_url or f"sqlite:///{workdir / 'test.db'}",
+        "PASSWORD_HASH_METHOD": "fast", "RATELIMIT_ENABLED": False, "TESTING": True})
+    with app.app_context():
+        init_schema()
+        create_employee("analyst", "analyst@example.com", "analyst-password", "user", "qa")
+        create_employee("visitor", "visitor@example.com", "visitor-password", "user", "qa")
+        Employee.query.filter_by(name="visitor").one().department_id = None
+        db.session.commit()
+        yield app
+        db.session.remove()
+        if database_url:
+            db.drop_all()
+    helpers.services.FILES_DIR = files_dir
+
+
+def upload(title: str, uploader: str, departments: list[str]) -> int:
+    handle_document_upload(
+        title=title, uploader=load_user_context(uploader),
+        file=FileStorage(stream=io.BytesIO(title.encode()), filename="notes.txt"),
+        version_number=1, departments=departments, tags=[])
+    return Document.query.filter_by(title=title).one().id
+
+
+def permissions(document_id: int) -> set:
+    names = dict(db.session.query(Department.id, Department.name))
+    return {names.get(department_id) for (department_id,) in
+            db.session.query(DocumentPermission.department_id).filter_by(document_id=document_id)}
+
+
+def access_keys(document_id: int) -> set:
+    return {key for (key,) in
+            db.session.query(DocumentAccess.department_key).filter_by(document_id=document_id)}
+
+
+def department_id(name: str) -> int:
+    return Department.query.filter_by(name=name).one().id
+
+
+@pytest.mark.parametrize("uploader", ["analyst", "visitor"])
+def test_upload_without_departments_is_public(app, uploader):
+    document_id = upload(f"Public from {uploader}", uploader, [])
+    assert permissions(document_id) == {None}
+    assert access_keys(document_id) == {PUBLIC_ONLY_KEY, *(d for (d,) in db.session.query(Department.id))}
+
+
+def test_upload_with_departments_adds_uploader_department(app):
+    document_id = upload("Restricted from analyst", "analyst", ["sales"])
+    assert permissions(document_id) == {"qa", "sales"}
+    assert access_keys(document_id) == {department_id("qa"), department_id("sales")}
+
+
+def test_upload_by_employee_without_department_is_not_public(app):
+    document_id = upload("Restricted from visitor", "visitor", ["sales"])
+    assert permissions(document_id) == {"sales"}
+    assert access_keys(document_id) == {department_id("sales")}
+    assert helpers.services.get_document_detail(load_user_context("visitor"), "Restricted from visitor") == {
+        "error": "Access denied."}
+
+
+def test_access_rows_match_a_full_rebuild(app):
+    upload("Rebuilt from visitor", "visitor", ["hr", "sales"])
+    before = set(db.session.query(DocumentAccess.department_key, DocumentAccess.document_id))
+    rebuild_document_access()
+    assert set(db.session.query(DocumentAccess.department_key, DocumentAccess.document_id)) == before
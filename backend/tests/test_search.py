@@ -0,0 +1,169 @@
+"""
+Document search: keyset pagination of search_documents_page and /api/search, tag filter modes.
+
+    cd backend
+    python -m pytest tests
+
+Runs against DATABASE_URL (an empty database: its tables are dropped afterwards),
+or a throwaway SQLite database when it is unset.
+"""
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from werkzeug.datastructures import FileStorage  # noqa: E402
+from app import create_app, init_schema  # noqa: E402
+import helpers.services  # noqa: E402
+from database import db  # noqa: E402
+from helpers.services import (  # noqa: E402
+    create_employee, handle_document_upload, search_documents, search_documents_page, search_with_facets)
+from helpers.user_context import load_user_context  # noqa: E402
+
+REPORTS = [f"Report {n:02d}" for n in range(25)]
+OTHERS = ["Budget Overview", "Travel Policy", "Report Archive Index"]
+TAG_DIVISORS = {"even": 2, "third": 3, "fifth": 5}
+
+
+def report_tags(title: str) -> list[str]:
+    if title not in REPORTS:
+        return []
+    number = int(title.split()[1])
+    return [tag for tag, divisor in TAG_DIVISORS.items() if number % divisor == 0]
+
+
+def reports_where(predicate) -> list[str]:
+    return sorted(title for title in REPORTS if predicate(set(report_tags(title))))
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("search")
+    database_url = os.getenv("DATABASE_URL")
+    files_dir, helpers.services.FILES_DIR = helpers.services.FILES_DIR, str(workdir / "files")
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": database_url or f"sqlite:///{workdir / 'test.db'}",
+        "SECRET_KEY": "test", "PASSWORD_HASH_METHOD": "fast", "RATELIMIT_ENABLED": False, "TESTING": True})
+    with app.app_context():
+        init_schema()
+        create_employee("tester", "tester@example.com", "tester-password", "user", "qa")
+        uploader = load_user_context("tester")
+        for title in REPORTS + OTHERS:
+            handle_document_upload(
+                title=title, uploader=uploader,
+                file=FileStorage(stream=io.BytesIO(title.encode()), filename="notes.txt"),
+                version_number=1, departments=[], tags=report_tags(title))
+        yield app
+        db.session.remove()
+        if database_url:
+            db.drop_all()
+    helpers.services.FILES_DIR = files_dir
+
+
+@pytest.fixture
+def user(app):
+    return load_user_context("tester")
+
+
+def all_pages(user, page_size: int, title: str = "", **filters) -> list[list[str]]:
+    pages, cursor = [], None
+    while True:
+        page = search_documents_page(title, [], [], user, page_size=page_size, cursor=cursor, **filters)
+        pages.append([row["title"] for row in page["results"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("page_size", [1, 7, 14, 28, 100])
+def test_unranked_pages_cover_every_title_once_in_order(user, page_size):
+    pages = all_pages(user, page_size)
+    titles = [title for page in pages for title in page]
+    assert titles == sorted(REPORTS + OTHERS)
+    assert all(len(page) == page_size for page in pages[:-1])
+    assert 0 < len(pages[-1]) <= page_size
+
+
+@pytest.mark.parametrize("page_size", [1, 4, 10])
+@pytest.mark.parametrize("title, title_mode", [("report", "words"), ("Report 1", "fuzzy")])
+def test_ranked_pages_match_the_unpaginated_ranking(user, page_size, title, title_mode):
+    ranking = [row["title"] for row in search_documents_page(
+        title, [], [], user, page_size=100, title_mode=title_mode)["results"]]
+    assert len(ranking) > 10
+    if title_mode == "words":
+        assert set(ranking) == set(REPORTS) | {"Report Archive Index"}
+    pages = all_pages(user, page_size, title=title, title_mode=title_mode)
+    assert [title for page in pages for title in page] == ranking
+
+
+def test_last_page_has_no_cursor(user):
+    page = search_documents_page("budget", [], [], user, page_size=5)
+    assert [row["title"] for row in page["results"]] == ["Budget Overview"]
+    assert page["next_cursor"] is None
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "e30", "eyJrIjogInRpdGxlIn0"])
+def test_malformed_cursor_is_rejected(user, cursor):
+    with pytest.raises(ValueError):
+        search_documents_page("", [], [], user, cursor=cursor)
+
+
+def test_cursor_of_another_search_kind_is_rejected(user):
+    unranked = search_documents_page("", [], [], user, page_size=2)["next_cursor"]
+    with pytest.raises(ValueError, match="different search"):
+        search_documents_page("report", [], [], user, cursor=unranked)
+
+
+def test_api_search_follows_next_cursor(app, user):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"], session["username"], session["role"] = user.id, user.name, user.role
+
+    first = client.get("/api/search", query_string={"page_size": 10}).get_json()
+    second = client.get("/api/search", query_string={"page_size": 10, "cursor": first["next_cursor"]}).get_json()
+    assert [row["title"] for row in first["results"] + second["results"]] == sorted(REPORTS + OTHERS)[:20]
+    assert client.get("/api/search", query_string={"cursor": "bogus"}).status_code == 400
+
+
+def tag_search(user, tags, tag_mode="all", exclude_tags=None) -> list[str]:
+    return sorted(row["title"] for row in search_documents(
+        "", tags, [], user, tag_mode=tag_mode, exclude_tags=exclude_tags))
+
+
+@pytest.mark.parametrize("tags", [["even"], ["even", "third"], ["even", "third", "fifth"]])
+def test_all_mode_needs_every_tag(user, tags):
+    assert tag_search(user, tags) == reports_where(lambda found: set(tags) <= found)
+
+
+@pytest.mark.parametrize("tags", [["even"], ["third", "fifth"], ["fifth", "unknown"]])
+def test_any_mode_needs_one_tag(user, tags):
+    assert tag_search(user, tags, "any") == reports_where(lambda found: bool(set(tags) & found))
+
+
+def test_all_mode_with_an_unknown_tag_matches_nothing(user):
+    assert tag_search(user, ["even", "unknown"]) == []
+
+
+def test_excluded_tags_remove_documents(user):
+    assert tag_search(user, [], exclude_tags=["even", "third"]) == sorted(
+        title for title in REPORTS + OTHERS if not {"even", "third"} & set(report_tags(title)))
+    assert tag_search(user, ["even"], exclude_tags=["fifth"]) == reports_where(
+        lambda found: "even" in found and "fifth" not in found)
+    assert tag_search(user, ["third", "fifth"], "any", ["even"]) == reports_where(
+        lambda found: {"third", "fifth"} & found and "even" not in found)
+
+
+def test_tag_facets_count_filtered_documents(user):
+    facets = search_with_facets("", ["even"], [], user, include_results=False)["facets"]["tags"]
+    evens = reports_where(lambda found: "even" in found)
+    assert facets == sorted(
+        ({"name": tag, "count": sum(tag in report_tags(title) for title in evens)} for tag in TAG_DIVISORS),
+        key=lambda f: (-f["count"], f["name"]))
+
+
+def test_unknown_tag_mode_is_rejected(user):
+    with pytest.raises(ValueError, match="Unknown tag mode"):
+        search_documents("", ["even"], [], user, tag_mode="most")
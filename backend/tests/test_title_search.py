@@ -0,0 +1,113 @@
+"""
+Title search: ILIKE escaping, trigram similarity thresholds and search_documents title modes.
+
+    cd backend
+    python -m pytest tests
+    DATABASE_URL=postgresql+psycopg://user:pw@localhost/test python -m pytest tests
+
+Runs against DATABASE_URL (an empty database: its tables are dropped afterwards),
+or a throwaway SQLite database when it is unset.
+"""
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from werkzeug.datastructures import FileStorage  # noqa: E402
+from app import create_app, init_schema  # noqa: E402
+import helpers.services  # noqa: E402
+from database import db  # noqa: E402
+from models import Document  # noqa: E402
+from helpers.search_index import (  # noqa: E402
+    FUZZY_TITLE_THRESHOLD, fuzzy_title_clause, title_contains_clause, trigram_similarity)
+from helpers.services import create_employee, handle_document_upload, search_documents  # noqa: E402
+from helpers.user_context import load_user_context  # noqa: E402
+
+TITLES = [
+    "Quarterly Report 2024",
+    "Annual Budget Overview",
+    "100% Coverage Plan",
+    "1000 Coverage Plan",
+    "snake_case Naming Guide",
+    "snakeXcase Naming Guide",
+    "Back\\slash Notes",
+]
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("title-search")
+    database_url = os.getenv("DATABASE_URL")
+    files_dir, helpers.services.FILES_DIR = helpers.services.FILES_DIR, str(workdir / "files")
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": database_url or f"sqlite:///{workdir / 'test.db'}",
+        "PASSWORD_HASH_METHOD": "fast", "RATELIMIT_ENABLED": False, "TESTING": True})
+    with app.app_context():
+        init_schema()
+        create_employee("tester", "tester@example.com", "tester-password", "user", "qa")
+        uploader = load_user_context("tester")
+        for title in TITLES:
+            handle_document_upload(
+                title=title, uploader=uploader,
+                file=FileStorage(stream=io.BytesIO(title.encode()), filename="notes.txt"),
+                version_number=1, departments=[], tags=[])
+        yield app
+        db.session.remove()
+        if database_url:
+            db.drop_all()
+    helpers.services.FILES_DIR = files_dir
+
+
+@pytest.fixture
+def user(app):
+    return load_user_context("tester")
+
+
+def matching_titles(clause) -> set[str]:
+    return {title for (title,) in db.session.query(Document.title).filter(clause)}
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("%", {"100% Coverage Plan"}),
+    ("0% C", {"100% Coverage Plan"}),
+    ("_", {"snake_case Naming Guide"}),
+    ("e_c", {"snake_case Naming Guide"}),
+    ("\\", {"Back\\slash Notes"}),
+    ("COVERAGE", {"100% Coverage Plan", "1000 Coverage Plan"}),
+])
+def test_title_contains_clause_matches_wildcards_literally(app, query, expected):
+    assert matching_titles(title_contains_clause(query)) == expected
+
+
+@pytest.mark.parametrize("query", ["Quartely Report", "anual budget", "snake case guide", "zzzz qqqq"])
+def test_fuzzy_title_clause_uses_similarity_threshold(app, query):
+    similarity = {
+        title: db.session.query(db.func.similarity(title, query)).scalar() for title in TITLES}
+    for title, value in similarity.items():
+        assert value == pytest.approx(trigram_similarity(title, query), abs=1e-6)
+    expected = {title for title, value in similarity.items() if value >= FUZZY_TITLE_THRESHOLD}
+    assert matching_titles(fuzzy_title_clause(query)) == expected
+
+
+def test_similarity_of_unrelated_or_empty_titles_is_zero(app):
+    assert trigram_similarity("Annual Budget", "zzzz") == 0
+    assert trigram_similarity("", "Annual Budget") == 0
+    assert trigram_similarity("Annual Budget", "annual  BUDGET!") == 1
+
+
+def test_search_fuzzy_title_ranks_most_similar_first(app, user):
+    results = search_documents("Quartely Reprot 2024", [], [], user, title_mode="fuzzy")
+    assert [row["title"] for row in results][:1] == ["Quarterly Report 2024"]
+    assert "Annual Budget Overview" not in {row["title"] for row in results}
+
+
+def test_search_fuzzy_title_without_similar_titles_is_empty(app, user):
+    assert search_documents("zzzz qqqq", [], [], user, title_mode="fuzzy") == []
+
+
+def test_search_words_title_needs_exact_words(app, user):
+    assert [row["title"] for row in search_documents("Budget", [], [], user)] == ["Annual Budget Overview"]
+    assert search_documents("Quartely", [], [], user, title_mode="words") == []